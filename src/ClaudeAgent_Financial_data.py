@@ -18,7 +18,7 @@
 # 
 #   * Income statement
 # 
-#   You can also fetch from Financial Modeling Prep API:
+#   You can also fetch from Financial Modeling Prep API (tools in functions/fundamentals.py):
 # 
 #   * Balance Sheet
 # 
@@ -26,6 +26,8 @@
 # 
 #   * Key Metrics
 # 
+#   * Growth, margins, CAGR and ratios across periods and companies (utils/fundamentals.py)
+# 
 # 
 # 
 
@@ -37,16 +39,32 @@
 
 # In[8]:
 
+import logging
 import os
+import sys
 from llama_index.llms.anthropic import Anthropic
 from llama_index.core.tools import FunctionTool
 
 import nest_asyncio
 
+from utils.answer_cache import CACHE_DISABLED as ANSWER_CACHE_DISABLED, CachedAgent
+from utils.conversation_memory import MEMORY_DISABLED, build_memory
 from utils.data_utils import load_functions_from_directory
+from utils.fast_path import FAST_PATH_DISABLED, FastPathAgent, FastPathRouter
+from utils.http_client import afetch_data, fetch_data
+from utils.metrics import TracedAgent, instrument_llm
+from utils.prefetch import PREFETCH_DISABLED, PrefetchingAgent
+from utils.quote_batcher import get_batcher
+from utils.result_shaping import shaped
+from utils.streaming_repl import stream_answer
+from utils.tool_events import observed
+from utils.tool_retrieval import ToolRetriever
 
 nest_asyncio.apply()
 
+# LOG_LEVEL=INFO shows per-turn details such as the prompt tokens saved by tool retrieval
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'))
+
 #   Other endpoints are not free:
 # 
 #   * News
@@ -62,8 +80,11 @@ nest_asyncio.apply()
 
 CLAUDE_API_KEY = os.environ.get('CLAUDE_API_KEY')
 FINANCIAL_MODELING_PREP_API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
-print("Claude API Key = ",CLAUDE_API_KEY)
-print("Financial Modeling API Key = ", FINANCIAL_MODELING_PREP_API_KEY)
+# Never print or log the keys themselves
+for key_name, key_value in (("CLAUDE_API_KEY", CLAUDE_API_KEY),
+                            ("FINANCIAL_MODELING_PREP_API_KEY", FINANCIAL_MODELING_PREP_API_KEY)):
+    if not key_value:
+        logging.warning("%s is not set", key_name)
 
 # “Data provided by Financial Modeling Prep”
 # 
@@ -73,6 +94,8 @@ print("Financial Modeling API Key = ", FINANCIAL_MODELING_PREP_API_KEY)
 
 
 llm_anthropic = Anthropic(model="claude-3-5-sonnet-20240620", api_key=CLAUDE_API_KEY)
+# Per-call latency and input/output tokens of every LLM call (see utils.metrics)
+instrument_llm()
 
 # # Tools
 
@@ -86,17 +109,23 @@ llm_anthropic = Anthropic(model="claude-3-5-sonnet-20240620", api_key=CLAUDE_API
 # In[22]:
 
 
-import requests
-
-
 # Define the functions that will fetch financial data
 def get_stock_price(symbol):
     """
     Fetch the current stock price for the given symbol, the current volume, the average price 50d and 200d, EPS, PE and the next earnings Announcement.
     """
-    url = f"https://financialmodelingprep.com/api/v3/quote-order/{symbol}?apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    # Concurrent single-symbol lookups (parallel tool calls) are coalesced into one /quote request
+    return _stock_price_result(symbol, [get_batcher().get(symbol)])
+
+
+async def aget_stock_price(symbol):
+    """
+    Async variant of get_stock_price.
+    """
+    return _stock_price_result(symbol, [await get_batcher().aget(symbol)])
+
+
+def _stock_price_result(symbol, data):
     try:
         price = data[0]['price']
         volume = data[0]['volume']
@@ -107,7 +136,7 @@ def get_stock_price(symbol):
         earningsAnnouncement = data[0]['earningsAnnouncement']
         return {"symbol": symbol.upper(), "price": price, "volume": volume, "priceAvg50": priceAvg50,
                 "priceAvg200": priceAvg200, "EPS": eps, "PE": pe, "earningsAnnouncement": earningsAnnouncement}
-    except (IndexError, KeyError):
+    except (IndexError, KeyError, TypeError):
         return {"error": f"Could not fetch price for symbol: {symbol}"}
 
 
@@ -146,8 +175,18 @@ def get_company_financials(symbol):
     Fetch basic financial information for the given company symbol such as the industry, the sector, the name of the company, and the market capitalization.
     """
     url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    return _company_financials_result(symbol, fetch_data(url))
+
+
+async def aget_company_financials(symbol):
+    """
+    Async variant of get_company_financials.
+    """
+    url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={FINANCIAL_MODELING_PREP_API_KEY}"
+    return _company_financials_result(symbol, await afetch_data(url))
+
+
+def _company_financials_result(symbol, data):
     try:
         results = data[0]
         financials = {
@@ -161,7 +200,7 @@ def get_company_financials(symbol):
             "price": results["price"],
         }
         return financials
-    except (IndexError, KeyError):
+    except (IndexError, KeyError, TypeError):
         return {"error": f"Could not fetch financials for symbol: {symbol}"}
 
 
@@ -214,9 +253,18 @@ def get_income_statement(symbol):
     gross profit, net income, EBITDA, EPS.
     """
     url = f"https://financialmodelingprep.com/api/v3/income-statement/{symbol}?period=annual&apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    return _income_statement_result(symbol, fetch_data(url))
+
+
+async def aget_income_statement(symbol):
+    """
+    Async variant of get_income_statement.
+    """
+    url = f"https://financialmodelingprep.com/api/v3/income-statement/{symbol}?period=annual&apikey={FINANCIAL_MODELING_PREP_API_KEY}"
+    return _income_statement_result(symbol, await afetch_data(url))
 
+
+def _income_statement_result(symbol, data):
     try:
         results = data[0]
         financials = {
@@ -228,10 +276,9 @@ def get_income_statement(symbol):
             "EPS": results["eps"],
             "EPS diluted": results["epsDiluted"]
         }
-    except (IndexError, KeyError):
-        return data, financials
-
-    return {"error": f"Could not fetch financials for symbol: {symbol}"}
+        return financials
+    except (IndexError, KeyError, TypeError):
+        return {"error": f"Could not fetch financials for symbol: {symbol}"}
 
 
 # DATA PROVIDED BY THIS ENDPOINT:
@@ -283,9 +330,16 @@ def get_income_statement(symbol):
 # In[26]:
 
 
-tool_stock_price = FunctionTool.from_defaults(fn=get_stock_price)
-tool_company_financials = FunctionTool.from_defaults(fn=get_company_financials)
-tool_income_statement = FunctionTool.from_defaults(fn=get_income_statement)
+def static_tool(fn, async_fn):
+    return FunctionTool.from_defaults(
+        fn=observed(shaped(fn), fn.__name__),
+        async_fn=observed(shaped(async_fn, fn.__name__), fn.__name__),
+    )
+
+
+tool_stock_price = static_tool(get_stock_price, aget_stock_price)
+tool_company_financials = static_tool(get_company_financials, aget_company_financials)
+tool_income_statement = static_tool(get_income_statement, aget_income_statement)
 
 dynamic_tools = load_functions_from_directory("functions")
 static_tools = [tool_income_statement, tool_company_financials, tool_stock_price]
@@ -297,12 +351,50 @@ all_tools = dynamic_tools + static_tools
 
 from llama_index.core.agent import FunctionCallingAgent
 
-agent = FunctionCallingAgent.from_tools(
-    all_tools,
-    llm=llm_anthropic,
-    verbose=False,
-    allow_parallel_tool_calls=False,
-)
+# Tool retrieval mode (AGENT_TOOL_RETRIEVAL=1): each query only sends the top-k
+# matching tool schemas (AGENT_TOOL_TOP_K, pins in AGENT_TOOL_PINS) instead of all of them.
+TOOL_RETRIEVAL = os.environ.get('AGENT_TOOL_RETRIEVAL', '').lower() in ('1', 'true', 'yes')
+tool_retriever = ToolRetriever(all_tools) if TOOL_RETRIEVAL else None
+# Fast path (AGENT_FAST_PATH_DISABLED=1 turns it off): simple lookups such as "price of SNOW" are
+# answered from a pattern table and a templated answer, without any LLM call.
+fast_path = None if FAST_PATH_DISABLED else FastPathRouter(all_tools)
+
+def build_agent():
+    """
+    Create an agent with its own chat memory over the shared tools and LLM client.
+    """
+    # Chat history under a token budget: old tool results are compacted, recent turns kept verbatim
+    memory = None if MEMORY_DISABLED else build_memory()
+    if TOOL_RETRIEVAL:
+        new_agent = FunctionCallingAgent.from_tools(
+            tool_retriever=tool_retriever,
+            llm=llm_anthropic,
+            memory=memory,
+            verbose=False,
+            allow_parallel_tool_calls=False,
+        )
+    else:
+        new_agent = FunctionCallingAgent.from_tools(
+            all_tools,
+            llm=llm_anthropic,
+            memory=memory,
+            verbose=False,
+            allow_parallel_tool_calls=False,
+        )
+    # Companies named in a question are fetched in the background while the LLM plans
+    if not PREFETCH_DISABLED:
+        new_agent = PrefetchingAgent(new_agent)
+    # Simple single-company lookups skip the LLM; anything else falls through to the agent
+    if fast_path is not None:
+        new_agent = FastPathAgent(new_agent, fast_path)
+    # Repeated questions are answered from the shared answer cache while their data is fresh
+    if not ANSWER_CACHE_DISABLED:
+        new_agent = CachedAgent(new_agent)
+    # Every turn is traced (tool, FMP and LLM time, payload sizes, tokens), cached answers included
+    return TracedAgent(new_agent)
+
+
+agent = build_agent()
 
 # ## Start Chatting
 
@@ -324,11 +416,35 @@ agent = FunctionCallingAgent.from_tools(
 # In[44]:
 
 
-while True:
-    user_input = input("\nQuery [type exit or quit to exit the chat]:=> ")
-    if user_input.lower() in ["exit", "quit"]:
-        print("Assistant: Thanks for using the chatbot!")
-        break
-    if user_input.lower() != "" :
-        response = agent.chat(user_input)
-        print(str(response))
+# Streaming (default): tokens are printed as they arrive, with tool progress and latency per turn.
+# AGENT_STREAMING=0 waits for the full answer instead.
+STREAMING = os.environ.get('AGENT_STREAMING', '1').lower() in ('1', 'true', 'yes')
+
+def chat_loop():
+    while True:
+        user_input = input("\nQuery [type exit or quit to exit the chat]:=> ")
+        if user_input.lower() in ["exit", "quit"]:
+            print("Assistant: Thanks for using the chatbot!")
+            break
+        if user_input.lower() != "" :
+            if STREAMING:
+                stream_answer(agent, user_input)
+            else:
+                response = agent.chat(user_input)
+                print(str(response))
+
+
+# Server mode: python ClaudeAgent_Financial_data.py --serve
+# (HTTP + WebSocket, one agent memory per session; see utils/chat_server.py for the AGENT_SERVER_* settings)
+# Batch mode: python ClaudeAgent_Financial_data.py --batch queries.jsonl --out results.jsonl --concurrency 8
+# (resumable; see utils/batch_runner.py)
+
+if __name__ == "__main__":
+    if "--serve" in sys.argv:
+        from utils.chat_server import run
+        run(build_agent)
+    elif "--batch" in sys.argv:
+        from utils.batch_runner import main
+        sys.exit(main(build_agent, sys.argv[1:]))
+    else:
+        chat_loop()
@@ -0,0 +1,95 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import urllib.request
+
+from .fixtures import ENDPOINTS, fixture, route
+from .fmp_stub import FmpStub
+from .run import compare, main
+from .scripted_agent import ScriptedAgent, ScriptedLLM
+
+
+class _Tool:
+
+    def __init__(self, name):
+        self.metadata = type("Metadata", (), {"name": name})()
+        self.calls = []
+
+    def call(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"price": 1.0}
+
+    async def acall(self, **kwargs):
+        return self.call(**kwargs)
+
+
+class TestBench(unittest.TestCase):
+
+    def test_every_endpoint_has_a_fixture(self):
+        for endpoint in ENDPOINTS:
+            self.assertIsNotNone(fixture(endpoint, "AAPL", {"query": "apple"}, rows=50), endpoint)
+        self.assertEqual(route("/api/v3/symbol/available-indexes"), ("symbol/available-indexes", None))
+        self.assertEqual(route("/api/v4/historical/employee_count"), ("historical/employee_count", None))
+        self.assertEqual(route("/api/v3/cik-search/apple"), ("cik-search", "apple"))
+        self.assertEqual(route("/api/v3/unknown/AAPL"), (None, None))
+
+    def test_stub_serves_fixtures_and_errors(self):
+        stub = FmpStub(error_rate=0.5, rows=10, seed=1)
+        base = stub.start()
+        try:
+            statuses = []
+            for _ in range(10):
+                try:
+                    with urllib.request.urlopen(f"{base}/api/v3/quote/AAPL,MSFT?apikey=x") as response:
+                        statuses.append(response.status)
+                        body = json.loads(response.read())
+                except urllib.error.HTTPError as exc:
+                    statuses.append(exc.code)
+        finally:
+            stub.stop()
+        self.assertEqual({200, 503}, set(statuses))
+        self.assertEqual([quote["symbol"] for quote in body], ["AAPL", "MSFT"])
+        self.assertEqual(stub.stats()["requests"], 10)
+
+    def test_scripted_agent(self):
+        tool = _Tool("get_stock_price")
+        agent = ScriptedAgent([tool], ScriptedLLM())
+        response = agent.chat("What is the stock price of NVDA?")
+        self.assertEqual(tool.calls, [{"symbol": "NVDA"}])
+        self.assertTrue(str(response).startswith("NVDA is trading"))
+
+        async def stream():
+            response = await agent.astream_chat("Show the last income statement of NVDA")
+            return "".join([token async for token in response.async_response_gen()])
+
+        self.assertTrue(asyncio.run(stream()).startswith("The last annual income statement of NVDA"))
+        self.assertEqual(len(tool.calls), 1)  # get_income_statement is not among the tools
+
+    def test_compare(self):
+        baseline = {"results": {"chat": {"turn_latency": {"p50": 0.1}, "turns_per_second": 100, "turns": 10}}}
+        report = {"results": {"chat": {"turn_latency": {"p50": 0.2}, "turns_per_second": 90, "turns": 5}}}
+        self.assertEqual(compare(report, baseline, 0.25), [("chat.turn_latency.p50", 0.1, 0.2)])
+        report["results"]["chat"]["turns_per_second"] = 50
+        self.assertEqual(len(compare(report, baseline, 0.25)), 2)
+
+    def test_first_run_records_the_machine_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            argv = ["--iterations", "1", "--sessions", "1", "--turns", "1", "--skip-startup", "--latency-ms", "0",
+                    "--tools", "get_stock_price", "--baseline", baseline, "--output", os.path.join(tmp, "report.json"),
+                    "--tolerance", "1000", "--min-delta-ms", "1000"]
+            errors = io.StringIO()
+            with contextlib.redirect_stderr(errors):
+                self.assertEqual(main(argv), 0)
+                self.assertTrue(os.path.exists(baseline))
+                self.assertEqual(main(argv), 0)
+            self.assertIn("recorded", errors.getvalue())
+            self.assertIn("no regressions against", errors.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
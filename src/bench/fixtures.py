@@ -0,0 +1,346 @@
+import datetime
+import json
+import os
+import zlib
+
+# Fixtures for the local FMP stand-in: one generator per endpoint used by the
+# tools, producing responses shaped like the real ones (field names taken from
+# the FMP docs and the recorded samples in the tool modules). Values are
+# derived from the symbol, so every run serves identical data. A directory of
+# recorded responses can be served instead (see load_recorded).
+
+# Tickers that exist in the stand-in's stock list (and so in the symbol index)
+SYMBOLS = (
+    'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'TSLA', 'BRK.B', 'JPM', 'V', 'JNJ', 'WMT', 'PG', 'MA', 'HD',
+    'XOM', 'CVX', 'KO', 'PEP', 'ORCL', 'CRM', 'ADBE', 'NFLX', 'INTC', 'AMD', 'CSCO', 'IBM', 'QCOM', 'SNOW', 'GS',
+)
+NAMES = {
+    'AAPL': 'Apple Inc.', 'MSFT': 'Microsoft Corporation', 'GOOGL': 'Alphabet Inc.', 'AMZN': 'Amazon.com, Inc.',
+    'NVDA': 'NVIDIA Corporation', 'META': 'Meta Platforms, Inc.', 'TSLA': 'Tesla, Inc.',
+    'BRK.B': 'Berkshire Hathaway Inc.', 'JPM': 'JPMorgan Chase & Co.', 'V': 'Visa Inc.',
+    'JNJ': 'Johnson & Johnson', 'WMT': 'Walmart Inc.', 'PG': 'The Procter & Gamble Company',
+    'MA': 'Mastercard Incorporated', 'HD': 'The Home Depot, Inc.', 'XOM': 'Exxon Mobil Corporation',
+    'CVX': 'Chevron Corporation', 'KO': 'The Coca-Cola Company', 'PEP': 'PepsiCo, Inc.',
+    'ORCL': 'Oracle Corporation', 'CRM': 'Salesforce, Inc.', 'ADBE': 'Adobe Inc.', 'NFLX': 'Netflix, Inc.',
+    'INTC': 'Intel Corporation', 'AMD': 'Advanced Micro Devices, Inc.', 'CSCO': 'Cisco Systems, Inc.',
+    'IBM': 'International Business Machines Corporation', 'QCOM': 'QUALCOMM Incorporated',
+    'SNOW': 'Snowflake Inc.', 'GS': 'The Goldman Sachs Group, Inc.',
+}
+SECTORS = ('Technology', 'Financial Services', 'Healthcare', 'Consumer Defensive', 'Energy', 'Communication Services')
+EXCHANGES = ('NASDAQ', 'NYSE')
+TODAY = datetime.date(2024, 9, 13)  # fixed, so fixtures never depend on the day the benchmark runs
+
+
+def _seed(*parts):
+    return zlib.crc32('|'.join(str(part) for part in parts).encode())
+
+
+def _value(symbol, field, low, high):
+    return low + (_seed(symbol, field) % 10_000) / 10_000 * (high - low)
+
+
+def _name(symbol):
+    return NAMES.get(symbol, f"{symbol.title()} Holdings Inc.")
+
+
+def _exchange(symbol):
+    return EXCHANGES[_seed(symbol, 'exchange') % len(EXCHANGES)]
+
+
+def _cik(symbol):
+    return f"{_seed(symbol, 'cik') % 2_000_000:010d}"
+
+
+def _universe(rows):
+    # The named symbols first, then synthetic ones up to `rows`
+    symbols = list(SYMBOLS[:rows])
+    symbols += [f"X{i:05d}" for i in range(rows - len(symbols))]
+    return symbols
+
+
+def quote(symbol):
+    price = round(_value(symbol, 'price', 10, 900), 2)
+    eps = round(_value(symbol, 'eps', 0.5, 25), 2)
+    return {
+        'symbol': symbol, 'name': _name(symbol), 'price': price,
+        'changesPercentage': round(_value(symbol, 'chg', -3, 3), 4), 'change': round(price * 0.01, 2),
+        'dayLow': round(price * 0.99, 2), 'dayHigh': round(price * 1.01, 2),
+        'yearHigh': round(price * 1.2, 2), 'yearLow': round(price * 0.7, 2),
+        'marketCap': int(_value(symbol, 'cap', 1e9, 3e12)), 'priceAvg50': round(price * 0.98, 4),
+        'priceAvg200': round(price * 0.9, 4), 'exchange': _exchange(symbol),
+        'volume': int(_value(symbol, 'volume', 1e5, 1e8)), 'avgVolume': int(_value(symbol, 'avgvol', 1e5, 1e8)),
+        'open': price, 'previousClose': price, 'eps': eps, 'pe': round(price / eps, 2),
+        'earningsAnnouncement': '2024-10-31T00:00:00.000+0000',
+        'sharesOutstanding': int(_value(symbol, 'shares', 1e8, 2e10)), 'timestamp': 1726257601,
+    }
+
+
+def profile(symbol):
+    q = quote(symbol)
+    return {
+        'symbol': symbol, 'price': q['price'], 'beta': round(_value(symbol, 'beta', 0.5, 2), 3),
+        'volAvg': q['avgVolume'], 'mktCap': q['marketCap'], 'lastDiv': 0.96, 'range': f"{q['yearLow']}-{q['yearHigh']}",
+        'changes': q['change'], 'companyName': _name(symbol), 'currency': 'USD', 'cik': _cik(symbol),
+        'isin': f"US{_seed(symbol, 'isin') % 10**10:010d}", 'cusip': f"{_seed(symbol, 'cusip') % 10**9:09d}",
+        'exchange': 'NASDAQ Global Select' if _exchange(symbol) == 'NASDAQ' else 'New York Stock Exchange',
+        'exchangeShortName': _exchange(symbol), 'industry': 'Consumer Electronics',
+        'website': f"https://www.{symbol.lower()}.com", 'description': f"{_name(symbol)} designs and sells products. " * 8,
+        'ceo': 'Jane Doe', 'sector': SECTORS[_seed(symbol, 'sector') % len(SECTORS)], 'country': 'US',
+        'fullTimeEmployees': str(int(_value(symbol, 'employees', 1e3, 3e5))), 'phone': '408 996 1010',
+        'address': 'One Main Street', 'city': 'Cupertino', 'state': 'CA', 'zip': '95014',
+        'dcfDiff': 55.0, 'dcf': q['price'] * 0.8, 'image': f"https://financialmodelingprep.com/image-stock/{symbol}.png",
+        'ipoDate': '1980-12-12', 'defaultImage': False, 'isEtf': False, 'isActivelyTrading': True,
+        'isAdr': False, 'isFund': False,
+    }
+
+
+def _periods(period, limit):
+    count = min(limit, 40 if period == 'quarter' else 10)
+    if period == 'quarter':
+        return [(f"{TODAY.year - 1 - i // 4}-{(12 - 3 * (i % 4)):02d}-30", f"Q{4 - i % 4}", TODAY.year - 1 - i // 4)
+                for i in range(count)]
+    return [(f"{TODAY.year - 1 - i}-09-30", 'FY', TODAY.year - 1 - i) for i in range(count)]
+
+
+def _statement(symbol, period, limit, fields):
+    rows = []
+    for i, (date, label, year) in enumerate(_periods(period, limit)):
+        scale = (0.25 if period == 'quarter' else 1) * (0.93 ** (i / (4 if period == 'quarter' else 1)))
+        row = {'date': date, 'symbol': symbol, 'reportedCurrency': 'USD', 'cik': _cik(symbol),
+               'fillingDate': date, 'calendarYear': str(year), 'period': label}
+        for field, (low, high) in fields.items():
+            row[field] = round(_value(symbol, field, low, high) * scale)
+        rows.append(row)
+    return rows
+
+
+INCOME_FIELDS = {
+    'revenue': (1e9, 4e11), 'costOfRevenue': (5e8, 2e11), 'grossProfit': (5e8, 2e11),
+    'researchAndDevelopmentExpenses': (1e8, 3e10), 'operatingExpenses': (2e8, 5e10),
+    'operatingIncome': (1e8, 1.2e11), 'interestExpense': (1e7, 4e9), 'ebitda': (2e8, 1.3e11),
+    'incomeBeforeTax': (1e8, 1.2e11), 'incomeTaxExpense': (1e7, 2e10), 'netIncome': (1e8, 1e11),
+    'eps': (1, 25), 'epsdiluted': (1, 25), 'weightedAverageShsOut': (1e8, 2e10),
+}
+BALANCE_FIELDS = {
+    'cashAndCashEquivalents': (1e8, 6e10), 'totalCurrentAssets': (1e9, 2e11), 'totalAssets': (5e9, 4e11),
+    'totalCurrentLiabilities': (5e8, 1.5e11), 'totalLiabilities': (2e9, 3e11), 'totalDebt': (1e9, 1.2e11),
+    'totalStockholdersEquity': (1e9, 2e11), 'retainedEarnings': (1e8, 1e11),
+}
+CASH_FLOW_FIELDS = {
+    'netIncome': (1e8, 1e11), 'depreciationAndAmortization': (1e7, 1.2e10), 'operatingCashFlow': (1e8, 1.2e11),
+    'capitalExpenditure': (-1.2e10, -1e7), 'freeCashFlow': (1e8, 1e11), 'dividendsPaid': (-1.5e10, 0),
+}
+KEY_METRIC_FIELDS = {
+    'revenuePerShare': (1, 100), 'netIncomePerShare': (0.5, 25), 'marketCap': (1e9, 3e12), 'peRatio': (5, 60),
+    'priceToSalesRatio': (1, 20), 'debtToEquity': (0.1, 3), 'currentRatio': (0.5, 3), 'dividendYield': (0, 0.05),
+    'roe': (0.05, 1.5), 'freeCashFlowPerShare': (0.5, 20),
+}
+
+
+def _trading_days(start, end, limit):
+    days, day = [], end
+    while day >= start and len(days) < limit:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= datetime.timedelta(days=1)
+    return days
+
+
+def _date_param(params, name, default):
+    try:
+        return min(datetime.date.fromisoformat(params[name][:10]), TODAY)
+    except (KeyError, ValueError):
+        return default
+
+
+def historical(symbol, params, kind):
+    end = _date_param(params, 'to', TODAY)
+    start = _date_param(params, 'from', end - datetime.timedelta(days=365 * 5))
+    limit = int(params.get('limit') or 5000)
+    base = _value(symbol, 'price', 10, 900)
+    rows = []
+    for day in _trading_days(start, end, min(limit, 5000)):
+        drift = 1 + 0.0003 * ((TODAY - day).days % 97 - 48)
+        close = round(base * drift * (0.9997 ** (TODAY - day).days), 2)
+        if kind == 'price':
+            rows.append({'date': day.isoformat(), 'open': close, 'high': round(close * 1.01, 2),
+                         'low': round(close * 0.99, 2), 'close': close, 'adjClose': close,
+                         'volume': int(_value(symbol, day, 1e5, 1e8))})
+        else:
+            rows.append({'symbol': symbol, 'date': day.isoformat(),
+                         'marketCap': int(close * _value(symbol, 'shares', 1e8, 2e10))})
+    return {'symbol': symbol, 'historical': rows} if kind == 'price' else rows
+
+
+def listing(rows, etf=False):
+    return [
+        {'symbol': symbol, 'name': _name(symbol), 'price': quote(symbol)['price'],
+         'exchange': 'NASDAQ Global Select' if _exchange(symbol) == 'NASDAQ' else 'New York Stock Exchange',
+         'exchangeShortName': _exchange(symbol), 'type': 'etf' if etf else 'stock', 'country': 'US'}
+        for symbol in _universe(rows)
+    ]
+
+
+def search(query, limit):
+    query = (query or '').lower()
+    matches = [symbol for symbol in SYMBOLS if query in symbol.lower() or query in _name(symbol).lower()]
+    return [{'symbol': symbol, 'name': _name(symbol), 'currency': 'USD',
+             'stockExchange': 'NASDAQ Global Select', 'exchangeShortName': _exchange(symbol)}
+            for symbol in matches[:limit]]
+
+
+def screener(params, rows):
+    limit = int(params.get('limit') or 100)
+    results = []
+    for symbol in _universe(rows):
+        p = profile(symbol)
+        if params.get('sector') and p['sector'] != params['sector']:
+            continue
+        if params.get('marketCapMoreThan') and p['mktCap'] <= float(params['marketCapMoreThan']):
+            continue
+        results.append({'symbol': symbol, 'companyName': p['companyName'], 'marketCap': p['mktCap'],
+                        'sector': p['sector'], 'industry': p['industry'], 'beta': p['beta'], 'price': p['price'],
+                        'lastAnnualDividend': 0.96, 'volume': quote(symbol)['volume'],
+                        'exchange': p['exchange'], 'exchangeShortName': p['exchangeShortName'], 'country': 'US',
+                        'isEtf': False, 'isActivelyTrading': True})
+        if len(results) >= limit:
+            break
+    return results
+
+
+# Every endpoint the tools call; longer names first so "symbol/available-indexes" wins over "symbol"
+ENDPOINTS = tuple(sorted((
+    'quote', 'quotes', 'profile', 'income-statement', 'balance-sheet-statement', 'cash-flow-statement', 'key-metrics',
+    'market-capitalization', 'historical-market-capitalization', 'historical-price-full', 'stock-screener',
+    'grade', 'key-executives', 'company-core-information', 'employee_count', 'historical/employee_count',
+    'governance/executive_compensation', 'executive-compensation-benchmark', 'company-notes', 'search',
+    'search-ticker', 'search-name', 'cik-search', 'cik', 'cusip', 'search/isin', 'stock/list',
+    'available-traded/list', 'etf/list', 'financial-statement-symbol-lists', 'cik_list',
+    'symbol/available-euronext', 'symbol/available-indexes', 'symbol', 'symbol_change',
+    'commitment_of_traders_report/list',
+), key=len, reverse=True))
+
+
+def route(path):
+    """
+    Split an FMP path ("/api/v3/profile/AAPL") into (endpoint, path argument); (None, None) if unknown.
+    """
+    parts = path.strip('/').split('/', 2)
+    if len(parts) < 3 or parts[0] != 'api':
+        return None, None
+    rest = parts[2]
+    for endpoint in ENDPOINTS:
+        if rest == endpoint:
+            return endpoint, None
+        if rest.startswith(endpoint + '/'):
+            return endpoint, rest[len(endpoint) + 1:]
+    return None, None
+
+
+def fixture(endpoint, arg, params, rows=1000):
+    """
+    The response body for `endpoint` (see route) with path argument `arg`
+    (symbols, CIK, CUSIP or exchange) and query `params`; `rows` sizes the list endpoints.
+    Returns None for endpoints without a fixture.
+    """
+    symbol = (arg or params.get('symbol') or 'AAPL').upper()
+    limit = int(params.get('limit') or 10)
+    period = params.get('period', 'annual')
+    if endpoint == 'quote':
+        return [quote(s) for s in symbol.split(',') if s]
+    if endpoint == 'quotes':
+        return [quote(s) for s in _universe(rows) if _exchange(s) == symbol]
+    if endpoint == 'profile':
+        return [profile(s) for s in symbol.split(',') if s]
+    if endpoint == 'income-statement':
+        return _statement(symbol, period, int(params.get('limit') or 40), INCOME_FIELDS)
+    if endpoint == 'balance-sheet-statement':
+        return _statement(symbol, period, int(params.get('limit') or 40), BALANCE_FIELDS)
+    if endpoint == 'cash-flow-statement':
+        return _statement(symbol, period, int(params.get('limit') or 40), CASH_FLOW_FIELDS)
+    if endpoint == 'key-metrics':
+        return _statement(symbol, period, int(params.get('limit') or 40), KEY_METRIC_FIELDS)
+    if endpoint == 'market-capitalization':
+        return [{'symbol': symbol, 'date': TODAY.isoformat(), 'marketCap': quote(symbol)['marketCap']}]
+    if endpoint == 'historical-market-capitalization':
+        return historical(symbol, params, 'market_cap')
+    if endpoint == 'historical-price-full':
+        return historical(symbol, params, 'price')
+    if endpoint == 'stock-screener':
+        return screener(params, rows)
+    if endpoint == 'grade':
+        return [{'symbol': symbol, 'date': f"2024-0{1 + i % 9}-15", 'gradingCompany': 'Morgan Stanley',
+                 'previousGrade': 'Equal-Weight', 'newGrade': 'Overweight'} for i in range(limit)]
+    if endpoint == 'key-executives':
+        return [{'title': title, 'name': f"Executive {i}", 'pay': 3_000_000 - i * 250_000, 'currencyPay': 'USD',
+                 'gender': 'female' if i % 2 else 'male', 'yearBorn': 1960 + i, 'titleSince': None}
+                for i, title in enumerate(('Chief Executive Officer', 'Chief Financial Officer',
+                                           'Chief Operating Officer', 'General Counsel'))]
+    if endpoint == 'company-core-information':
+        return [{'cik': _cik(symbol), 'symbol': symbol, 'exchange': _exchange(symbol), 'mailingAddress': 'One Main Street',
+                 'businessAddress': 'One Main Street', 'fiscalYearEnd': '09-30', 'stateLocation': 'CA',
+                 'stateOfIncorporation': 'CA', 'taxIdentificationNumber': '942404110', 'sicCode': '3571',
+                 'sicDescription': 'ELECTRONIC COMPUTERS', 'sicGroup': 'Manufacturing'}]
+    if endpoint in ('employee_count', 'historical/employee_count'):
+        years = 1 if endpoint == 'employee_count' else 10
+        return [{'symbol': symbol, 'cik': _cik(symbol), 'acceptanceTime': f"{2023 - i}-11-03 06:01:36",
+                 'periodOfReport': f"{2023 - i}-09-30", 'companyName': _name(symbol), 'formType': '10-K',
+                 'filingDate': f"{2023 - i}-11-03", 'employeeCount': int(_value(symbol, 'employees', 1e3, 3e5)) - i * 500,
+                 'source': 'https://www.sec.gov/'} for i in range(years)]
+    if endpoint == 'governance/executive_compensation':
+        return [{'cik': _cik(symbol), 'symbol': symbol, 'companyName': _name(symbol), 'industryTitle': 'ELECTRONIC COMPUTERS',
+                 'acceptedDate': '2024-01-11 16:31:21', 'filingDate': '2024-01-11',
+                 'nameAndPosition': f"Executive {i} Chief Officer", 'year': 2023, 'salary': 1_000_000,
+                 'bonus': 0, 'stock_award': 10_000_000 - i * 1_000_000, 'incentive_plan_compensation': 3_000_000,
+                 'all_other_compensation': 20_000, 'total': 14_020_000 - i * 1_000_000,
+                 'url': 'https://www.sec.gov/'} for i in range(5)]
+    if endpoint == 'executive-compensation-benchmark':
+        return [{'industryTitle': f"INDUSTRY {i}", 'year': int(params.get('year') or 2023),
+                 'averageCompensation': 500_000 + i * 37_000} for i in range(min(rows, 400))]
+    if endpoint == 'company-notes':
+        return [{'cik': _cik(symbol), 'symbol': symbol, 'title': f"{1 + i}.000% Notes due 20{30 + i}",
+                 'exchange': 'NASDAQ'} for i in range(8)]
+    if endpoint in ('search', 'search-ticker', 'search-name'):
+        return search(params.get('query'), limit)
+    if endpoint == 'cik-search':
+        return [{'cik': _cik(s), 'name': _name(s).upper()} for s in SYMBOLS
+                if (arg or '').lower() in _name(s).lower()][:limit]
+    if endpoint == 'cik':
+        return [{'cik': arg, 'name': _name(s).upper()} for s in SYMBOLS if _cik(s) == arg] or []
+    if endpoint == 'cusip':
+        return [{'ticker': s, 'cusip': arg, 'company': _name(s).upper()} for s in SYMBOLS
+                if profile(s)['cusip'] == arg] or []
+    if endpoint == 'search/isin':
+        return [profile(s) for s in SYMBOLS if profile(s)['isin'] == params.get('isin')]
+    if endpoint in ('stock/list', 'available-traded/list'):
+        return listing(rows)
+    if endpoint == 'etf/list':
+        return listing(rows // 4, etf=True)
+    if endpoint == 'financial-statement-symbol-lists':
+        return _universe(rows)
+    if endpoint == 'cik_list':
+        return [{'cik': _cik(s), 'companyName': _name(s).upper()} for s in _universe(rows)]
+    if endpoint in ('symbol/available-euronext', 'symbol/available-indexes'):
+        return [{'symbol': f"^IDX{i}", 'name': f"Index {i}", 'currency': 'EUR', 'stockExchange': 'Euronext',
+                 'exchangeShortName': 'EURONEXT'} for i in range(min(rows, 300))]
+    if endpoint == 'symbol':
+        return [quote(s) for s in _universe(min(rows, 500))]
+    if endpoint == 'symbol_change':
+        return [{'date': f"2024-0{1 + i % 9}-01", 'name': f"Renamed {i}", 'oldSymbol': f"OLD{i}",
+                 'newSymbol': f"NEW{i}"} for i in range(min(rows, 300))]
+    if endpoint == 'commitment_of_traders_report/list':
+        return [{'trading_symbol': f"C{i}", 'short_name': f"Contract {i}"} for i in range(100)]
+    return None
+
+
+def load_recorded(directory):
+    """
+    Load recorded responses from `directory`: one <endpoint>.json file per endpoint, with "/" in the
+    endpoint written as "__" (e.g. "search__isin.json"). Served for every argument of that endpoint.
+    """
+    recorded = {}
+    for filename in os.listdir(directory):
+        if filename.endswith('.json'):
+            with open(os.path.join(directory, filename)) as f:
+                recorded[filename[:-5].replace('__', '/')] = json.load(f)
+    return recorded
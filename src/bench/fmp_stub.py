@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+
+from aiohttp import web
+
+from .fixtures import fixture, load_recorded, route
+
+# Local stand-in for financialmodelingprep.com. Serves the fixtures of every
+# endpoint the tools use, with configurable latency, error rate and payload
+# size, so tools and whole chat turns can be benchmarked without the network or
+# an API key. Point the agent at it with FMP_BASE_URL=http://host:port (or
+# http_client.configure(base_url=...)).
+#
+#   python -m bench.fmp_stub --port 8765 --latency-ms 80 --error-rate 0.01   (from src/)
+
+
+class FmpStub:
+    """
+    aiohttp app serving FMP fixtures. `latency` (seconds) plus up to `jitter` is added to every
+    response; a `error_rate` fraction of requests fails with `error_status`; `rows` sizes the list
+    endpoints. Randomness is seeded, so a run is repeatable.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, rows=1000, recorded_dir=None,
+                 seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rows = rows
+        self.recorded = load_recorded(recorded_dir) if recorded_dir else {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.by_endpoint = {}
+        self._runner = None
+        self._loop = None
+        self.base_url = None
+
+    def _draw(self):
+        with self._lock:
+            delay = self.latency + self._random.random() * self.jitter
+            failed = self._random.random() < self.error_rate
+        return delay, failed
+
+    async def handle(self, request):
+        endpoint, arg = route(request.path)
+        delay, failed = self._draw()
+        if delay:
+            await asyncio.sleep(delay)
+        with self._lock:
+            self.requests += 1
+            self.by_endpoint[endpoint] = self.by_endpoint.get(endpoint, 0) + 1
+        if failed:
+            with self._lock:
+                self.errors += 1
+            return web.json_response({"Error Message": "Simulated upstream error"}, status=self.error_status)
+        if endpoint in self.recorded:
+            data = self.recorded[endpoint]
+        else:
+            data = fixture(endpoint, arg, dict(request.query), self.rows) if endpoint else None
+        if data is None:
+            return web.json_response({"Error Message": f"No fixture for {request.path}"}, status=404)
+        body = json.dumps(data).encode()
+        with self._lock:
+            self.bytes_sent += len(body)
+        return web.Response(body=body, content_type="application/json")
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        return app
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "bytes_sent": self.bytes_sent,
+                    "by_endpoint": dict(self.by_endpoint)}
+
+    def start(self, host="127.0.0.1", port=0):
+        """
+        Serve from a background thread with its own event loop; returns the base URL.
+        """
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.build_app(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, host, port)
+            self._loop.run_until_complete(site.start())
+            bound_port = site._server.sockets[0].getsockname()[1]
+            self.base_url = f"http://{host}:{bound_port}"
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=serve, name="fmp-stub", daemon=True).start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for financialmodelingprep.com")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--rows", type=int, default=1000, help="rows served by the list endpoints")
+    parser.add_argument("--recorded", help="directory of recorded <endpoint>.json responses")
+    args = parser.parse_args()
+    stub = FmpStub(args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.error_status, args.rows,
+                   args.recorded)
+    web.run_app(stub.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from aiohttp import ClientSession, ClientTimeout
+from aiohttp.test_utils import TestServer
+
+from utils import http_client, rate_limiter, response_cache, symbol_index
+from utils.answer_cache import AnswerCache, CachedAgent
+from utils.chat_server import ChatServer
+from utils.data_utils import load_functions_from_directory
+from utils.fast_path import FastPathAgent, FastPathRouter
+from utils.metrics import get_metrics
+from utils.prefetch import PrefetchingAgent
+
+from .fixtures import SYMBOLS
+from .fmp_stub import FmpStub
+from .scripted_agent import DEFAULT_SCRIPT, ScriptedAgent, ScriptedLLM
+
+# Benchmark harness: runs against the local FMP stand-in and the scripted LLM, so
+# results only measure this code. Reports startup time, per-tool latency and
+# throughput (cold: nothing cached; warm: repeated call) and end-to-end chat
+# turn latency with N concurrent sessions through the chat server, and compares
+# them with a stored baseline. Timings only compare on the machine that made
+# them: the first run records bench/baseline.json (kept out of version control)
+# and later runs compare with it.
+#
+#   python -m bench.run                                (from src/; prints the report)
+#   python -m bench.run --save-baseline                (replace bench/baseline.json with these results)
+#   python -m bench.run --sessions 50 --latency-ms 80  (exit status 1 on a regression)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Arguments for the benchmarked tool calls, by parameter name; {symbol} rotates for cold calls
+ARGUMENTS = {
+    "symbol": "{symbol}",
+    "symbols": "{symbol},MSFT,GOOGL",
+    "metrics": "revenue_growth,net_margin,roe",
+    "query": "Apple",
+    "cik": "0000320193",
+    "cusip": "037833100",
+    "isin": "US0378331005",
+    "year": 2023,
+    "exchange": "NASDAQ",
+}
+SKIPPED_TOOLS = {"get_next_page"}  # needs a token from an earlier result
+
+STARTUP_SNIPPET = (
+    "import time; started = time.perf_counter()\n"
+    "from utils.data_utils import load_functions_from_directory\n"
+    "tools = load_functions_from_directory('functions')\n"
+    "print(time.perf_counter() - started)\n"
+)
+
+
+def _summary(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "mean": statistics.fmean(ordered),
+    }
+
+
+def measure_startup(repeats=3):
+    """
+    Fresh-interpreter startup: total process time and the part spent importing and registering the tools.
+    """
+    total, load = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_SNIPPET], cwd=SRC_PATH, capture_output=True,
+                                text=True, check=True).stdout
+        total.append(time.perf_counter() - started)
+        load.append(float(output.strip().splitlines()[-1]))
+    return {"process_seconds": statistics.median(total), "tool_load_seconds": statistics.median(load)}
+
+
+def load_tools():
+    """
+    The tools from functions/ plus the static tools of the main script when it can be imported here.
+    """
+    tools = load_functions_from_directory("functions")
+    try:
+        import ClaudeAgent_Financial_data as main_script
+        tools += main_script.static_tools
+    except ImportError as exc:
+        print(f"static tools not benchmarked ({exc})", file=sys.stderr)
+    return tools
+
+
+def _arguments(tool, symbol):
+    # Only the required parameters, from the schema the LLM sees
+    arguments = {}
+    for name in tool.metadata.get_parameters_dict().get("required", []):
+        if name not in ARGUMENTS:
+            return None
+        value = ARGUMENTS[name]
+        arguments[name] = value.replace("{symbol}", symbol) if isinstance(value, str) else value
+    return arguments
+
+
+def _reset_caches():
+    cache = response_cache.get_cache()
+    if cache is not None:
+        cache.clear()
+
+
+async def bench_tool(tool, iterations, concurrency):
+    """
+    Latency of `iterations` sequential cold calls (a different symbol each, caches cleared) and
+    warm calls (same call repeated), and cold throughput over 5 x `iterations` calls with
+    `concurrency` in flight.
+    """
+    symbols = [f"B{i:04d}" for i in range(iterations * 6)]
+    if _arguments(tool, "AAPL") is None:
+        return None
+    cold, warm = [], []
+    for symbol in symbols[:iterations]:
+        _reset_caches()
+        arguments = _arguments(tool, symbol)
+        started = time.perf_counter()
+        await tool.acall(**arguments)
+        cold.append(time.perf_counter() - started)
+    arguments = _arguments(tool, "AAPL")
+    await tool.acall(**arguments)
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await tool.acall(**arguments)
+        warm.append(time.perf_counter() - started)
+
+    _reset_caches()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def call(symbol):
+        async with limit:
+            await tool.acall(**_arguments(tool, symbol))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(symbol) for symbol in symbols[iterations:]))
+    elapsed = time.perf_counter() - started
+    return {"cold": _summary(cold), "warm": _summary(warm),
+            "calls_per_second": len(symbols[iterations:]) / elapsed}
+
+
+async def bench_tools(tools, iterations, concurrency, only=None):
+    results = {}
+    for tool in tools:
+        name = tool.metadata.name
+        if name in SKIPPED_TOOLS or (only and name not in only):
+            continue
+        result = await bench_tool(tool, iterations, concurrency)
+        if result is not None:
+            results[name] = result
+    await http_client.aclose()
+    return results
+
+
+async def bench_chat(tools, sessions, turns, think_time, token_delay, wrappers=True):
+    """
+    End-to-end turns through the chat server: `sessions` concurrent sessions, each asking `turns`
+    scripted questions (about its own company) over POST /chat. Returns turn latency and time to first token.
+    """
+    def agent_factory():
+        agent = ScriptedAgent(tools, ScriptedLLM(think_time=think_time, token_delay=token_delay))
+        if not wrappers:
+            return agent
+        return CachedAgent(FastPathAgent(PrefetchingAgent(agent), fast_path), answer_cache)
+
+    answer_cache = AnswerCache()
+    fast_path = FastPathRouter(tools)
+    _reset_caches()
+    server = ChatServer(agent_factory, max_concurrency=max(sessions, 1))
+    test_server = TestServer(server.build_app())
+    await test_server.start_server()
+    latencies, ttfts, failures = [], [], 0
+
+    async def session(client, index):
+        nonlocal failures
+        session_id = None
+        symbol = SYMBOLS[index % len(SYMBOLS)]
+        for turn in range(turns):
+            query = DEFAULT_SCRIPT[turn % len(DEFAULT_SCRIPT)]["query"].replace("{symbol}", symbol)
+            started = time.perf_counter()
+            first = None
+            async with client.post(test_server.make_url("/chat"),
+                                   json={"message": query, "session_id": session_id}) as response:
+                session_id = response.headers.get("X-Session-Id", session_id)
+                async for line in response.content:
+                    frame = json.loads(line)
+                    if frame["type"] == "token" and first is None:
+                        first = time.perf_counter() - started
+                    elif frame["type"] == "error":
+                        failures += 1
+            latencies.append(time.perf_counter() - started)
+            ttfts.append(first if first is not None else latencies[-1])
+
+    started = time.perf_counter()
+    try:
+        async with ClientSession(timeout=ClientTimeout(total=None)) as client:
+            await asyncio.gather(*(session(client, index) for index in range(sessions)))
+    finally:
+        await test_server.close()
+        await http_client.aclose()
+    elapsed = time.perf_counter() - started
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "failures": failures,
+        "turn_latency": _summary(latencies),
+        "time_to_first_token": _summary(ttfts),
+        "turns_per_second": len(latencies) / elapsed,
+        "answer_cache_hits": answer_cache.stats()["hits"],
+        "fast_path_hits": fast_path.stats()["hits"],
+    }
+
+
+def flatten(report, prefix=""):
+    """
+    {"a": {"b": 1}} -> {"a.b": 1}, for comparing reports metric by metric.
+    """
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def _higher_is_better(name):
+    return name.endswith("per_second")
+
+
+def _compared(name):
+    # Medians and throughputs are stable enough to gate on; tails and means are reported only
+    return name.endswith((".p50", "per_second")) or name.startswith("startup.")
+
+
+def compare(report, baseline, tolerance, min_delta=0.001):
+    """
+    Return the metrics that got worse than the baseline by more than `tolerance` (a fraction), as
+    (name, baseline value, current value). Latencies regress upward, throughputs downward; latency
+    changes below `min_delta` seconds are noise.
+    """
+    current, previous = flatten(report["results"]), flatten(baseline["results"])
+    regressions = []
+    for name, old in previous.items():
+        new = current.get(name)
+        if new is None or not old or not _compared(name):
+            continue
+        if _higher_is_better(name):
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance) and new - old >= min_delta
+        if worse:
+            regressions.append((name, old, new))
+    return regressions
+
+
+def run(args):
+    stub = FmpStub(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, error_rate=args.error_rate,
+                   rows=args.rows)
+    http_client.configure(base_url=stub.start(), backoff_factor=0)
+    # The stand-in is not rate limited; measure this code, not the client-side FMP quota
+    rate_limiter.configure(rate=args.fmp_rate, burst=args.fmp_rate)
+    try:
+        symbol_index.ensure_fresh()
+        tools = load_tools()
+        results = {}
+        if not args.skip_startup:
+            results["startup"] = measure_startup()
+        results["tools"] = asyncio.run(bench_tools(tools, args.iterations, args.concurrency, args.tools))
+        results["chat"] = asyncio.run(bench_chat(tools, args.sessions, args.turns, args.think_ms / 1000,
+                                                 args.token_ms / 1000))
+    finally:
+        stub.stop()
+        http_client.configure(base_url="")
+    return {
+        "settings": {key: value for key, value in vars(args).items()
+                     if key not in ("baseline", "save_baseline", "tolerance", "min_delta_ms", "output", "metrics")},
+        "results": results,
+        "stub": stub.stats(),
+        "metrics": get_metrics().render() if args.metrics else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent against a local FMP stand-in")
+    parser.add_argument("--iterations", type=int, default=20, help="calls per tool and mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls in flight for tool throughput")
+    parser.add_argument("--tools", nargs="*", help="only these tools")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=6, help="turns per session")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="scripted LLM time per call")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="scripted LLM time per answer token")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stand-in latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rows", type=int, default=1000, help="rows served by list endpoints")
+    parser.add_argument("--fmp-rate", type=float, default=1e6, help="client-side FMP requests per second")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--metrics", action="store_true", help="include the Prometheus metrics in the report")
+    parser.add_argument("--output", help="write the report to this file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown before a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="latency changes below this are noise")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": report["settings"], "results": report["results"]}, f, indent=2)
+            f.write("\n")
+        if not args.save_baseline:
+            print(f"no baseline on this machine yet: recorded {args.baseline}", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.tolerance, args.min_delta_ms / 1000)
+    for name, old, new in regressions:
+        print(f"REGRESSION {name}: {old:.4g} -> {new:.4g}", file=sys.stderr)
+    if regressions:
+        return 1
+    print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
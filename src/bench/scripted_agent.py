@@ -0,0 +1,200 @@
+import asyncio
+import json
+import re
+import time
+
+from utils.tool_events import emit
+
+# Deterministic stand-in for the LLM and the agent loop, for benchmarks. The
+# scripted LLM matches each query against a script of known questions and
+# "decides" the same tool-call rounds and answer every time, after a fixed think
+# time; the agent runs those calls on the real tools (FunctionTool, so result
+# shaping, events and the whole fetch pipeline are exercised) and streams the
+# answer token by token. It speaks the chat/stream_chat/achat/astream_chat
+# interface the wrappers and the chat server use.
+
+# Each entry: a query template ({symbol} matches a ticker), the rounds of tool calls the LLM makes
+# (calls within a round run in parallel) and the final answer.
+DEFAULT_SCRIPT = [
+    {
+        "query": "What is the stock price of {symbol}?",
+        "rounds": [[("get_stock_price", {"symbol": "{symbol}"})]],
+        "answer": "{symbol} is trading at the price shown above, with its 50 and 200 day averages for context.",
+    },
+    {
+        "query": "Give me the company profile and market cap of {symbol}",
+        "rounds": [[("get_company_profile", {"symbol": "{symbol}"}), ("get_market_cap", {"symbol": "{symbol}"})]],
+        "answer": "Here is the profile of {symbol}: its sector, industry, headquarters and current market cap.",
+    },
+    {
+        "query": "How did revenue and net margin of {symbol} develop over the last 5 years?",
+        "rounds": [[("get_fundamental_metrics", {"symbols": "{symbol}", "metrics": "revenue_growth,net_margin"})]],
+        "answer": "Over the last five fiscal years {symbol} grew revenue as listed while the net margin moved as shown.",
+    },
+    {
+        "query": "Compare {symbol} with MSFT and GOOGL on valuation",
+        "rounds": [
+            [("get_stock_quotes", {"symbols": "{symbol},MSFT,GOOGL"})],
+            [("get_key_metrics", {"symbol": "{symbol}", "limit": 1})],
+        ],
+        "answer": "Compared on PE and price to sales, {symbol} sits between MSFT and GOOGL as the numbers show.",
+    },
+    {
+        "query": "Show the monthly closing prices of {symbol} since 2024-01-01",
+        "rounds": [[("get_historical_prices", {"symbol": "{symbol}", "from_date": "2024-01-01",
+                                               "frequency": "monthly"})]],
+        "answer": "These are the monthly closes of {symbol} since January, newest first.",
+    },
+    {
+        "query": "Show the last income statement of {symbol}",
+        "rounds": [[("get_income_statement", {"symbol": "{symbol}"})]],
+        "answer": "The last annual income statement of {symbol} reports the revenue, margins and EPS above.",
+    },
+]
+FALLBACK_ANSWER = "I can only answer the scripted benchmark questions."
+
+
+def _pattern(template):
+    return re.compile('^' + re.escape(template).replace(re.escape('{symbol}'), r'(?P<symbol>[A-Z][A-Z0-9.]*)') + '$')
+
+
+def _fill(value, symbol):
+    if isinstance(value, str):
+        return value.replace('{symbol}', symbol)
+    return value
+
+
+def _tokens(text):
+    # Rough token count for the simulated usage numbers
+    return max(1, len(text) // 4)
+
+
+class ScriptedLLM:
+    """
+    Plays the LLM's part of every turn from `script`, taking `think_time` seconds per call and
+    `token_delay` seconds per streamed answer token.
+    """
+
+    def __init__(self, script=None, think_time=0.0, token_delay=0.0, model="scripted"):
+        self.script = [dict(entry, pattern=_pattern(entry["query"])) for entry in (script or DEFAULT_SCRIPT)]
+        self.think_time = think_time
+        self.token_delay = token_delay
+        self.model = model
+
+    def plan(self, query):
+        """
+        Return (tool-call rounds, answer) for `query`; unknown queries are answered without tools.
+        """
+        for entry in self.script:
+            match = entry["pattern"].match(query.strip())
+            if match:
+                symbol = match.groupdict().get("symbol") or ""
+                rounds = [[(name, {key: _fill(value, symbol) for key, value in arguments.items()})
+                           for name, arguments in calls] for calls in entry["rounds"]]
+                return rounds, entry["answer"].replace('{symbol}', symbol)
+        return [], FALLBACK_ANSWER
+
+    def called(self, prompt, completion, started):
+        emit("llm", model=self.model, input_tokens=_tokens(prompt), output_tokens=_tokens(completion),
+             duration=time.perf_counter() - started)
+
+
+class ScriptedResponse:
+    """
+    The agent's answer, streamed word by word; the final LLM call completes when the stream does.
+    """
+
+    def __init__(self, llm, prompt, answer):
+        self.llm = llm
+        self.prompt = prompt
+        self.response = answer
+        self.tokens = [word + ' ' for word in answer.split(' ')]
+        self.tokens[-1] = self.tokens[-1].rstrip()
+
+    def __str__(self):
+        return self.response
+
+    @property
+    def response_gen(self):
+        started = time.perf_counter()
+        time.sleep(self.llm.think_time)
+        for token in self.tokens:
+            yield token
+            time.sleep(self.llm.token_delay)
+        self.llm.called(self.prompt, self.response, started)
+
+    async def async_response_gen(self):
+        started = time.perf_counter()
+        await asyncio.sleep(self.llm.think_time)
+        for token in self.tokens:
+            yield token
+            await asyncio.sleep(self.llm.token_delay)
+        self.llm.called(self.prompt, self.response, started)
+
+
+class ScriptedAgent:
+    """
+    Minimal tool-calling agent over `tools` (FunctionTool objects) driven by a ScriptedLLM.
+    """
+
+    def __init__(self, tools, llm=None):
+        self.tools = {tool.metadata.name: tool for tool in tools}
+        self.llm = llm or ScriptedLLM()
+        self.history = []
+
+    def _output(self, name, result):
+        content = getattr(result, "content", result)
+        return f"{name}: {content}"
+
+    def _call(self, name, arguments):
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"{name}: {json.dumps({'error': f'Unknown tool {name}'})}"
+        return self._output(name, tool.call(**arguments))
+
+    async def _acall(self, name, arguments):
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"{name}: {json.dumps({'error': f'Unknown tool {name}'})}"
+        return self._output(name, await tool.acall(**arguments))
+
+    def _turn(self, query):
+        self.history.append(query)
+        return self.llm.plan(query)
+
+    def _prompt(self, outputs):
+        return '\n'.join(self.history + outputs)
+
+    def stream_chat(self, query):
+        rounds, answer = self._turn(query)
+        outputs = []
+        for calls in rounds:
+            started = time.perf_counter()
+            time.sleep(self.llm.think_time)
+            self.llm.called(self._prompt(outputs), json.dumps(calls), started)
+            outputs += [self._call(name, arguments) for name, arguments in calls]
+        self.history.append(answer)
+        return ScriptedResponse(self.llm, self._prompt(outputs), answer)
+
+    async def astream_chat(self, query):
+        rounds, answer = self._turn(query)
+        outputs = []
+        for calls in rounds:
+            started = time.perf_counter()
+            await asyncio.sleep(self.llm.think_time)
+            self.llm.called(self._prompt(outputs), json.dumps(calls), started)
+            outputs += await asyncio.gather(*(self._acall(name, arguments) for name, arguments in calls))
+        self.history.append(answer)
+        return ScriptedResponse(self.llm, self._prompt(outputs), answer)
+
+    def chat(self, query):
+        response = self.stream_chat(query)
+        for _ in response.response_gen:
+            pass
+        return response
+
+    async def achat(self, query):
+        response = await self.astream_chat(query)
+        async for _ in response.async_response_gen():
+            pass
+        return response
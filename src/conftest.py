@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The tool modules and the benchmark import their siblings as top-level packages
+# (`from utils import ...`), as they do when run from src/; tests import them through
+# `src.`. Putting src/ on the path lets `pytest` run both from src/ and from the repo root.
+_SRC = os.path.dirname(os.path.abspath(__file__))
+if _SRC not in sys.path:
+    sys.path.insert(0, _SRC)
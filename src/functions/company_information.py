@@ -1,22 +1,30 @@
-import requests
 import os
 
+from utils.http_client import FetchError, afetch_data, astream_records, fetch_data, stream_records
+from utils.screener import LOCAL_SCREENER_DISABLED, NUMERIC, get_universe_cache
+from utils.symbol_index import get_index
+from utils.time_series import ahistory, history
+
 # Replace with your actual API key
 API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
 
-def fetch_data(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to fetch data. Status code: {response.status_code}"}
-
 def get_company_profile(symbol):
     """
     Retrieve a comprehensive overview of a company, including price, beta, market capitalization, description, headquarters, and more.
     """
     url = f'https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={API_KEY}'
-    return fetch_data(url)
+    data = fetch_data(url)
+    get_index().observe(data)  # profiles carry the CIK, CUSIP and ISIN the search index can answer from
+    return data
+
+async def aget_company_profile(symbol):
+    """
+    Async variant of get_company_profile.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={API_KEY}'
+    data = await afetch_data(url)
+    get_index().observe(data)
+    return data
 
 def get_executive_compensation(symbol):
     """
@@ -25,6 +33,13 @@ def get_executive_compensation(symbol):
     url = f'https://financialmodelingprep.com/api/v4/governance/executive_compensation?symbol={symbol}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_executive_compensation(symbol):
+    """
+    Async variant of get_executive_compensation.
+    """
+    url = f'https://financialmodelingprep.com/api/v4/governance/executive_compensation?symbol={symbol}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_compensation_benchmark(year):
     """
     Compare a company's executive compensation to other companies in the same industry.
@@ -32,6 +47,13 @@ def get_compensation_benchmark(year):
     url = f'https://financialmodelingprep.com/api/v4/executive-compensation-benchmark?year={year}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_compensation_benchmark(year):
+    """
+    Async variant of get_compensation_benchmark.
+    """
+    url = f'https://financialmodelingprep.com/api/v4/executive-compensation-benchmark?year={year}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_company_notes(symbol):
     """
     Retrieve notes reported by a company in their financial statements, including information about financial condition, operations, and risks.
@@ -39,6 +61,13 @@ def get_company_notes(symbol):
     url = f'https://financialmodelingprep.com/api/v4/company-notes?symbol={symbol}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_company_notes(symbol):
+    """
+    Async variant of get_company_notes.
+    """
+    url = f'https://financialmodelingprep.com/api/v4/company-notes?symbol={symbol}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_historical_employee_count(symbol):
     """
     Track how a company's workforce has grown or shrunk over time.
@@ -46,6 +75,13 @@ def get_historical_employee_count(symbol):
     url = f'https://financialmodelingprep.com/api/v4/historical/employee_count?symbol={symbol}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_historical_employee_count(symbol):
+    """
+    Async variant of get_historical_employee_count.
+    """
+    url = f'https://financialmodelingprep.com/api/v4/historical/employee_count?symbol={symbol}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_employee_count(symbol):
     """
     Retrieve the current number of employees in a company.
@@ -53,21 +89,131 @@ def get_employee_count(symbol):
     url = f'https://financialmodelingprep.com/api/v4/employee_count?symbol={symbol}&apikey={API_KEY}'
     return fetch_data(url)
 
-def stock_screener(market_cap_more_than=None, sector=None, industry=None, country=None, limit=100):
+async def aget_employee_count(symbol):
     """
-    Find stocks that meet specific investment criteria such as market cap, sector, industry, and country.
+    Async variant of get_employee_count.
     """
+    url = f'https://financialmodelingprep.com/api/v4/employee_count?symbol={symbol}&apikey={API_KEY}'
+    return await afetch_data(url)
+
+def _screen_request(bounds, categories, sort_by):
+    # bounds: {universe field: (more than, lower than)} as passed to the tool
+    ranges = {}
+    for field, (low, high) in bounds.items():
+        if low is None and high is None:
+            continue
+        try:
+            ranges[field] = (float(low) if low is not None else None, float(high) if high is not None else None)
+        except (TypeError, ValueError):
+            return None, {"error": f"The {field} bounds must be numbers"}
+    if sort_by not in NUMERIC:
+        return None, {"error": f"Unknown sort_by: {sort_by}. Use one of {', '.join(NUMERIC)}"}
+    return (ranges, categories), None
+
+def _ascending(value):
+    # The LLM may pass the flag as a string: "false" must not sort ascending
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'asc', 'ascending')
+    return bool(value)
+
+def _screen(universe, request, sort_by, ascending, limit):
+    ranges, categories = request
+    try:
+        return universe.screen(ranges, categories, sort_by, _ascending(ascending), int(limit))
+    except KeyError as e:
+        field, value = e.args
+        known = universe.values(field)
+        return {"error": f"Unknown {field}: {value}. Known values: {', '.join(known[:40])}"
+                         + (", ..." if len(known) > 40 else "")}
+
+# Rows requested from the remote screener when its own order (market cap, descending) is not the one asked for
+FALLBACK_ROWS = 10000
+
+def _fallback_error(request, sort_by):
+    # FMP's screener has no P/E filter and its rows carry no P/E: such screens need the local universe
+    if "pe" in request[0] or sort_by == "pe":
+        return {"error": "P/E screens are unavailable right now (the stock universe is still loading). "
+                         "Retry later or screen without the P/E bounds and sort."}
+    return None
+
+def _screener_url(request, sort_by, ascending, limit):
+    # Remote fallback while the local universe is unavailable
+    ranges, categories = request
+    if sort_by != "marketCap" or _ascending(ascending):
+        limit = max(int(limit), FALLBACK_ROWS)  # sorted locally, see _sorted_rows
     url = f'https://financialmodelingprep.com/api/v3/stock-screener?apikey={API_KEY}'
-    if market_cap_more_than:
-        url += f'&marketCapMoreThan={market_cap_more_than}'
-    if sector:
-        url += f'&sector={sector}'
-    if industry:
-        url += f'&industry={industry}'
-    if country:
-        url += f'&country={country}'
-    url += f'&limit={limit}'
-    return fetch_data(url)
+    for field, (low, high) in ranges.items():
+        if low is not None:
+            url += f'&{field}MoreThan={int(low) if low.is_integer() else low}'
+        if high is not None:
+            url += f'&{field}LowerThan={int(high) if high.is_integer() else high}'
+    for field, value in categories.items():
+        if value:
+            url += f'&{"exchange" if field == "exchangeShortName" else field}={value}'
+    return url + f'&limit={limit}'
+
+def _sorted_rows(data, sort_by, ascending, limit):
+    # The remote screener sorts by market cap, descending: apply the requested order and limit
+    if not isinstance(data, list):
+        return data
+    ascending = _ascending(ascending)
+    known = [row for row in data if isinstance(row.get(sort_by), (int, float))]
+    unknown = [row for row in data if not isinstance(row.get(sort_by), (int, float))]
+    known.sort(key=lambda row: row[sort_by], reverse=not ascending)
+    return (known + unknown)[:max(0, int(limit))]
+
+def stock_screener(market_cap_more_than=None, sector=None, industry=None, country=None, limit=100,
+                   market_cap_lower_than=None, beta_more_than=None, beta_lower_than=None, price_more_than=None,
+                   price_lower_than=None, volume_more_than=None, volume_lower_than=None, pe_more_than=None,
+                   pe_lower_than=None, exchange=None, sort_by="marketCap", ascending=False):
+    """
+    Find stocks that meet specific investment criteria such as market cap, beta, price, volume, PE ratio, sector, industry, country and exchange (e.g. NASDAQ, NYSE). Every numeric filter has a _more_than and a _lower_than bound; sector, industry, country and exchange accept comma-separated values. Results are sorted by `sort_by` (marketCap, beta, price, volume, pe or lastAnnualDividend), descending unless `ascending`, and cut to the top `limit`. Screens run locally over a snapshot of all tradable stocks, so narrowing the criteria with repeated calls is cheap.
+    """
+    request, error = _screen_request(
+        {"marketCap": (market_cap_more_than, market_cap_lower_than), "beta": (beta_more_than, beta_lower_than),
+         "price": (price_more_than, price_lower_than), "volume": (volume_more_than, volume_lower_than),
+         "pe": (pe_more_than, pe_lower_than)},
+        {"sector": sector, "industry": industry, "country": country, "exchangeShortName": exchange},
+        sort_by,
+    )
+    if error:
+        return error
+    if not LOCAL_SCREENER_DISABLED:
+        try:
+            return _screen(get_universe_cache().get(), request, sort_by, ascending, limit)
+        except FetchError:
+            pass
+    error = _fallback_error(request, sort_by)
+    if error:
+        return error
+    return _sorted_rows(fetch_data(_screener_url(request, sort_by, ascending, limit)), sort_by, ascending, limit)
+
+async def astock_screener(market_cap_more_than=None, sector=None, industry=None, country=None, limit=100,
+                          market_cap_lower_than=None, beta_more_than=None, beta_lower_than=None,
+                          price_more_than=None, price_lower_than=None, volume_more_than=None, volume_lower_than=None,
+                          pe_more_than=None, pe_lower_than=None, exchange=None, sort_by="marketCap", ascending=False):
+    """
+    Async variant of stock_screener.
+    """
+    request, error = _screen_request(
+        {"marketCap": (market_cap_more_than, market_cap_lower_than), "beta": (beta_more_than, beta_lower_than),
+         "price": (price_more_than, price_lower_than), "volume": (volume_more_than, volume_lower_than),
+         "pe": (pe_more_than, pe_lower_than)},
+        {"sector": sector, "industry": industry, "country": country, "exchangeShortName": exchange},
+        sort_by,
+    )
+    if error:
+        return error
+    if not LOCAL_SCREENER_DISABLED:
+        try:
+            return _screen(await get_universe_cache().aget(), request, sort_by, ascending, limit)
+        except FetchError:
+            pass
+    error = _fallback_error(request, sort_by)
+    if error:
+        return error
+    data = await afetch_data(_screener_url(request, sort_by, ascending, limit))
+    return _sorted_rows(data, sort_by, ascending, limit)
 
 def get_stock_grade(symbol):
     """
@@ -76,6 +222,13 @@ def get_stock_grade(symbol):
     url = f'https://financialmodelingprep.com/api/v3/grade/{symbol}?apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_stock_grade(symbol):
+    """
+    Async variant of get_stock_grade.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/grade/{symbol}?apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_executives(symbol):
     """
     Retrieve information about a company's key executives.
@@ -83,6 +236,13 @@ def get_executives(symbol):
     url = f'https://financialmodelingprep.com/api/v3/key-executives/{symbol}?apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_executives(symbol):
+    """
+    Async variant of get_executives.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/key-executives/{symbol}?apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_company_core_information(symbol):
     """
     Retrieve core information about a company, such as CIK, exchange, and address.
@@ -90,6 +250,13 @@ def get_company_core_information(symbol):
     url = f'https://financialmodelingprep.com/api/v4/company-core-information?symbol={symbol}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_company_core_information(symbol):
+    """
+    Async variant of get_company_core_information.
+    """
+    url = f'https://financialmodelingprep.com/api/v4/company-core-information?symbol={symbol}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_market_cap(symbol):
     """
     Retrieve the current market capitalization of a company.
@@ -97,28 +264,51 @@ def get_market_cap(symbol):
     url = f'https://financialmodelingprep.com/api/v3/market-capitalization/{symbol}?apikey={API_KEY}'
     return fetch_data(url)
 
-def get_historical_market_cap(symbol, limit=100, from_date=None, to_date=None):
+async def aget_market_cap(symbol):
     """
-    Retrieve historical market capitalization data for a company.
+    Async variant of get_market_cap.
     """
-    url = f'https://financialmodelingprep.com/api/v3/historical-market-capitalization/{symbol}?limit={limit}&apikey={API_KEY}'
-    if from_date:
-        url += f'&from={from_date}'
-    if to_date:
-        url += f'&to={to_date}'
-    return fetch_data(url)
+    url = f'https://financialmodelingprep.com/api/v3/market-capitalization/{symbol}?apikey={API_KEY}'
+    return await afetch_data(url)
+
+def get_historical_market_cap(symbol, limit=100, from_date=None, to_date=None, frequency="daily"):
+    """
+    Retrieve historical market capitalization data for a company, newest first. Dates are YYYY-MM-DD; `frequency` is daily, weekly, monthly, quarterly or yearly.
+    """
+    # Served from the local time-series store; only days not fetched before are downloaded
+    return history("market_cap", symbol, from_date, to_date, limit, frequency)
+
+async def aget_historical_market_cap(symbol, limit=100, from_date=None, to_date=None, frequency="daily"):
+    """
+    Async variant of get_historical_market_cap.
+    """
+    return await ahistory("market_cap", symbol, from_date, to_date, limit, frequency)
 
 def get_all_countries():
     """
     Retrieve a list of all countries where stocks are traded.
     """
     url = f'https://financialmodelingprep.com/api/v3/stock/list?apikey={API_KEY}'
-    data = fetch_data(url)
-    if "error" not in data:
+    try:
+        # Stream the list and keep only the country field instead of materializing every stock
+        countries = set()
+        for stock in stream_records(url, fields=('country',)):
+            if 'country' in stock:
+                countries.add(stock['country'])
+        return list(countries)
+    except FetchError as exc:
+        return exc.error
+
+async def aget_all_countries():
+    """
+    Async variant of get_all_countries.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/stock/list?apikey={API_KEY}'
+    try:
         countries = set()
-        for stock in data:
+        async for stock in astream_records(url, fields=('country',)):
             if 'country' in stock:
                 countries.add(stock['country'])
         return list(countries)
-    else:
-        return data
\ No newline at end of file
+    except FetchError as exc:
+        return exc.error
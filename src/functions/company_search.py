@@ -1,62 +1,171 @@
 import os
 
-import requests
+from utils.http_client import afetch_data, fetch_data
+from utils.symbol_index import aensure_fresh, ensure_fresh
 
 # Replace with your actual API key
 API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
 
-def fetch_data(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to fetch data. Status code: {response.status_code}"}
-
 def general_search(query):
     """
     Search over 70,000 symbols by symbol name or company name, including cryptocurrencies, forex, stocks, ETFs, and other financial instruments.
     """
+    index = ensure_fresh()
+    results = index.search(query)
+    if results:
+        return results
     url = f'https://financialmodelingprep.com/api/v3/search?query={query}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def ageneral_search(query):
+    """
+    Async variant of general_search.
+    """
+    index = await aensure_fresh()
+    results = index.search(query)
+    if results:
+        return results
+    url = f'https://financialmodelingprep.com/api/v3/search?query={query}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def ticker_search(query, limit=10, exchange=''):
     """
     Find ticker symbols and exchanges for both equity securities and ETFs by searching with the company name or ticker symbol.
     """
+    index = ensure_fresh()
+    results = index.search(query, limit, exchange)
+    if results:
+        return results
     url = f'https://financialmodelingprep.com/api/v3/search-ticker?query={query}&limit={limit}&exchange={exchange}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def aticker_search(query, limit=10, exchange=''):
+    """
+    Async variant of ticker_search.
+    """
+    index = await aensure_fresh()
+    results = index.search(query, limit, exchange)
+    if results:
+        return results
+    url = f'https://financialmodelingprep.com/api/v3/search-ticker?query={query}&limit={limit}&exchange={exchange}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def name_search(query, limit=10, exchange=''):
     """
     Find ticker symbols and exchange information for equity securities and ETFs by searching with the company name.
     """
+    index = ensure_fresh()
+    results = index.search(query, limit, exchange, by_name_only=True)
+    if results:
+        return results
     url = f'https://financialmodelingprep.com/api/v3/search-name?query={query}&limit={limit}&exchange={exchange}&apikey={API_KEY}'
     return fetch_data(url)
 
+async def aname_search(query, limit=10, exchange=''):
+    """
+    Async variant of name_search.
+    """
+    index = await aensure_fresh()
+    results = index.search(query, limit, exchange, by_name_only=True)
+    if results:
+        return results
+    url = f'https://financialmodelingprep.com/api/v3/search-name?query={query}&limit={limit}&exchange={exchange}&apikey={API_KEY}'
+    return await afetch_data(url)
+
 def cik_name_search(query):
     """
     Discover CIK numbers for SEC-registered entities by company name.
     """
+    index = ensure_fresh()
+    results = index.search_cik_names(query)
+    if results:
+        return results
     url = f'https://financialmodelingprep.com/api/v3/cik-search/{query}?apikey={API_KEY}'
     return fetch_data(url)
 
+async def acik_name_search(query):
+    """
+    Async variant of cik_name_search.
+    """
+    index = await aensure_fresh()
+    results = index.search_cik_names(query)
+    if results:
+        return results
+    url = f'https://financialmodelingprep.com/api/v3/cik-search/{query}?apikey={API_KEY}'
+    return await afetch_data(url)
+
 def cik_search(cik):
     """
     Find registered company names linked to SEC-registered entities using their CIK Number.
     """
+    index = ensure_fresh()
+    results = index.lookup_cik(cik)
+    if results:
+        return results
     url = f'https://financialmodelingprep.com/api/v3/cik/{cik}?apikey={API_KEY}'
     return fetch_data(url)
 
+async def acik_search(cik):
+    """
+    Async variant of cik_search.
+    """
+    index = await aensure_fresh()
+    results = index.lookup_cik(cik)
+    if results:
+        return results
+    url = f'https://financialmodelingprep.com/api/v3/cik/{cik}?apikey={API_KEY}'
+    return await afetch_data(url)
+
 def cusip_search(cusip):
     """
     Access information about financial instruments and securities by entering their unique CUSIP numbers.
     """
+    index = ensure_fresh()
+    results = index.lookup_cusip(cusip)
+    if results:
+        return results
     url = f'https://financialmodelingprep.com/api/v3/cusip/{cusip}?apikey={API_KEY}'
-    return fetch_data(url)
+    data = fetch_data(url)
+    if isinstance(data, list):
+        index.observe([{"symbol": r.get("ticker"), "name": r.get("company"), "cusip": r.get("cusip")} for r in data])
+    return data
+
+async def acusip_search(cusip):
+    """
+    Async variant of cusip_search.
+    """
+    index = await aensure_fresh()
+    results = index.lookup_cusip(cusip)
+    if results:
+        return results
+    url = f'https://financialmodelingprep.com/api/v3/cusip/{cusip}?apikey={API_KEY}'
+    data = await afetch_data(url)
+    if isinstance(data, list):
+        index.observe([{"symbol": r.get("ticker"), "name": r.get("company"), "cusip": r.get("cusip")} for r in data])
+    return data
 
 def isin_search(isin):
     """
     Find information about financial instruments and securities by entering their unique ISIN.
     """
+    index = ensure_fresh()
+    results = index.lookup_isin(isin)
+    if results:
+        return results
     url = f'https://financialmodelingprep.com/api/v4/search/isin?isin={isin}&apikey={API_KEY}'
-    return fetch_data(url)
+    data = fetch_data(url)
+    index.observe(data)
+    return data
+
+async def aisin_search(isin):
+    """
+    Async variant of isin_search.
+    """
+    index = await aensure_fresh()
+    results = index.lookup_isin(isin)
+    if results:
+        return results
+    url = f'https://financialmodelingprep.com/api/v4/search/isin?isin={isin}&apikey={API_KEY}'
+    data = await afetch_data(url)
+    index.observe(data)
+    return data
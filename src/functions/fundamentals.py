@@ -0,0 +1,84 @@
+import os
+
+from utils.fundamentals import (PERIODS, acompute_metrics, available_metrics, compute_metrics, get_store,
+                                required_columns, statement_url)
+from utils.http_client import afetch_data, fetch_data
+from utils.quote_batcher import normalize_symbols
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+
+def _key_metrics_url(symbol, period, limit):
+    return f'https://financialmodelingprep.com/api/v3/key-metrics/{symbol}?period={period}&limit={limit}&apikey={API_KEY}'
+
+def _metric_request(symbols, metrics, period):
+    symbols = normalize_symbols(symbols)
+    if isinstance(metrics, str):
+        metrics = metrics.replace(',', ' ').split()
+    metrics = [metric.strip() if '.' in metric else metric.strip().lower() for metric in metrics or ()]
+    if period not in PERIODS:
+        return None, {"error": f"Unknown period: {period}. Use one of {', '.join(PERIODS)}"}
+    if not symbols or not metrics:
+        return None, {"error": "Provide at least one symbol and one metric"}
+    for metric in metrics:
+        try:
+            required_columns(metric)
+        except KeyError:
+            return None, {"error": f"Unknown metric: {metric}. Available: {', '.join(available_metrics())}"}
+    return (symbols, metrics), None
+
+def get_fundamental_metrics(symbols, metrics, period="annual", periods=5):
+    """
+    Compute fundamentals for one or many companies across fiscal periods in a single call, e.g. revenue growth over 5 years for 20 companies. `symbols` is a comma-separated list of tickers ("AAPL,MSFT"). `metrics` is a comma-separated list of: revenue, gross_profit, operating_income, net_income, ebitda, eps, total_assets, total_liabilities, total_equity, total_debt, cash, operating_cash_flow, capex, free_cash_flow, dividends_paid, gross_margin, operating_margin, net_margin, ebitda_margin, fcf_margin, current_ratio, debt_to_equity, roe, roa; append _growth for period-over-period growth or _cagr for the compound annual growth rate (e.g. revenue_cagr). `period` is annual or quarter and `periods` the number of most recent periods.
+    """
+    request, error = _metric_request(symbols, metrics, period)
+    if error:
+        return error
+    return compute_metrics(get_store(), *request, period=period, periods=int(periods))
+
+async def aget_fundamental_metrics(symbols, metrics, period="annual", periods=5):
+    """
+    Async variant of get_fundamental_metrics.
+    """
+    request, error = _metric_request(symbols, metrics, period)
+    if error:
+        return error
+    return await acompute_metrics(get_store(), *request, period=period, periods=int(periods))
+
+def _latest(data, limit):
+    return data[:int(limit)] if isinstance(data, list) else data
+
+def get_balance_sheet_statement(symbol, period="annual", limit=4):
+    """
+    Retrieve the most recent balance sheets of a company (assets, liabilities, debt, cash, shareholders' equity). `period` is annual or quarter; `limit` is the number of periods.
+    """
+    return _latest(fetch_data(statement_url(symbol, "balance", period)), limit)
+
+async def aget_balance_sheet_statement(symbol, period="annual", limit=4):
+    """
+    Async variant of get_balance_sheet_statement.
+    """
+    return _latest(await afetch_data(statement_url(symbol, "balance", period)), limit)
+
+def get_cash_flow_statement(symbol, period="annual", limit=4):
+    """
+    Retrieve the most recent cash flow statements of a company (operating cash flow, capital expenditure, free cash flow, dividends, buybacks). `period` is annual or quarter; `limit` is the number of periods.
+    """
+    return _latest(fetch_data(statement_url(symbol, "cash_flow", period)), limit)
+
+async def aget_cash_flow_statement(symbol, period="annual", limit=4):
+    """
+    Async variant of get_cash_flow_statement.
+    """
+    return _latest(await afetch_data(statement_url(symbol, "cash_flow", period)), limit)
+
+def get_key_metrics(symbol, period="annual", limit=4):
+    """
+    Retrieve key metrics of a company per period, such as revenue per share, free cash flow per share, PE, price to book, EV to EBITDA, debt to equity, dividend yield and ROE. `period` is annual or quarter; `limit` is the number of periods.
+    """
+    return fetch_data(_key_metrics_url(symbol, period, limit))
+
+async def aget_key_metrics(symbol, period="annual", limit=4):
+    """
+    Async variant of get_key_metrics.
+    """
+    return await afetch_data(_key_metrics_url(symbol, period, limit))
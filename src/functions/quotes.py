@@ -0,0 +1,35 @@
+from utils.quote_batcher import afetch_quotes, fetch_quotes
+from utils.time_series import ahistory, history
+
+QUOTE_FIELDS = ('name', 'price', 'changesPercentage', 'change', 'dayLow', 'dayHigh', 'yearLow', 'yearHigh',
+                'marketCap', 'volume', 'avgVolume', 'priceAvg50', 'priceAvg200', 'eps', 'pe', 'earningsAnnouncement')
+
+def _project(quotes):
+    return {
+        symbol: quote if "error" in quote else {field: quote.get(field) for field in QUOTE_FIELDS}
+        for symbol, quote in quotes.items()
+    }
+
+def get_stock_quotes(symbols):
+    """
+    Fetch current quotes for several stocks in one call, e.g. to compare them: price, daily change, day and year range, market cap, volume, 50d and 200d average price, EPS, PE and the next earnings announcement. `symbols` is a comma-separated list of tickers such as "AAPL,MSFT,GOOGL". Returns a map of each symbol to its quote or to an error.
+    """
+    return _project(fetch_quotes(symbols))
+
+async def aget_stock_quotes(symbols):
+    """
+    Async variant of get_stock_quotes.
+    """
+    return _project(await afetch_quotes(symbols))
+
+def get_historical_prices(symbol, from_date=None, to_date=None, frequency="daily", limit=100):
+    """
+    Retrieve historical end-of-day prices of a stock, newest first: open, high, low, close, adjusted close and volume. Dates are YYYY-MM-DD; `frequency` is daily, weekly, monthly, quarterly or yearly; `limit` caps the number of rows.
+    """
+    return history("price", symbol, from_date, to_date, limit, frequency)
+
+async def aget_historical_prices(symbol, from_date=None, to_date=None, frequency="daily", limit=100):
+    """
+    Async variant of get_historical_prices.
+    """
+    return await ahistory("price", symbol, from_date, to_date, limit, frequency)
@@ -0,0 +1,13 @@
+from utils.result_shaping import next_page
+
+def get_next_page(page_token):
+    """
+    Retrieve the next page of rows from a previous tool result that returned a next_page_token.
+    """
+    return next_page(page_token)
+
+async def aget_next_page(page_token):
+    """
+    Async variant of get_next_page.
+    """
+    return next_page(page_token)
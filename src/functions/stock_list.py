@@ -1,43 +1,77 @@
-import requests
 import os
 
+from utils.http_client import FetchError, afetch_data, afetch_records, fetch_data, fetch_records
+from utils.symbol_table import get_tables
+
 # Replace with your actual API key
 API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
 
-def fetch_data(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to fetch data. Status code: {response.status_code}"}
+# The big symbol lists are served from compact local tables (utils/symbol_table.py)
+def _records(name, exchange, limit):
+    try:
+        return get_tables().get(name).records(exchange, limit)
+    except FetchError as e:
+        return e.error
+
+async def _arecords(name, exchange, limit):
+    try:
+        return (await get_tables().aget(name)).records(exchange, limit)
+    except FetchError as e:
+        return e.error
 
-def get_all_stocks():
+def get_all_stocks(exchange=None, limit=None):
     """
-    Retrieve a comprehensive list of all traded and non-traded stocks.
+    Retrieve a comprehensive list of all traded and non-traded stocks, optionally only those listed on `exchange` (e.g. NASDAQ) and at most `limit` of them.
     """
-    url = f'https://financialmodelingprep.com/api/v3/stock/list?apikey={API_KEY}'
-    return fetch_data(url)
+    return _records("stocks", exchange, limit)
 
-def get_etf_list():
+async def aget_all_stocks(exchange=None, limit=None):
     """
-    Retrieve a list of all Exchange Traded Funds (ETFs).
+    Async variant of get_all_stocks.
     """
-    url = f'https://financialmodelingprep.com/api/v3/etf/list?apikey={API_KEY}&limit=10'
-    return fetch_data(url)
+    return await _arecords("stocks", exchange, limit)
 
-def get_financial_statement_symbols():
+def get_etf_list(exchange=None, limit=None):
+    """
+    Retrieve a list of all Exchange Traded Funds (ETFs), optionally only those listed on `exchange` and at most `limit` of them.
     """
-    Retrieve a list of all companies with available financial statements.
+    return _records("etfs", exchange, limit)
+
+async def aget_etf_list(exchange=None, limit=None):
+    """
+    Async variant of get_etf_list.
+    """
+    return await _arecords("etfs", exchange, limit)
+
+def get_financial_statement_symbols(limit=None):
+    """
+    Retrieve a list of all companies with available financial statements, at most `limit` of them if given.
     """
     url = f'https://financialmodelingprep.com/api/v3/financial-statement-symbol-lists?apikey={API_KEY}'
-    return fetch_data(url)
+    if limit is None:
+        return fetch_data(url)
+    return fetch_records(url, limit=limit)
 
-def get_tradable_stocks():
+async def aget_financial_statement_symbols(limit=None):
     """
-    Retrieve a list of all actively traded stocks.
+    Async variant of get_financial_statement_symbols.
     """
-    url = f'https://financialmodelingprep.com/api/v3/available-traded/list?apikey={API_KEY}'
-    return fetch_data(url)
+    url = f'https://financialmodelingprep.com/api/v3/financial-statement-symbol-lists?apikey={API_KEY}'
+    if limit is None:
+        return await afetch_data(url)
+    return await afetch_records(url, limit=limit)
+
+def get_tradable_stocks(exchange=None, limit=None):
+    """
+    Retrieve a list of all actively traded stocks, optionally only those listed on `exchange` (e.g. NYSE) and at most `limit` of them.
+    """
+    return _records("tradable", exchange, limit)
+
+async def aget_tradable_stocks(exchange=None, limit=None):
+    """
+    Async variant of get_tradable_stocks.
+    """
+    return await _arecords("tradable", exchange, limit)
 
 def get_commitment_of_traders_report():
     """
@@ -46,12 +80,30 @@ def get_commitment_of_traders_report():
     url = f'https://financialmodelingprep.com/api/v4/commitment_of_traders_report/list?apikey={API_KEY}'
     return fetch_data(url)
 
-def get_cik_list():
+async def aget_commitment_of_traders_report():
+    """
+    Async variant of get_commitment_of_traders_report.
+    """
+    url = f'https://financialmodelingprep.com/api/v4/commitment_of_traders_report/list?apikey={API_KEY}'
+    return await afetch_data(url)
+
+def get_cik_list(limit=None):
     """
-    Retrieve a comprehensive list of 13F CIK numbers for SEC-registered entities.
+    Retrieve a comprehensive list of 13F CIK numbers for SEC-registered entities, at most `limit` of them if given.
     """
     url = f'https://financialmodelingprep.com/api/v3/cik_list?apikey={API_KEY}'
-    return fetch_data(url)
+    if limit is None:
+        return fetch_data(url)
+    return fetch_records(url, limit=limit)
+
+async def aget_cik_list(limit=None):
+    """
+    Async variant of get_cik_list.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/cik_list?apikey={API_KEY}'
+    if limit is None:
+        return await afetch_data(url)
+    return await afetch_records(url, limit=limit)
 
 def get_euronext_symbols():
     """
@@ -60,6 +112,13 @@ def get_euronext_symbols():
     url = f'https://financialmodelingprep.com/api/v3/symbol/available-euronext?apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_euronext_symbols():
+    """
+    Async variant of get_euronext_symbols.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/symbol/available-euronext?apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_symbol_changes():
     """
     Retrieve the latest symbol changes due to mergers, acquisitions, stock splits, and name changes.
@@ -67,6 +126,13 @@ def get_symbol_changes():
     url = f'https://financialmodelingprep.com/api/v4/symbol_change?apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_symbol_changes():
+    """
+    Async variant of get_symbol_changes.
+    """
+    url = f'https://financialmodelingprep.com/api/v4/symbol_change?apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_exchange_symbols(exchange):
     """
     Retrieve all symbols for a given exchange.
@@ -74,9 +140,23 @@ def get_exchange_symbols(exchange):
     url = f'https://financialmodelingprep.com/api/v3/symbol/{exchange}?apikey={API_KEY}'
     return fetch_data(url)
 
+async def aget_exchange_symbols(exchange):
+    """
+    Async variant of get_exchange_symbols.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/symbol/{exchange}?apikey={API_KEY}'
+    return await afetch_data(url)
+
 def get_available_indexes():
     """
     Retrieve a list of all available indexes.
     """
     url = f'https://financialmodelingprep.com/api/v3/symbol/available-indexes?apikey={API_KEY}'
     return fetch_data(url)
+
+async def aget_available_indexes():
+    """
+    Async variant of get_available_indexes.
+    """
+    url = f'https://financialmodelingprep.com/api/v3/symbol/available-indexes?apikey={API_KEY}'
+    return await afetch_data(url)
@@ -0,0 +1,312 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .response_cache import HOUR, get_cache, ttl_for
+from .symbol_index import get_index
+from .tool_events import recording
+
+# Answer-level cache in front of the agent. Repeated questions ("What's AAPL's
+# market cap?" / "what's  Apple's market cap") normalize to the same key and are
+# answered without running the agent. An answer lives only as long as the
+# freshest-expiring FMP response it was built from.
+
+CACHE_SIZE = int(os.environ.get('AGENT_ANSWER_CACHE_SIZE', 256))
+MAX_TTL = float(os.environ.get('AGENT_ANSWER_CACHE_MAX_TTL', HOUR))
+CACHE_DISABLED = os.environ.get('AGENT_ANSWER_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+logger = logging.getLogger(__name__)
+
+_word = re.compile(r"\$?[A-Za-z0-9][A-Za-z0-9.&\-']*")
+_possessive = re.compile(r"'s?$")
+_ticker = re.compile(r'^[A-Z][A-Z0-9]{0,5}(\.[A-Z]{1,2})?$')
+# Capitalized words that start questions or name data, never a company by themselves
+_NOT_NAMES = {
+    'what', 'whats', 'which', 'who', 'how', 'when', 'where', 'why', 'is', 'are', 'was', 'give', 'show', 'tell',
+    'get', 'find', 'list', 'compare', 'the', 'a', 'an', 'and', 'or', 'of', 'for', 'in', 'on', 'to', 'me', 'please',
+    'last', 'current', 'price', 'revenue', 'market', 'cap', 'stock', 'stocks', 'eps', 'pe', 'ceo', 'i', 'can',
+}
+MAX_NAME_WORDS = 3
+
+
+def normalize_query(query, index=None):
+    """
+    Return (key, tickers): the query lower-cased with punctuation, possessives and extra whitespace
+    removed and companies replaced by "$TICKER" (explicit upper-case tickers and capitalized company
+    names known to the symbol index), plus the tickers found.
+    """
+    index = index if index is not None else get_index()
+    words = [_possessive.sub('', word.rstrip('.')) for word in _word.findall(query or '')]
+    words = [word for word in words if word]
+    tokens, tickers, i = [], [], 0
+    while i < len(words):
+        word = words[i]
+        symbol = None
+        if word.startswith('$') or (_ticker.match(word) and word.lower() not in _NOT_NAMES):
+            candidate = word.lstrip('$').upper()
+            if index.lookup_ticker(candidate):
+                symbol = candidate
+        span = 1
+        if symbol is None and word[0].isupper() and word.lower() not in _NOT_NAMES:
+            # Longest run of words that is exactly a known company name ("Snowflake", "Goldman Sachs")
+            for span in range(min(MAX_NAME_WORDS, len(words) - i), 0, -1):
+                symbol = index.lookup_name(' '.join(words[i:i + span]))
+                if symbol:
+                    break
+            span = span if symbol else 1
+        if symbol:
+            tokens.append(f"${symbol}")
+            tickers.append(symbol)
+        else:
+            tokens.append(word.lower())
+        i += span
+    return ' '.join(tokens), tickers
+
+
+def remember_turn(agent, query, answer):
+    """
+    Record a turn answered without running `agent` (query and answer) in the agent's chat memory.
+    """
+    memory = getattr(agent, "memory", None)
+    if memory is None:
+        return
+    try:
+        from llama_index.core.llms import ChatMessage, MessageRole
+        memory.put(ChatMessage(role=MessageRole.USER, content=query))
+        memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=answer))
+    except Exception:
+        logger.exception("could not record an answer in the agent memory")
+
+
+class CachedResponse:
+    """
+    A cached answer, usable wherever the agent's chat or streaming response is.
+    """
+
+    cached = True
+
+    def __init__(self, entry):
+        self.response = entry["answer"]
+        self.tool_calls = entry["tool_calls"]
+
+    def __str__(self):
+        return self.response
+
+    @property
+    def response_gen(self):
+        return iter([self.response])
+
+    async def async_response_gen(self):
+        yield self.response
+
+
+class AnswerCache:
+    """
+    LRU of final answers keyed by normalized query; each entry expires with the data behind it.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE, max_ttl=MAX_TTL, clock=time.time):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.latency_saved = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.latency_saved += entry["latency"]
+            return entry
+
+    def expiry(self, fetch_keys):
+        """
+        When an answer built from the FMP responses `fetch_keys` goes stale: the earliest expiry among them.
+        """
+        now = self.clock()
+        response_cache = get_cache()
+        expires_at = now + self.max_ttl
+        for key in fetch_keys:
+            cached_until = response_cache.expires_at(key) if response_cache is not None else None
+            expires_at = min(expires_at, cached_until or now + ttl_for(key))
+        return expires_at
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stored += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved": self.latency_saved,
+            }
+
+
+def _entry(cache, query, answer, events, latency):
+    """
+    Build the cache entry for a finished turn, or None when the turn must not be cached.
+    """
+    tool_calls = [
+        {"tool": event["tool"], "result": event.get("result"), "ok": event.get("ok")}
+        for event in events if event["type"] == "tool_end"
+    ]
+    # Answers built without data (or from a failed call) may depend on the conversation or be transient
+    if not tool_calls or not all(call["ok"] for call in tool_calls) or not answer:
+        return None
+    fetch_keys = {event["key"] for event in events if event["type"] == "fetch"}
+    return {
+        "query": query,
+        "answer": answer,
+        "tool_calls": tool_calls,
+        "latency": latency,
+        "created_at": cache.clock(),
+        "expires_at": cache.expiry(fetch_keys),
+    }
+
+
+class CachedAgent:
+    """
+    Wraps an agent so chat/stream_chat (and their async variants) are answered from the cache when
+    the same normalized question was answered before with still-fresh data. Only questions that
+    name at least one company are cached, so follow-ups ("and its revenue?") always reach the agent.
+    """
+
+    def __init__(self, agent, cache=None):
+        self.agent = agent
+        self.cache = cache if cache is not None else get_answer_cache()
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def _lookup(self, query):
+        key, tickers = normalize_query(query)
+        if not tickers:
+            return None, None
+        entry = self.cache.get(key)
+        if entry is not None:
+            logger.info("answer cache hit for %r (~%.1fs saved)", key, entry["latency"])
+            # Keep the agent's memory consistent with what the user saw, for follow-up questions
+            remember_turn(self.agent, query, entry["answer"])
+        return key, entry
+
+    def _store(self, key, query, answer, events, started):
+        entry = _entry(self.cache, query, answer, events, time.perf_counter() - started)
+        if key is not None and entry is not None:
+            self.cache.set(key, entry)
+
+    def chat(self, query, *args, **kwargs):
+        key, entry = self._lookup(query)
+        if entry is not None:
+            return CachedResponse(entry)
+        started = time.perf_counter()
+        with recording() as events:
+            response = self.agent.chat(query, *args, **kwargs)
+        self._store(key, query, str(response), events, started)
+        return response
+
+    async def achat(self, query, *args, **kwargs):
+        key, entry = self._lookup(query)
+        if entry is not None:
+            return CachedResponse(entry)
+        started = time.perf_counter()
+        with recording() as events:
+            response = await self.agent.achat(query, *args, **kwargs)
+        self._store(key, query, str(response), events, started)
+        return response
+
+    def stream_chat(self, query, *args, **kwargs):
+        key, entry = self._lookup(query)
+        if entry is not None:
+            return CachedResponse(entry)
+        started = time.perf_counter()
+        with recording() as events:
+            response = self.agent.stream_chat(query, *args, **kwargs)
+        return _RecordingStream(response, lambda answer: self._store(key, query, answer, events, started))
+
+    async def astream_chat(self, query, *args, **kwargs):
+        key, entry = self._lookup(query)
+        if entry is not None:
+            return CachedResponse(entry)
+        started = time.perf_counter()
+        with recording() as events:
+            response = await self.agent.astream_chat(query, *args, **kwargs)
+        return _RecordingStream(response, lambda answer: self._store(key, query, answer, events, started))
+
+
+class _RecordingStream:
+    """
+    Proxy for a streaming response that hands the complete answer to `on_complete` once fully streamed.
+    """
+
+    def __init__(self, response, on_complete):
+        self._response = response
+        self._on_complete = on_complete
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def __str__(self):
+        return str(self._response)
+
+    @property
+    def response_gen(self):
+        tokens = []
+        for token in self._response.response_gen:
+            tokens.append(token)
+            yield token
+        self._on_complete(''.join(tokens))
+
+    async def async_response_gen(self):
+        tokens = []
+        async for token in self._response.async_response_gen():
+            tokens.append(token)
+            yield token
+        self._on_complete(''.join(tokens))
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Return the process-wide answer cache (shared by every session's agent).
+    """
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache()
+    return _answer_cache
+
+
+def answer_cache_stats():
+    return get_answer_cache().stats()
@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+
+from src.utils import tool_events
+from src.utils.answer_cache import AnswerCache, CachedAgent, normalize_query
+from src.utils.symbol_index import SymbolIndex
+
+STOCKS = [
+    {"symbol": "SNOW", "name": "Snowflake Inc.", "exchangeShortName": "NYSE"},
+    {"symbol": "AAPL", "name": "Apple Inc.", "exchangeShortName": "NASDAQ"},
+    {"symbol": "APC.DE", "name": "Apple Inc.", "exchangeShortName": "XETRA"},
+    {"symbol": "GS", "name": "The Goldman Sachs Group, Inc.", "exchangeShortName": "NYSE"},
+]
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def get_market_cap(symbol):
+    tool_events.emit("fetch", key=f"/api/v3/market-capitalization/{symbol}", cached=False)
+    return [{"symbol": symbol, "marketCap": 1}]
+
+
+class _FakeResponse:
+
+    def __init__(self, text):
+        self.text = text
+        self.response_gen = iter([text[:7], text[7:]])
+
+    def __str__(self):
+        return self.text
+
+
+class _FakeAgent:
+
+    def __init__(self):
+        self.calls = 0
+        self.tool = tool_events.observed(get_market_cap)
+
+    def chat(self, query):
+        self.calls += 1
+        self.tool("AAPL")
+        return _FakeResponse(f"answer {self.calls}")
+
+    async def achat(self, query):
+        return self.chat(query)
+
+    def stream_chat(self, query):
+        return self.chat(query)
+
+
+class TestAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SymbolIndex()
+        self.index.update(STOCKS)
+
+    def test_normalize_query(self):
+        key, tickers = normalize_query("What's AAPL's  market cap?", self.index)
+        self.assertEqual(key, "what $AAPL market cap")
+        self.assertEqual(normalize_query("what's Apple's market cap", self.index), (key, ["AAPL"]))
+        self.assertEqual(normalize_query("Last revenue for Goldman Sachs?", self.index)[0], "last revenue for $GS")
+        # Only capitalized words are read as company names; no company means no tickers
+        self.assertEqual(normalize_query("what is the market doing", self.index)[1], [])
+
+    def test_hits_until_the_underlying_data_expires(self):
+        clock = _Clock()
+        agent = _FakeAgent()
+        cached = CachedAgent(agent, AnswerCache(clock=clock))
+        from src.utils import answer_cache
+        original, answer_cache.get_index = answer_cache.get_index, lambda: self.index
+        try:
+            self.assertEqual(str(cached.chat("What's AAPL's market cap?")), "answer 1")
+            response = cached.chat("what's apple's market cap")  # not capitalized: a different question
+            self.assertEqual(str(response), "answer 2")
+            response = cached.chat("what's  Apple's market cap?")
+            self.assertTrue(response.cached)
+            self.assertEqual(str(response), "answer 1")
+            self.assertEqual(response.tool_calls[0]["tool"], "get_market_cap")
+            self.assertEqual(agent.calls, 2)
+            self.assertEqual(cached.cache.stats()["hits"], 1)
+
+            clock.now += 61  # market-capitalization data is cached for a minute
+            self.assertEqual(str(cached.chat("What's AAPL's market cap?")), "answer 3")
+
+            streamed = "".join(cached.stream_chat("Market cap of Snowflake").response_gen)
+            self.assertEqual(streamed, "answer 4")
+            self.assertEqual("".join(cached.stream_chat("market cap of Snowflake").response_gen), "answer 4")
+            self.assertEqual(str(asyncio.run(cached.achat("What's AAPL's market cap?"))), "answer 3")
+            self.assertEqual(agent.calls, 4)
+        finally:
+            answer_cache.get_index = original
+
+
+if __name__ == "__main__":
+    unittest.main()
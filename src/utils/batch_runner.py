@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+from .http_client import aclose
+from .tool_events import recording
+
+# Batch mode for nightly jobs: runs every query of a JSONL or CSV file through a
+# pool of agents (each with its own chat memory, all sharing the tools, the HTTP
+# session and the caches of this process), at most `concurrency` at a time.
+# Results are appended to a JSONL file as they finish; that file is also the
+# checkpoint, so rerunning the same command after an interruption only runs the
+# queries without a result yet.
+#
+#   python ClaudeAgent_Financial_data.py --batch queries.jsonl --out results.jsonl --concurrency 8
+#   python ClaudeAgent_Financial_data.py --batch tickers.csv --template "What is the stock price of {symbol}?"
+
+CONCURRENCY = int(os.environ.get('AGENT_BATCH_CONCURRENCY', 4))
+QUERY_TIMEOUT = float(os.environ.get('AGENT_REQUEST_TIMEOUT', 120))
+PROGRESS_SECONDS = 10
+QUERY_FIELDS = ("query", "message", "question")
+PERCENTILES = (50, 90, 95, 99)
+
+logger = logging.getLogger(__name__)
+
+
+def _query(record, template):
+    if template:
+        return template.format(**record)
+    for field in QUERY_FIELDS:
+        if record.get(field):
+            return str(record[field])
+    raise ValueError(f"no {'/'.join(QUERY_FIELDS)} field")
+
+
+def read_queries(path, template=None):
+    """
+    Return [(id, query, record)] from a JSONL file (a string or an object with "query" and optional "id"
+    per line) or a CSV file with a header row. With `template`, the query is template.format(**record),
+    e.g. "What is the stock price of {symbol}?" over a CSV of tickers. Ids default to the line number.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline='') as f:
+            records = [(number, row) for number, row in enumerate(csv.DictReader(f), 2)]
+    else:
+        with open(path) as f:
+            records = [(number, json.loads(line)) for number, line in enumerate(f, 1) if line.strip()]
+    queries, seen = [], set()
+    for number, record in records:
+        if not isinstance(record, dict):
+            record = {"query": record}
+        try:
+            query = _query(record, template)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"{path}, line {number}: cannot build a query ({e})") from None
+        query_id = str(record.get("id") or number)
+        if query_id in seen:
+            raise ValueError(f"{path}, line {number}: duplicate id {query_id}")
+        seen.add(query_id)
+        queries.append((query_id, query, record))
+    return queries
+
+
+def load_checkpoint(path, retry_failed=False):
+    """
+    Ids that already have a result in `path` (failed ones too, unless `retry_failed`). A last line cut
+    short by an interruption is removed so appending resumes on a clean line. With `retry_failed` the
+    failed results are removed from the file as well, so every id keeps one result once they reran.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb') as f:
+        data = f.read()
+    complete = data.rfind(b'\n') + 1
+    if complete < len(data):
+        with open(path, 'r+b') as f:
+            f.truncate(complete)
+    lines = data[:complete].splitlines()
+    done, kept = set(), []
+    for line in lines:
+        try:
+            result = json.loads(line)
+        except ValueError:
+            kept.append(line)
+            continue
+        if retry_failed and result.get("error"):
+            continue
+        done.add(str(result["id"]))
+        kept.append(line)
+    if len(kept) < len(lines):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.writelines(line + b'\n' for line in kept)
+        os.replace(tmp_path, path)
+    return done
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def summarize(latencies, failed, skipped, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "queries": len(ordered),
+        "failed": failed,
+        "skipped": skipped,
+        "elapsed_seconds": elapsed,
+        "queries_per_minute": len(ordered) / elapsed * 60 if elapsed else None,
+        "latency": dict({f"p{p}": percentile(ordered, p) for p in PERCENTILES},
+                        max=ordered[-1] if ordered else None,
+                        mean=sum(ordered) / len(ordered) if ordered else None),
+    }
+
+
+class BatchRunner:
+    """
+    Runs queries through `concurrency` agents from `agent_factory`, writing one JSON line per result to `out`.
+    """
+
+    def __init__(self, agent_factory, concurrency=CONCURRENCY, timeout=QUERY_TIMEOUT, progress=sys.stderr):
+        self.agent_factory = agent_factory
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.progress = progress
+        self.latencies = []
+        self.failed = 0
+        self._last_progress = 0.0
+
+    async def _answer(self, agent, query_id, query, record):
+        started = time.perf_counter()
+        result = {"id": query_id, "query": query}
+        with recording() as events:
+            try:
+                response = await asyncio.wait_for(agent.achat(query), self.timeout)
+                result["answer"] = str(response)
+                result["cached"] = getattr(response, "cached", False)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                result["error"] = f"Timed out after {self.timeout:g}s"
+            except Exception as e:
+                logger.warning("query %s failed: %r", query_id, e)
+                result["error"] = f"{type(e).__name__}: {e}"
+            finally:
+                # Queries are independent: the next one starts with an empty chat memory
+                reset = getattr(agent, "reset", None)
+                if reset is not None:
+                    reset()
+        result["tools"] = [event["tool"] for event in events if event["type"] == "tool_end"]
+        result["latency"] = time.perf_counter() - started
+        extra = {key: value for key, value in record.items() if key not in result and key not in QUERY_FIELDS}
+        return dict(result, **extra)
+
+    async def _worker(self, pending, out, total, started):
+        agent = self.agent_factory()
+        while True:
+            try:
+                query_id, query, record = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await self._answer(agent, query_id, query, record)
+            self.latencies.append(result["latency"])
+            self.failed += bool(result.get("error"))
+            out.write(json.dumps(result, default=str) + '\n')
+            out.flush()
+            self._report_progress(total, started)
+
+    def _report_progress(self, total, started, final=False):
+        now = time.perf_counter()
+        if self.progress is None or not (final or now - self._last_progress >= PROGRESS_SECONDS):
+            return
+        self._last_progress = now
+        done = len(self.latencies)
+        rate = done / (now - started) * 60 if now > started else 0.0
+        self.progress.write(f"[{done}/{total}] {rate:.1f} queries/min, {self.failed} failed\n")
+        self.progress.flush()
+
+    async def run(self, queries, out_path, retry_failed=False):
+        """
+        Run the queries of [(id, query, record)] without a result in `out_path` yet; returns the summary.
+        """
+        done = load_checkpoint(out_path, retry_failed)
+        pending = asyncio.Queue()
+        for query_id, query, record in queries:
+            if query_id not in done:
+                pending.put_nowait((query_id, query, record))
+        total = pending.qsize()
+        skipped = len(queries) - total
+        started = self._last_progress = time.perf_counter()
+        with open(out_path, 'a') as out:
+            try:
+                await asyncio.gather(*(self._worker(pending, out, total, started)
+                                       for _ in range(min(self.concurrency, total))))
+            finally:
+                await aclose()
+        self._report_progress(total, started, final=True)
+        return summarize(self.latencies, self.failed, skipped, time.perf_counter() - started)
+
+
+def main(agent_factory, argv=None):
+    parser = argparse.ArgumentParser(description="Run the agent over a file of queries")
+    parser.add_argument("--batch", required=True, metavar="PATH", help="queries, .jsonl or .csv")
+    parser.add_argument("--out", help="results JSONL, also the checkpoint (default: <input>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="agents running at the same time")
+    parser.add_argument("--timeout", type=float, default=QUERY_TIMEOUT, help="seconds per query")
+    parser.add_argument("--template", help='query built from each record, e.g. "Price of {symbol}?"')
+    parser.add_argument("--retry-failed", action="store_true", help="rerun queries whose result is an error")
+    parser.add_argument("--restart", action="store_true", help="ignore and overwrite earlier results")
+    args, _ = parser.parse_known_args(argv)
+
+    out_path = args.out or os.path.splitext(args.batch)[0] + ".results.jsonl"
+    queries = read_queries(args.batch, args.template)
+    if args.restart and os.path.exists(out_path):
+        os.remove(out_path)
+    runner = BatchRunner(agent_factory, args.concurrency, args.timeout)
+    summary = asyncio.run(runner.run(queries, out_path, args.retry_failed))
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 1 if summary["failed"] else 0
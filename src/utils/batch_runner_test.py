@@ -0,0 +1,127 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.utils import tool_events
+from src.utils.batch_runner import BatchRunner, load_checkpoint, main, read_queries, summarize
+
+
+class _FakeAgent:
+    in_flight = 0
+    max_in_flight = 0
+    created = 0
+
+    def __init__(self):
+        _FakeAgent.created += 1
+        self.resets = 0
+
+    async def achat(self, query):
+        _FakeAgent.in_flight += 1
+        _FakeAgent.max_in_flight = max(_FakeAgent.max_in_flight, _FakeAgent.in_flight)
+        try:
+            tool_events.emit("tool_end", "get_stock_price", duration=0.0, ok=True)
+            await asyncio.sleep(0.01)
+            if "FAIL" in query:
+                raise RuntimeError("upstream down")
+            if "SLOW" in query:
+                await asyncio.sleep(1)
+            return f"answer to {query}"
+        finally:
+            _FakeAgent.in_flight -= 1
+
+    def reset(self):
+        self.resets += 1
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        _FakeAgent.in_flight = _FakeAgent.max_in_flight = _FakeAgent.created = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def _results(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_read_queries(self):
+        jsonl = self._write("q.jsonl", '"price of AAPL?"\n\n{"id": "x", "query": "profile of MSFT", "desk": "tech"}\n')
+        self.assertEqual(read_queries(jsonl), [("1", "price of AAPL?", {"query": "price of AAPL?"}),
+                                               ("x", "profile of MSFT", {"id": "x", "query": "profile of MSFT",
+                                                                         "desk": "tech"})])
+        tickers = self._write("t.csv", "symbol\nAAPL\nMSFT\n")
+        self.assertEqual([(query_id, query) for query_id, query, _ in read_queries(tickers, "Price of {symbol}?")],
+                         [("2", "Price of AAPL?"), ("3", "Price of MSFT?")])
+        with self.assertRaises(ValueError):
+            read_queries(tickers)
+        with self.assertRaises(ValueError):
+            read_queries(self._write("d.jsonl", '{"id": 1, "query": "a"}\n{"id": 1, "query": "b"}\n'))
+
+    def test_runs_with_bounded_concurrency_and_streams_results(self):
+        queries = [(str(i), f"price of S{i}" + (" FAIL" if i == 3 else ""), {"symbol": f"S{i}"}) for i in range(20)]
+        out_path = os.path.join(self.directory, "results.jsonl")
+        progress = io.StringIO()
+        summary = asyncio.run(BatchRunner(_FakeAgent, concurrency=4, progress=progress).run(queries, out_path))
+        self.assertEqual(_FakeAgent.created, 4)
+        self.assertEqual(_FakeAgent.max_in_flight, 4)
+        results = {result["id"]: result for result in self._results(out_path)}
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results["0"]["answer"], "answer to price of S0")
+        self.assertEqual(results["0"]["symbol"], "S0")
+        self.assertEqual(results["0"]["tools"], ["get_stock_price"])
+        self.assertEqual(results["3"]["error"], "RuntimeError: upstream down")
+        self.assertEqual(summary["queries"], 20)
+        self.assertEqual(summary["failed"], 1)
+        self.assertGreater(summary["queries_per_minute"], 0)
+        self.assertLessEqual(summary["latency"]["p50"], summary["latency"]["p99"])
+        self.assertIn("[20/20]", progress.getvalue())
+
+    def test_resume_skips_finished_queries(self):
+        out_path = self._write("results.jsonl", '{"id": "0", "answer": "done"}\n{"id": "1", "error": "boom"}\n{"id": "2", "ans')
+        self.assertEqual(load_checkpoint(out_path), {"0", "1"})
+        # The line cut short by the interruption is gone
+        self.assertEqual(len(self._results(out_path)), 2)
+        self.assertEqual(load_checkpoint(out_path, retry_failed=True), {"0"})
+        # The failed result is dropped from the file: the rerun's result replaces it
+        self.assertEqual([result["id"] for result in self._results(out_path)], ["0"])
+
+        queries = [(str(i), f"price of S{i}", {}) for i in range(4)]
+        summary = asyncio.run(BatchRunner(_FakeAgent, concurrency=2, progress=None).run(queries, out_path, True))
+        self.assertEqual(summary["skipped"], 1)
+        self.assertEqual(summary["queries"], 3)
+        self.assertEqual(sorted(result["id"] for result in self._results(out_path)), ["0", "1", "2", "3"])
+        self.assertEqual(load_checkpoint(out_path, retry_failed=True), {"0", "1", "2", "3"})
+
+    def test_timeout_and_cli(self):
+        path = self._write("q.jsonl", '"price of AAPL"\n"price of SLOW"\n')
+        out_path = os.path.join(self.directory, "out.jsonl")
+        status = main(_FakeAgent, ["--batch", path, "--out", out_path, "--timeout", "0.2", "--concurrency", "2"])
+        self.assertEqual(status, 1)
+        results = {result["id"]: result for result in self._results(out_path)}
+        self.assertEqual(results["2"]["error"], "Timed out after 0.2s")
+        # Nothing left to run on a rerun
+        self.assertEqual(main(_FakeAgent, ["--batch", path, "--out", out_path]), 0)
+        self.assertEqual(len(self._results(out_path)), 2)
+
+    def test_summarize(self):
+        summary = summarize([float(i) for i in range(1, 101)], 0, 0, 30.0)
+        self.assertEqual(summary["queries_per_minute"], 200.0)
+        self.assertEqual(summary["latency"]["p50"], 51.0)
+        self.assertEqual(summary["latency"]["p99"], 100.0)
+        self.assertIsNone(summarize([], 0, 0, 0.0)["latency"]["p50"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+
+# Record/replay of FMP traffic. In record mode every upstream response is
+# appended to a gzip-compressed cassette, keyed by its cache key (so the API key
+# never reaches the file); in replay mode recorded responses are served from
+# memory without touching the network or the rate limiter, and an unrecorded
+# request raises CassetteMiss, so CI and load tests run fully offline ("strict"
+# is the same mode under its older name). Record-missing mode serves what is
+# recorded and fetches and records the rest.
+#
+#   FMP_CASSETTE_MODE=record|replay|record-missing   FMP_CASSETTE_PATH=fmp_cassette.jsonl.gz
+
+MODES = ('off', 'record', 'record-missing', 'replay', 'strict')
+MODE = os.environ.get('FMP_CASSETTE_MODE', 'off').lower()
+PATH = os.environ.get('FMP_CASSETTE_PATH', 'fmp_cassette.jsonl.gz')
+REDACTED = 'REDACTED'
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMiss(Exception):
+    """
+    Raised in replay mode for a request that is not on the cassette.
+    """
+
+
+def _secrets():
+    return [value for value in (os.environ.get('FINANCIAL_MODELING_PREP_API_KEY'),) if value]
+
+
+class Cassette:
+    """
+    Recorded responses by cache key: {key: (status, body bytes)}, loaded from and appended to `path`.
+    """
+
+    def __init__(self, path=PATH, mode=MODE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if mode != 'off' and os.path.exists(path):
+            self._load()
+
+    @property
+    def replaying(self):
+        return self.mode in ('record-missing', 'replay', 'strict')
+
+    @property
+    def recording(self):
+        return self.mode in ('record', 'record-missing')
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries[entry['key']] = (entry['status'], entry['body'].encode())
+        except EOFError:
+            # The last append of an interrupted recording is cut short; everything before it is intact.
+            # Rewrite the file now so later appends do not follow the broken stream.
+            logger.warning("cassette %s ends in a truncated record", self.path)
+            self._dirty = True
+            self.save()
+
+    def lookup(self, key):
+        """
+        The recorded (status, body) for `key`, or None. Raises CassetteMiss in replay mode.
+        """
+        if not self.replaying:
+            return None
+        entry = self.entries.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None and not self.recording:
+            raise CassetteMiss(f"No recorded response for {key} in {self.path}")
+        return entry
+
+    def record(self, key, status, body):
+        if not self.recording:
+            return
+        text = body.decode('utf-8', 'replace')
+        for secret in _secrets():
+            text = text.replace(secret, REDACTED)
+        with self._lock:
+            self.entries[key] = (status, text.encode())
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = gzip.open(self.path, 'at', encoding='utf-8')
+            self._file.write(json.dumps({'key': key, 'status': status, 'body': text}) + '\n')
+            self._file.flush()
+            self._dirty = True
+            self.recorded += 1
+
+    def save(self):
+        """
+        Rewrite the cassette as one compressed stream with a single (the latest) response per key.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not self._dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for key in sorted(self.entries):
+                    status, body = self.entries[key]
+                    f.write(json.dumps({'key': key, 'status': status, 'body': body.decode()}) + '\n')
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def stats(self):
+        with self._lock:
+            return {"mode": self.mode, "entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "recorded": self.recorded}
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """
+    Return the process-wide cassette, or None when record/replay is off.
+    """
+    global _cassette
+    if _cassette is None and MODE != 'off':
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(PATH, MODE)
+                atexit.register(_cassette.save)
+    return _cassette
+
+
+def configure(mode, path=PATH):
+    """
+    Switch record/replay mode at runtime (saving the current cassette first); mode "off" disables it.
+    """
+    global _cassette, MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {', '.join(MODES)}")
+    with _cassette_lock:
+        if _cassette is not None:
+            _cassette.save()
+        MODE = mode
+        _cassette = Cassette(path, mode) if mode != 'off' else None
+        if _cassette is not None:
+            atexit.register(_cassette.save)
+    return _cassette
@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from src.utils import cassette, http_client, response_cache
+from src.utils.cassette import CassetteMiss
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = 0
+
+    def do_GET(self):
+        _Handler.requests += 1
+        if self.path.startswith("/api/v3/stock/list"):
+            body = json.dumps([{"symbol": f"S{i}", "country": "US" if i % 2 else "DE"} for i in range(100)])
+        elif self.path.startswith("/missing"):
+            self._send(404, b"{}")
+            return
+        else:
+            # Echo the request, API key included, to check it is redacted on the cassette
+            body = json.dumps([{"symbol": "AAPL", "request": self.path}])
+        self._send(200, body.encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCassette(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "fmp.jsonl.gz")
+        response_cache.get_cache().clear()
+
+    def tearDown(self):
+        cassette.configure("off")
+        http_client.configure(base_url="")
+        response_cache.get_cache().clear()
+        shutil.rmtree(self.directory)
+
+    def test_record_then_replay_offline(self):
+        profile = "https://financialmodelingprep.com/api/v3/profile/AAPL?apikey=secret-key"
+        stocks = "https://financialmodelingprep.com/api/v3/stock/list?apikey=secret-key"
+        http_client.configure(base_url=self.base)
+        with mock.patch.dict(os.environ, {"FINANCIAL_MODELING_PREP_API_KEY": "secret-key"}):
+            cassette.configure("record", self.path)
+            recorded = http_client.fetch_data(profile)
+            countries = {r["country"] for r in http_client.stream_records(stocks, fields=("country",))}
+            self.assertEqual(http_client.fetch_data(f"https://financialmodelingprep.com/missing"),
+                             {"error": "Failed to fetch data. Status code: 404"})
+            cassette.configure("off")
+        with gzip.open(self.path, "rt") as f:
+            text = f.read()
+        self.assertNotIn("secret-key", text)
+        self.assertEqual(len(text.splitlines()), 3)
+
+        # Nothing listens here: every request must come from the cassette
+        http_client.configure(base_url="http://127.0.0.1:9")
+        response_cache.get_cache().clear()
+        requests = _Handler.requests
+        cassette.configure("replay", self.path)
+        replayed = http_client.fetch_data(profile)
+        self.assertEqual(replayed[0]["request"], recorded[0]["request"].replace("secret-key", "REDACTED"))
+        self.assertEqual(http_client.fetch_records(stocks, fields=("country",), where={"country": "US"}, limit=2),
+                         [{"country": "US"}, {"country": "US"}])
+        self.assertEqual({r["country"] for r in http_client.stream_records(stocks, fields=("country",))}, countries)
+        self.assertIn("Status code: 404", http_client.fetch_data("https://financialmodelingprep.com/missing")["error"])
+
+        async def replay_async():
+            response_cache.get_cache().clear()
+            return await http_client.afetch_data(profile)
+
+        self.assertEqual(asyncio.run(replay_async()), replayed)
+        with self.assertRaises(CassetteMiss):
+            http_client.fetch_data("https://financialmodelingprep.com/api/v3/profile/MSFT?apikey=secret-key")
+        self.assertEqual(_Handler.requests, requests)
+
+    def test_record_missing_fetches_and_records_what_is_missing(self):
+        http_client.configure(base_url=self.base)
+        cassette.configure("record-missing", self.path)
+        http_client.fetch_data("https://financialmodelingprep.com/api/v3/quote/AAPL")
+        response_cache.get_cache().clear()
+        requests = _Handler.requests
+        http_client.fetch_data("https://financialmodelingprep.com/api/v3/quote/AAPL")
+        self.assertEqual(_Handler.requests, requests)
+        self.assertEqual(cassette.get_cassette().stats()["hits"], 1)
+
+    def test_replay_never_touches_the_session(self):
+        http_client.configure(base_url=self.base)
+        cassette.configure("record", self.path)
+        http_client.fetch_data("https://financialmodelingprep.com/api/v3/quote/AAPL")
+        cassette.configure("replay", self.path)
+        response_cache.get_cache().clear()
+        missing = "https://financialmodelingprep.com/api/v3/quote/MSFT"
+        with mock.patch.object(http_client, "get_session") as session, \
+                mock.patch.object(http_client, "get_async_session") as async_session:
+            self.assertEqual(http_client.fetch_data("https://financialmodelingprep.com/api/v3/quote/AAPL")[0]["symbol"],
+                             "AAPL")
+            with self.assertRaises(CassetteMiss):
+                http_client.fetch_data(missing)
+            with self.assertRaises(CassetteMiss):
+                list(http_client.stream_records(missing))
+            with self.assertRaises(CassetteMiss):
+                asyncio.run(http_client.afetch_data(missing))
+        session.assert_not_called()
+        async_session.assert_not_called()
+        self.assertEqual(cassette.get_cassette().stats()["recorded"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
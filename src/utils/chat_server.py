@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+import weakref
+
+from aiohttp import WSCloseCode, WSMsgType, web
+
+from .http_client import aclose
+from .metrics import recent_traces, render_prometheus
+from .result_shaping import session as result_session
+
+# Asyncio HTTP/WebSocket front end for the agent. Every session gets its own
+# agent (and so its own chat memory) built by `agent_factory` over the shared
+# tools and LLM client; answers are streamed with astream_chat.
+#
+#   POST   /chat                {"message": ..., "session_id": optional}  -> NDJSON stream
+#   GET    /ws?session_id=...   send {"message": ...}, receive token/done/error frames
+#   DELETE /sessions/{id}
+#   GET    /health
+#   GET    /metrics             Prometheus text format
+#   GET    /traces?n=20         most recent per-turn JSON traces
+
+HOST = os.environ.get('AGENT_SERVER_HOST', '127.0.0.1')
+PORT = int(os.environ.get('AGENT_SERVER_PORT', 8080))
+MAX_CONCURRENCY = int(os.environ.get('AGENT_SERVER_MAX_CONCURRENCY', 256))  # agent turns in flight, all sessions
+SESSION_CONCURRENCY = int(os.environ.get('AGENT_SESSION_CONCURRENCY', 1))  # turns in flight per session
+REQUEST_TIMEOUT = float(os.environ.get('AGENT_REQUEST_TIMEOUT', 120))
+SESSION_IDLE_TIMEOUT = float(os.environ.get('AGENT_SESSION_IDLE_TIMEOUT', 30 * 60))
+MAX_SESSIONS = int(os.environ.get('AGENT_MAX_SESSIONS', 1000))
+SHUTDOWN_GRACE = float(os.environ.get('AGENT_SHUTDOWN_GRACE', 30))
+
+logger = logging.getLogger(__name__)
+
+
+class SessionBusy(Exception):
+    pass
+
+
+async def _within(awaitable, deadline):
+    remaining = deadline - asyncio.get_running_loop().time()
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise TimeoutError
+    return await asyncio.wait_for(awaitable, remaining)
+
+
+async def _in_session(session_id, awaitable):
+    # Tools run inside the agent's steps: scope their page tokens to the chat session
+    with result_session(session_id):
+        return await awaitable
+
+
+async def _abandon(response, tokens):
+    # A timed-out or disconnected turn must not keep generating once its slot is released: stop the
+    # agent's background task that feeds the token stream (llama-index streaming responses)
+    task = getattr(response, "awrite_response_to_history_task", None) if response is not None else None
+    if isinstance(task, asyncio.Task) and not task.done():
+        task.cancel()
+    if tokens is not None:
+        try:
+            await tokens.aclose()
+        except Exception:
+            logger.debug("closing an abandoned token stream failed", exc_info=True)
+
+
+class Session:
+
+    def __init__(self, session_id, agent):
+        self.session_id = session_id
+        self.agent = agent
+        self.active = 0
+        self.turns = 0
+        self.last_used = time.monotonic()
+
+
+class SessionManager:
+    """
+    Sessions keyed by id, created on demand. Idle sessions are dropped after `idle_timeout`
+    seconds and the least recently used idle session is evicted beyond `max_sessions`.
+    """
+
+    def __init__(self, agent_factory, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.agent_factory = agent_factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id=None):
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            self.evict()
+            session_id = session_id or secrets.token_urlsafe(12)
+            session = self._sessions[session_id] = Session(session_id, self.agent_factory())
+        session.last_used = time.monotonic()
+        return session
+
+    def close(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def evict(self):
+        now = time.monotonic()
+        idle = sorted((s for s in self._sessions.values() if not s.active), key=lambda s: s.last_used)
+        for session in idle:
+            if now - session.last_used > self.idle_timeout or len(self._sessions) >= self.max_sessions:
+                del self._sessions[session.session_id]
+
+
+class ChatServer:
+    """
+    Streams agent answers to many concurrent clients from one process.
+    """
+
+    def __init__(self, agent_factory, max_concurrency=MAX_CONCURRENCY, session_concurrency=SESSION_CONCURRENCY,
+                 request_timeout=REQUEST_TIMEOUT, shutdown_grace=SHUTDOWN_GRACE, **session_options):
+        self.sessions = SessionManager(agent_factory, **session_options)
+        self.session_concurrency = session_concurrency
+        self.request_timeout = request_timeout
+        self.shutdown_grace = shutdown_grace
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._websockets = weakref.WeakSet()
+        self._active_turns = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.closing = False
+        self.turns = 0
+        self.errors = 0
+
+    async def stream_turn(self, session, message):
+        """
+        Yield the answer to `message` token by token. Raises SessionBusy when the session already
+        has `session_concurrency` turns in flight and TimeoutError after `request_timeout` seconds.
+        """
+        if session.active >= self.session_concurrency:
+            raise SessionBusy(session.session_id)
+        session.active += 1
+        self._active_turns += 1
+        self._idle.clear()
+        deadline = asyncio.get_running_loop().time() + self.request_timeout
+        try:
+            await _within(self._slots.acquire(), deadline)
+            response = tokens = None
+            try:
+                response = await _within(_in_session(session.session_id, session.agent.astream_chat(message)),
+                                         deadline)
+                tokens = response.async_response_gen()
+                while True:
+                    # The deadline is enforced per step: a timeout scope must not span a yield
+                    try:
+                        token = await _within(_in_session(session.session_id, anext(tokens)), deadline)
+                    except StopAsyncIteration:
+                        break
+                    yield token
+            except BaseException:
+                await _abandon(response, tokens)
+                raise
+            finally:
+                self._slots.release()
+            session.turns += 1
+            self.turns += 1
+        finally:
+            session.active -= 1
+            session.last_used = time.monotonic()
+            self._active_turns -= 1
+            if not self._active_turns:
+                self._idle.set()
+
+    async def _frames(self, session, message):
+        started = time.perf_counter()
+        try:
+            async for token in self.stream_turn(session, message):
+                yield {"type": "token", "text": token}
+        except SessionBusy:
+            yield {"type": "error", "error": "This session is still answering a previous message."}
+            return
+        except TimeoutError:
+            self.errors += 1
+            yield {"type": "error", "error": "Request timed out."}
+            return
+        except Exception as exc:
+            self.errors += 1
+            logger.exception("agent turn failed in session %s", session.session_id)
+            yield {"type": "error", "error": f"Agent error: {exc.__class__.__name__}"}
+            return
+        yield {"type": "done", "session_id": session.session_id,
+               "latency_ms": round((time.perf_counter() - started) * 1000)}
+
+    async def handle_chat(self, request):
+        if self.closing:
+            return web.json_response({"error": "Server is shutting down."}, status=503)
+        try:
+            body = await request.json()
+            message = body["message"]
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({"error": 'Expected a JSON body with a "message" field.'}, status=400)
+        session = self.sessions.get(body.get("session_id"))
+        if session.active >= self.session_concurrency:
+            return web.json_response({"error": "This session is still answering a previous message.",
+                                      "session_id": session.session_id}, status=429)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson",
+                                               "X-Session-Id": session.session_id})
+        await response.prepare(request)
+        async for frame in self._frames(session, message):
+            await response.write(json.dumps(frame).encode() + b"\n")
+        await response.write_eof()
+        return response
+
+    async def handle_websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        self._websockets.add(ws)
+        session = self.sessions.get(request.query.get("session_id"))
+        await ws.send_json({"type": "session", "session_id": session.session_id})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            if self.closing:
+                await ws.send_json({"type": "error", "error": "Server is shutting down."})
+                break
+            try:
+                message = json.loads(msg.data)["message"]
+            except (ValueError, KeyError, TypeError):
+                await ws.send_json({"type": "error", "error": 'Expected {"message": ...}.'})
+                continue
+            async for frame in self._frames(session, message):
+                await ws.send_json(frame)
+        return ws
+
+    async def handle_close_session(self, request):
+        if not self.sessions.close(request.match_info["session_id"]):
+            return web.json_response({"error": "Unknown session."}, status=404)
+        return web.json_response({"closed": True})
+
+    async def handle_health(self, request):
+        return web.json_response(self.stats())
+
+    async def handle_metrics(self, request):
+        return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Prometheus-Format": "0.0.4"})
+
+    async def handle_traces(self, request):
+        try:
+            n = int(request.query.get("n", 20))
+        except ValueError:
+            return web.json_response({"error": "n must be an integer"}, status=400)
+        return web.json_response(recent_traces(n), dumps=lambda data: json.dumps(data, default=str))
+
+    def stats(self):
+        return {"sessions": len(self.sessions), "active_turns": self._active_turns, "turns": self.turns,
+                "errors": self.errors, "closing": self.closing}
+
+    async def _on_shutdown(self, app):
+        # Refuse new turns, let the ones in flight finish, then close the remaining sockets
+        self.closing = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.shutdown_grace)
+        except TimeoutError:
+            logger.warning("shutting down with %d agent turns still running", self._active_turns)
+        for ws in list(self._websockets):
+            await ws.close(code=WSCloseCode.GOING_AWAY, message=b"Server shutdown")
+
+    async def _on_cleanup(self, app):
+        await aclose()
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post("/chat", self.handle_chat)
+        app.router.add_get("/ws", self.handle_websocket)
+        app.router.add_delete("/sessions/{session_id}", self.handle_close_session)
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/traces", self.handle_traces)
+        app.on_shutdown.append(self._on_shutdown)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+
+def run(agent_factory, host=HOST, port=PORT):
+    """
+    Serve the agent until SIGINT/SIGTERM, then drain in-flight turns for up to AGENT_SHUTDOWN_GRACE seconds.
+    """
+
+    async def make_app():
+        # The server (and its semaphore) must be created on the loop run_app serves from
+        return ChatServer(agent_factory).build_app()
+
+    web.run_app(make_app(), host=host, port=port, shutdown_timeout=SHUTDOWN_GRACE + 5)
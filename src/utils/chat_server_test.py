@@ -0,0 +1,124 @@
+import asyncio
+import json
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.utils.chat_server import ChatServer
+
+
+class _FakeResponse:
+
+    def __init__(self, tokens, delay):
+        self.tokens = tokens
+        self.delay = delay
+        # Like llama-index streaming responses: a background task keeps the LLM call running
+        self.awrite_response_to_history_task = asyncio.ensure_future(asyncio.sleep(10 * delay))
+
+    async def async_response_gen(self):
+        for token in self.tokens:
+            await asyncio.sleep(self.delay)
+            yield token
+
+
+class _FakeAgent:
+    """
+    Echoes the message and how many messages this agent (i.e. this session's memory) has seen.
+    """
+
+    def __init__(self, delay=0.0):
+        self.history = []
+        self.delay = delay
+
+    async def astream_chat(self, message):
+        self.history.append(message)
+        self.response = _FakeResponse([f"{message} ", f"#{len(self.history)}"], self.delay)
+        return self.response
+
+
+class TestChatServer(unittest.IsolatedAsyncioTestCase):
+
+    async def _client(self, delay=0.0, **options):
+        self.agents = []
+
+        def agent_factory():
+            self.agents.append(_FakeAgent(delay))
+            return self.agents[-1]
+
+        self.server = ChatServer(agent_factory, **options)
+        client = TestClient(TestServer(self.server.build_app()))
+        await client.start_server()
+        self.addAsyncCleanup(client.close)
+        return client
+
+    async def _chat(self, client, message, session_id=None):
+        response = await client.post("/chat", json={"message": message, "session_id": session_id})
+        frames = [json.loads(line) for line in (await response.text()).splitlines()]
+        return response, frames
+
+    async def test_streams_tokens_with_per_session_memory(self):
+        client = await self._client()
+        response, frames = await self._chat(client, "hello")
+        session_id = response.headers["X-Session-Id"]
+        self.assertEqual([f["text"] for f in frames if f["type"] == "token"], ["hello ", "#1"])
+        self.assertEqual(frames[-1]["type"], "done")
+        _, frames = await self._chat(client, "again", session_id)
+        self.assertEqual(frames[1]["text"], "#2")
+        _, frames = await self._chat(client, "other")  # a new session starts with empty memory
+        self.assertEqual(frames[1]["text"], "#1")
+
+    async def test_concurrent_sessions_and_busy_session(self):
+        client = await self._client(delay=0.05)
+        response, _ = await self._chat(client, "warm up")
+        session_id = response.headers["X-Session-Id"]
+        results = await asyncio.gather(
+            self._chat(client, "first", session_id),
+            self._chat(client, "second", session_id),
+            *(self._chat(client, f"user {i}") for i in range(20)),
+        )
+        statuses = sorted(response.status for response, _ in results[:2])
+        self.assertEqual(statuses, [200, 429])
+        self.assertTrue(all(frames[-1]["type"] == "done" for _, frames in results[2:]))
+        self.assertEqual(self.server.stats()["sessions"], 21)
+
+    async def test_timeout(self):
+        client = await self._client(delay=0.2, request_timeout=0.1)
+        _, frames = await self._chat(client, "slow")
+        self.assertEqual(frames[-1], {"type": "error", "error": "Request timed out."})
+        self.assertEqual(self.server.stats()["active_turns"], 0)
+        await asyncio.sleep(0)
+        self.assertTrue(self.agents[0].response.awrite_response_to_history_task.cancelled())
+
+    async def test_shutdown_drains_in_flight_turns(self):
+        client = await self._client(delay=0.05)
+        turn = asyncio.ensure_future(self._chat(client, "finishing"))
+        while not self.server._active_turns:
+            await asyncio.sleep(0.005)
+        await self.server._on_shutdown(None)
+        self.assertEqual(self.server._active_turns, 0)
+        self.assertEqual((await asyncio.wait_for(turn, 1))[1][-1]["type"], "done")
+        response = await client.post("/chat", json={"message": "late"})
+        self.assertEqual(response.status, 503)
+
+    async def test_metrics_and_traces(self):
+        client = await self._client()
+        response = await client.get("/metrics")
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        response = await client.get("/traces?n=5")
+        self.assertIsInstance(await response.json(), list)
+        self.assertEqual((await client.get("/traces?n=x")).status, 400)
+
+    async def test_websocket(self):
+        client = await self._client()
+        async with client.ws_connect("/ws") as ws:
+            session = await ws.receive_json()
+            await ws.send_json({"message": "hi"})
+            frames = [await ws.receive_json() for _ in range(3)]
+        self.assertEqual(session["type"], "session")
+        self.assertEqual([f["type"] for f in frames], ["token", "token", "done"])
+        self.assertEqual(frames[-1]["session_id"], session["session_id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import ast
+import json
+import os
+
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.memory.types import DEFAULT_CHAT_STORE_KEY
+from llama_index.core.storage.chat_store import SimpleChatStore
+
+from .result_shaping import CHARS_PER_TOKEN
+from .tool_events import emit
+
+# Bounded chat memory. The history sent with every LLM call is kept under a token
+# budget: once it is over, the tool results of older turns are replaced, oldest
+# first, by a one-line reference (tool, symbol and a few key fields; the agent can
+# call the tool again, usually from the response cache, if it needs the rows).
+# The last turns stay verbatim. Only if that is not enough are the oldest turns
+# dropped. Every history read emits a "memory" event with its size, which ends up
+# in the turn trace, the metrics and the chatbot's per-turn line.
+
+MEMORY_DISABLED = os.environ.get('AGENT_MEMORY_DISABLED', '').lower() in ('1', 'true', 'yes')
+TOKEN_BUDGET = int(os.environ.get('AGENT_MEMORY_TOKENS', 12000))
+KEEP_TURNS = int(os.environ.get('AGENT_MEMORY_KEEP_TURNS', 2))
+MIN_COMPACT_TOKENS = 64  # tool results this small are cheaper to keep than to summarize
+
+COMPACTED_PREFIX = "[compacted "
+KEY_FIELDS = ("symbol", "companyName", "name", "date", "period", "calendarYear", "price", "mktCap", "marketCap",
+              "revenue", "netIncome", "eps", "error")
+MAX_SYMBOLS = 5
+MAX_VALUE_CHARS = 40
+
+
+def estimate_tokens(message):
+    return len(str(message.content or '')) // CHARS_PER_TOKEN + 1
+
+
+def _parse(content):
+    # Tool outputs reach the memory as str(result): JSON for some tools, a Python repr for most
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            return parse(content)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+    return None
+
+
+def _rows(value):
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        # Envelopes such as the pagination wrapper of result_shaping carry their rows in a list field
+        for item in value.values():
+            if isinstance(item, list) and item and isinstance(item[0], dict):
+                return item
+        return [value]
+    return []
+
+
+def _value(value):
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS] + '...'
+
+
+def summarize_tool_output(name, content):
+    """
+    One-line reference to a tool result: the tool, the size of the result and its key fields,
+    e.g. "[compacted get_company_profile result, 5210 chars: symbol=AAPL, companyName=Apple Inc., price=226.05; ...]".
+    """
+    content = str(content or '')
+    rows = [row for row in _rows(_parse(content)) if isinstance(row, dict)]
+    if len(rows) == 1:
+        details = ', '.join(f"{key}={_value(rows[0][key])}" for key in KEY_FIELDS if key in rows[0])
+    elif rows:
+        symbols = [str(row["symbol"]) for row in rows[:MAX_SYMBOLS] if "symbol" in row]
+        more = ', ...' if len(rows) > MAX_SYMBOLS and symbols else ''
+        details = f"{len(rows)} rows" + (f", symbols {', '.join(symbols)}{more}" if symbols else '')
+    else:
+        details = _value(content)
+    details = f": {details}" if details else ''
+    return f"{COMPACTED_PREFIX}{name or 'tool'} result, {len(content)} chars{details}; call the tool again for the data]"
+
+
+def _compactable(message):
+    return (message.role == MessageRole.TOOL and not str(message.content or '').startswith(COMPACTED_PREFIX)
+            and estimate_tokens(message) >= MIN_COMPACT_TOKENS)
+
+
+class CompactingMemory(ChatMemoryBuffer):
+    """
+    ChatMemoryBuffer that compacts the tool results of turns older than the last `keep_turns`
+    before it drops whole messages to stay under `token_limit`.
+    """
+
+    keep_turns: int = KEEP_TURNS
+
+    @classmethod
+    def class_name(cls):
+        return "CompactingMemory"
+
+    def _token_count_for_messages(self, messages):
+        # The same chars-per-token estimate as result shaping: cheap enough to run on every LLM call
+        return sum(estimate_tokens(message) for message in messages)
+
+    def _verbatim_from(self, history):
+        # Index of the first message of the last keep_turns user turns
+        users = [i for i, message in enumerate(history) if message.role == MessageRole.USER]
+        if self.keep_turns <= 0:
+            return len(history)
+        return users[-self.keep_turns] if len(users) >= self.keep_turns else 0
+
+    def compact(self, initial_token_count=0):
+        """
+        Compact old tool results, oldest first, until the history fits the budget; returns how many were compacted.
+        """
+        history = self.get_all()
+        total = self._token_count_for_messages(history) + initial_token_count
+        compacted = 0
+        for i in range(self._verbatim_from(history)):
+            if total <= self.token_limit:
+                break
+            message = history[i]
+            if not _compactable(message):
+                continue
+            summary = summarize_tool_output(message.additional_kwargs.get("name"), message.content)
+            replacement = ChatMessage(role=message.role, content=summary, additional_kwargs=message.additional_kwargs)
+            total += estimate_tokens(replacement) - estimate_tokens(message)
+            history[i] = replacement
+            compacted += 1
+        if compacted:
+            # Stored back, so each result is summarized once and later turns start from the compact history
+            self.set(history)
+        return compacted
+
+    def get(self, input=None, initial_token_count=0, **kwargs):
+        compacted = self.compact(initial_token_count)
+        stored = len(self.get_all())
+        messages = super().get(input=input, initial_token_count=initial_token_count, **kwargs)
+        emit("memory", messages=len(messages), tokens=self._token_count_for_messages(messages),
+             compacted=compacted, dropped=stored - len(messages), limit=self.token_limit)
+        return messages
+
+
+def build_memory(token_limit=TOKEN_BUDGET, keep_turns=KEEP_TURNS, chat_history=None):
+    """
+    A fresh CompactingMemory, one per agent (and so per chat session).
+    """
+    chat_store = SimpleChatStore()
+    if chat_history:
+        chat_store.set_messages(DEFAULT_CHAT_STORE_KEY, list(chat_history))
+    return CompactingMemory(token_limit=token_limit, keep_turns=keep_turns, chat_store=chat_store)
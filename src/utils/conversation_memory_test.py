@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+from src.utils import tool_events
+from src.utils.conversation_memory import COMPACTED_PREFIX, build_memory, summarize_tool_output
+from src.utils.metrics import Metrics, build_trace
+
+PROFILE = str([{"symbol": "AAPL", "companyName": "Apple Inc.", "price": 226.05, "mktCap": 3436994280000,
+                "description": "Apple Inc. designs, manufactures, and markets smartphones. " * 40}])
+SCREENER = str([{"symbol": f"S{i}", "companyName": f"Company {i}", "marketCap": i * 1e9} for i in range(60)])
+
+
+def _turn(memory, query, tool, result):
+    memory.put(ChatMessage(role=MessageRole.USER, content=query))
+    memory.put(ChatMessage(role=MessageRole.ASSISTANT, content="",
+                           additional_kwargs={"tool_calls": [{"name": tool, "id": query}]}))
+    memory.put(ChatMessage(role=MessageRole.TOOL, content=result,
+                           additional_kwargs={"name": tool, "tool_call_id": query}))
+    memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=f"Answer to {query}"))
+
+
+class TestConversationMemory(unittest.TestCase):
+
+    def test_summarize_tool_output(self):
+        self.assertEqual(summarize_tool_output("get_company_profile", PROFILE),
+                         f"[compacted get_company_profile result, {len(PROFILE)} chars: symbol=AAPL, "
+                         "companyName=Apple Inc., price=226.05, mktCap=3436994280000; call the tool again for the data]")
+        self.assertIn("60 rows, symbols S0, S1, S2, S3, S4, ...", summarize_tool_output("stock_screener", SCREENER))
+        envelope = str({"rows": [{"symbol": "MSFT"}, {"symbol": "NVDA"}], "next_page": "abc"})
+        self.assertIn("2 rows, symbols MSFT, NVDA;", summarize_tool_output("get_all_stocks", envelope))
+        self.assertIn("not json", summarize_tool_output(None, "not json"))
+
+    def test_old_tool_results_are_compacted_first(self):
+        memory = build_memory(token_limit=1500, keep_turns=1)
+        for i in range(3):
+            _turn(memory, f"q{i}", "get_company_profile", PROFILE)
+        messages = memory.get()
+        # Nothing is dropped: the old profiles shrink to references, the last turn stays verbatim
+        self.assertEqual(len(messages), 12)
+        tool_results = [m.content for m in messages if m.role == MessageRole.TOOL]
+        self.assertTrue(tool_results[0].startswith(COMPACTED_PREFIX))
+        self.assertEqual(tool_results[2], PROFILE)
+        self.assertLessEqual(memory._token_count_for_messages(messages), 1500)
+        # Compaction is stored: the history read by the next call is the compact one
+        self.assertTrue(memory.get_all()[2].content.startswith(COMPACTED_PREFIX))
+
+    def test_under_budget_history_is_untouched(self):
+        memory = build_memory(token_limit=100000, keep_turns=1)
+        for i in range(3):
+            _turn(memory, f"q{i}", "get_company_profile", PROFILE)
+        self.assertFalse(any(str(m.content).startswith(COMPACTED_PREFIX) for m in memory.get()))
+
+    def test_history_stays_flat_and_is_reported(self):
+        memory = build_memory(token_limit=2000, keep_turns=1)
+        with tool_events.recording() as events:
+            for i in range(40):
+                _turn(memory, f"q{i}", "stock_screener" if i % 2 else "get_company_profile",
+                      SCREENER if i % 2 else PROFILE)
+                memory.get()
+            asyncio.run(memory.aget())
+        reads = [event for event in events if event["type"] == "memory"]
+        self.assertEqual(len(reads), 41)
+        sizes = [event["tokens"] for event in reads]
+        self.assertTrue(all(size <= 2000 for size in sizes))
+        self.assertGreater(sum(event["compacted"] for event in reads), 0)
+        self.assertGreater(reads[-1]["dropped"], 0)
+        # The budget binds: the oldest turns are dropped once compaction alone is not enough
+        self.assertEqual(memory.get()[0].role, MessageRole.USER)
+
+        trace = build_trace("q", reads[-2:], 0.1)
+        self.assertEqual(trace["totals"]["history_tokens"], max(sizes[-2:]))
+        metrics = Metrics()
+        for event in reads:
+            metrics.on_event(event)
+        self.assertEqual(metrics.histogram("agent_history_tokens").count, 41)
+        self.assertIn("agent_memory_compacted_total", metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
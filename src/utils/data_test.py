@@ -11,7 +11,12 @@ class TestLoadFunctionsFromDirectory(unittest.TestCase):
         tools = load_functions_from_directory("functions")
 
         # Debugging: Print all tools to inspect them
-        self.assertEqual(len(tools), 30)  # change this number as you add more functions
+        self.assertEqual(len(tools), 37)  # change this number as you add more functions
+
+    def test_tools_have_native_async_variants(self):
+        tools = load_functions_from_directory("functions")
+        for tool in tools:
+            self.assertEqual(tool.async_fn.__name__, f"a{tool.metadata.name}")
 
 
 if __name__ == "__main__":
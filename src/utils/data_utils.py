@@ -1,15 +1,21 @@
 import importlib
+import inspect
 import os
+import sys
 from llama_index.core.tools import FunctionTool
 
+from .result_shaping import shaped
+from .tool_events import observed
+from .tool_manifest import load_tools_from_manifest
+
 
 # Function to dynamically load modules and extract functions
-def load_functions_from_directory(directory):
+def load_functions_from_directory(directory, lazy=True):
     tools = []
     # Resolve the absolute path of the directory
     # directory_path = os.path.abspath(directory)
     # Get the absolute path of the project root (assuming `src` is one level below the root)
-    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Project root
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # src/, the parent of utils/
     directory_path = os.path.join(base_path, directory)  # Absolute path to the directory
 
     # Debugging: Print resolved directory path
@@ -21,7 +27,15 @@ def load_functions_from_directory(directory):
     # Get the module base path (e.g., src.functions)
     module_base = directory.replace("/", ".").lstrip(".")
 
-    for filename in os.listdir(directory_path):
+    # The tool modules import `utils` and each other from src/: make that work from any working directory
+    if base_path not in sys.path:
+        sys.path.insert(0, base_path)
+
+    if lazy:
+        # Register tools from the cached manifest; modules are imported on first call
+        return load_tools_from_manifest(directory_path, module_base)
+
+    for filename in sorted(os.listdir(directory_path)):
         if filename.endswith(".py") and filename != "__init__.py":
             module_name = filename[:-3]  # Strip .py extension
             module_path = f"{module_base}.{module_name}"  # Construct the absolute module path
@@ -30,12 +44,27 @@ def load_functions_from_directory(directory):
 
             module = importlib.import_module(module_path)
             # print(f"Found Module: {module.__name__}")
-            for attr_name in dir(module):
-                # print(f"Found Attribute: {attr_name}")
-                attr = getattr(module, attr_name)
-                if callable(attr) and hasattr(attr, "__name__"):  # Ensure it's a function
-                    if attr_name.__contains__("fetch_data"): # skip fetch_data
-                        continue
-                    tool = FunctionTool.from_defaults(fn=attr)
-                    tools.append(tool)
+            tools.extend(module_tools(module))
+    return tools
+
+
+# Build a FunctionTool for every public function defined in an imported module
+def module_tools(module):
+    tools = []
+    for attr_name in dir(module):
+        # print(f"Found Attribute: {attr_name}")
+        attr = getattr(module, attr_name)
+        if inspect.isfunction(attr) and attr.__module__ == module.__name__:  # Ensure it's a function defined here
+            if attr_name.startswith("_") or attr_name.__contains__("fetch_data"): # skip helpers and fetch_data
+                continue
+            if inspect.iscoroutinefunction(attr): # async twins are registered with their sync tool
+                continue
+            async_fn = getattr(module, f"a{attr_name}", None)
+            if not inspect.iscoroutinefunction(async_fn):
+                async_fn = None
+            tool = FunctionTool.from_defaults(
+                fn=observed(shaped(attr, attr_name), attr_name),
+                async_fn=observed(shaped(async_fn, attr_name), attr_name) if async_fn else None,
+            )
+            tools.append(tool)
     return tools
@@ -0,0 +1,321 @@
+import logging
+import os
+import re
+import string
+import threading
+import time
+
+from .answer_cache import normalize_query, remember_turn
+from .symbol_index import loaded_index
+from .tool_events import emit
+
+# Deterministic fast path in front of the agent. Simple lookups ("price of SNOW",
+# "What's Apple's market cap?") are matched against a table of intent patterns,
+# the company is resolved with the local symbol index, the tool is called
+# directly and the answer is rendered from a template: no LLM call at all.
+# Anything the table does not match exactly (two companies, an extra clause, a
+# follow-up without a company, a failed or incomplete tool result) falls through
+# to the agent unchanged.
+
+FAST_PATH_DISABLED = os.environ.get('AGENT_FAST_PATH_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+# source -> (tool, name of its symbol argument)
+SOURCES = {
+    "quote": ("get_stock_quotes", "symbols"),
+    "profile": ("get_company_profile", "symbol"),
+    "income": ("get_income_statement", "symbol"),
+}
+
+# Each entry: the intent, the phrases naming the data (a regex over the normalized query, see
+# normalize_query), the source tool and the answer template. {company} is "Name (TICKER)"; format
+# specs are the FORMATS below. An intent whose tool is not registered is left out.
+INTENTS = [
+    {"intent": "price", "phrases": r"(?:stock |share )?price|quote", "source": "quote",
+     "answer": "{company} is trading at {price:money}, {changesPercentage:percent} today."},
+    {"intent": "market_cap", "phrases": r"market cap|market capitalization|market value", "source": "quote",
+     "answer": "{company} has a market capitalization of {marketCap:large}."},
+    {"intent": "pe", "phrases": r"pe|pe ratio|price to earnings(?: ratio)?|price earnings ratio", "source": "quote",
+     "answer": "{company} trades at a P/E of {pe:ratio}."},
+    {"intent": "eps", "phrases": r"eps|earnings per share", "source": "quote",
+     "answer": "{company} has earnings per share of {eps:money} over the last twelve months."},
+    {"intent": "volume", "phrases": r"(?:trading )?volume", "source": "quote",
+     "answer": "{volume:count} shares of {company} traded today (average volume {avgVolume:count})."},
+    {"intent": "year_range", "phrases": r"52-week (?:range|high|low)|52 week (?:range|high|low)|year range",
+     "source": "quote",
+     "answer": "{company} traded between {yearLow:money} and {yearHigh:money} over the last 52 weeks."},
+    {"intent": "earnings_date", "phrases": r"(?:next )?earnings (?:date|announcement|report)", "source": "quote",
+     "answer": "{company} next reports earnings on {earningsAnnouncement:date}."},
+    {"intent": "sector", "phrases": r"sector|industry", "source": "profile",
+     "answer": "{company} is in the {sector} sector ({industry})."},
+    {"intent": "ceo", "phrases": r"ceo", "source": "profile",
+     "answer": "The CEO of {company} is {ceo}."},
+    {"intent": "employees", "phrases": r"(?:number of )?employees|employee count|headcount", "source": "profile",
+     "answer": "{company} has {fullTimeEmployees:count} full-time employees."},
+    {"intent": "beta", "phrases": r"beta", "source": "profile",
+     "answer": "{company} has a beta of {beta:ratio}."},
+    {"intent": "website", "phrases": r"website", "source": "profile",
+     "answer": "The website of {company} is {website}."},
+    {"intent": "revenue", "phrases": r"(?:annual )?revenue|sales", "source": "income",
+     "answer": "{company} reported revenue of {revenue:large} for the fiscal year ended {date:date}."},
+    {"intent": "net_income", "phrases": r"net income|(?:net )?profit", "source": "income",
+     "answer": "{company} reported net income of {net income:large} for the fiscal year ended {date:date}."},
+]
+
+# How a question may be put around the data phrase: "what is the current price of $SNOW",
+# "give me $AAPL market cap", "$AAPL pe ratio today"
+_LEAD = (r"(?:(?:what|whats|who|how much)(?: is| was| are| were)? |(?:give|show|tell) me |(?:get|find|check) )?"
+         r"(?:the |a )?(?:current |latest |last |most recent |today )?")
+_TAIL = r"(?: stock| shares)?(?: today| now| right now| currently)?"
+_FORMS = (
+    _LEAD + r"(?:{phrases}) (?:of|for|on) \$(?P<symbol>\S+)" + _TAIL,
+    _LEAD + r"\$(?P<symbol>\S+)(?: stock| shares)? (?:{phrases})" + _TAIL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _number(value):
+    if isinstance(value, str):
+        value = float(value)
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError(value)
+    return value
+
+
+def _large(value):
+    value = _number(value)
+    for bound, unit in ((1e12, "trillion"), (1e9, "billion"), (1e6, "million")):
+        if abs(value) >= bound:
+            return f"${value / bound:,.2f} {unit}"
+    return f"${value:,.0f}"
+
+
+FORMATS = {
+    "money": lambda value: f"${_number(value):,.2f}",
+    "large": _large,
+    "percent": lambda value: f"{_number(value):+.2f}%",
+    "ratio": lambda value: f"{_number(value):.2f}",
+    "count": lambda value: f"{_number(value):,.0f}",
+    "date": lambda value: str(value)[:10],
+}
+
+
+class _AnswerFormatter(string.Formatter):
+
+    def format_field(self, value, format_spec):
+        # A missing value makes the answer incomplete: the agent handles the question instead
+        if value is None or value == '':
+            raise ValueError("missing value")
+        if format_spec in FORMATS:
+            return FORMATS[format_spec](value)
+        return super().format_field(value, format_spec)
+
+
+_formatter = _AnswerFormatter()
+
+
+def _record(result, symbol):
+    """
+    The record of `symbol` in a tool result (a map of symbol to quote, a list of profiles, one
+    statement), or None when the tool failed or returned nothing for it.
+    """
+    if isinstance(result, dict) and "results" in result:
+        result = result["results"]  # paginated by result shaping
+    if isinstance(result, list):
+        result = result[0] if result else None
+    if isinstance(result, dict) and isinstance(result.get(symbol), dict):
+        result = result[symbol]
+    return result if isinstance(result, dict) and "error" not in result else None
+
+
+def render(template, symbol, record):
+    name = record.get("name") or record.get("companyName")
+    company = f"{name} ({symbol})" if name and name != symbol else symbol
+    return _formatter.vformat(template, (), dict(record, symbol=symbol, company=company))
+
+
+class FastPathResponse:
+    """
+    A fast-path answer, usable wherever the agent's chat or streaming response is.
+    """
+
+    cached = False
+
+    def __init__(self, answer, intent):
+        self.response = answer
+        self.fast_path = intent
+
+    def __str__(self):
+        return self.response
+
+    @property
+    def response_gen(self):
+        return iter([self.response])
+
+    async def async_response_gen(self):
+        yield self.response
+
+
+class FastPathRouter:
+    """
+    Matches queries against the intent table and answers the ones it can from the tools in `tools`
+    (FunctionTools by name, so calls are observed, shaped and cached like the agent's). Keeps the
+    hit rate and the latency of hits and of fall-throughs.
+    """
+
+    def __init__(self, tools, intents=None, index=None):
+        self.tools = {tool.metadata.name: tool for tool in tools}
+        self.index = index
+        self.intents = []
+        for intent in intents if intents is not None else INTENTS:
+            tool_name, argument = SOURCES[intent["source"]]
+            if tool_name not in self.tools:
+                continue
+            patterns = [re.compile('^' + form.format(phrases=intent["phrases"]) + '$') for form in _FORMS]
+            self.intents.append(dict(intent, tool=tool_name, argument=argument, patterns=patterns))
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.hits = 0
+        self.misses = {}  # reason -> count
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def match(self, query, index=None):
+        """
+        (intent entry, symbol, None) when `query` is exactly one intent about exactly one company,
+        else (None, None, the reason it is not). Companies are resolved with `index` (the router's,
+        or the process-wide symbol index).
+        """
+        key, tickers = normalize_query(query, index if index is not None else self.index)
+        if len(set(tickers)) != 1:
+            return None, None, "no_company" if not tickers else "several_companies"
+        for intent in self.intents:
+            for pattern in intent["patterns"]:
+                match = pattern.match(key)
+                if match and match.group("symbol") == tickers[0]:
+                    return intent, tickers[0], None
+        return None, None, "no_match"
+
+    def _match(self, query):
+        # The process-wide index starts empty and loads in the background: until it has symbols
+        # no company can be resolved, so the question goes to the agent rather than waiting
+        index = self.index if self.index is not None else loaded_index()
+        if index is None:
+            return None, None, "no_company"
+        return self.match(query, index)
+
+    def _finish(self, intent, symbol, result, started):
+        record = _record(result, symbol)
+        answer, reason = None, None
+        if record is None:
+            reason = "tool_error"
+        else:
+            try:
+                answer = render(intent["answer"], symbol, record)
+            except (KeyError, ValueError, TypeError):
+                reason = "incomplete"
+        return self._done(intent["intent"], answer, reason, started)
+
+    def _done(self, intent, answer, reason, started):
+        duration = time.perf_counter() - started
+        with self._lock:
+            self.queries += 1
+            if answer is not None:
+                self.hits += 1
+                self.hit_seconds += duration
+            else:
+                self.misses[reason] = self.misses.get(reason, 0) + 1
+                self.miss_seconds += duration
+            hit_rate = self.hits / self.queries
+        emit("fast_path", intent=intent, hit=answer is not None, reason=reason, duration=duration)
+        if answer is not None:
+            logger.info("fast path answered %s in %.3fs (hit rate %.0f%%)", intent, duration, hit_rate * 100)
+        else:
+            logger.info("fast path fell through (%s%s) after %.3fs (hit rate %.0f%%)", reason,
+                        f", {intent}" if intent else "", duration, hit_rate * 100)
+        return answer
+
+    def answer(self, query):
+        """
+        The templated answer to `query` and its intent, or (None, None) when the agent has to answer it.
+        """
+        started = time.perf_counter()
+        intent, symbol, reason = self._match(query)
+        if intent is None:
+            return self._done(None, None, reason, started), None
+        try:
+            result = self.tools[intent["tool"]].call(**{intent["argument"]: symbol}).raw_output
+        except Exception:
+            logger.exception("fast path call to %s failed", intent["tool"])
+            result = None
+        return self._finish(intent, symbol, result, started), intent["intent"]
+
+    async def aanswer(self, query):
+        """
+        Async variant of answer.
+        """
+        started = time.perf_counter()
+        intent, symbol, reason = self._match(query)
+        if intent is None:
+            return self._done(None, None, reason, started), None
+        try:
+            result = (await self.tools[intent["tool"]].acall(**{intent["argument"]: symbol})).raw_output
+        except Exception:
+            logger.exception("fast path call to %s failed", intent["tool"])
+            result = None
+        return self._finish(intent, symbol, result, started), intent["intent"]
+
+    def stats(self):
+        with self._lock:
+            misses = sum(self.misses.values())
+            return {
+                "queries": self.queries,
+                "hits": self.hits,
+                "misses": dict(self.misses),
+                "hit_rate": self.hits / self.queries if self.queries else 0.0,
+                "mean_hit_seconds": self.hit_seconds / self.hits if self.hits else 0.0,
+                "mean_miss_seconds": self.miss_seconds / misses if misses else 0.0,
+            }
+
+
+class FastPathAgent:
+    """
+    Wraps an agent so chat/stream_chat (and their async variants) answer simple lookups through the
+    router; everything else goes to the wrapped agent.
+    """
+
+    def __init__(self, agent, router):
+        self.agent = agent
+        self.router = router
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def _respond(self, query, answer, intent):
+        # Keep the agent's memory consistent with what the user saw, for follow-up questions
+        remember_turn(self.agent, query, answer)
+        return FastPathResponse(answer, intent)
+
+    def chat(self, query, *args, **kwargs):
+        answer, intent = self.router.answer(query)
+        if answer is not None:
+            return self._respond(query, answer, intent)
+        return self.agent.chat(query, *args, **kwargs)
+
+    async def achat(self, query, *args, **kwargs):
+        answer, intent = await self.router.aanswer(query)
+        if answer is not None:
+            return self._respond(query, answer, intent)
+        return await self.agent.achat(query, *args, **kwargs)
+
+    def stream_chat(self, query, *args, **kwargs):
+        answer, intent = self.router.answer(query)
+        if answer is not None:
+            return self._respond(query, answer, intent)
+        return self.agent.stream_chat(query, *args, **kwargs)
+
+    async def astream_chat(self, query, *args, **kwargs):
+        answer, intent = await self.router.aanswer(query)
+        if answer is not None:
+            return self._respond(query, answer, intent)
+        return await self.agent.astream_chat(query, *args, **kwargs)
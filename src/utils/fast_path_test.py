@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from llama_index.core.tools import FunctionTool
+
+from src.utils import symbol_index, tool_events
+from src.utils.fast_path import FastPathAgent, FastPathRouter, render
+from src.utils.metrics import Metrics
+from src.utils.symbol_index import SymbolIndex
+
+STOCKS = [
+    {"symbol": "SNOW", "name": "Snowflake Inc.", "exchangeShortName": "NYSE"},
+    {"symbol": "AAPL", "name": "Apple Inc.", "exchangeShortName": "NASDAQ"},
+    {"symbol": "GS", "name": "The Goldman Sachs Group, Inc.", "exchangeShortName": "NYSE"},
+]
+
+QUOTES = {
+    "AAPL": {"name": "Apple Inc.", "price": 222.5, "changesPercentage": -0.1212, "marketCap": 3382912250000,
+             "volume": 35396922, "avgVolume": 57548506, "pe": 33.87, "eps": 6.57, "yearLow": 164.08,
+             "yearHigh": 237.23, "earningsAnnouncement": "2024-10-31T00:00:00.000+0000"},
+    "SNOW": {"name": "Snowflake Inc.", "price": None, "changesPercentage": None, "marketCap": 38e9},
+}
+
+
+def get_stock_quotes(symbols):
+    return {symbol: QUOTES.get(symbol, {"error": f"No quote for {symbol}"}) for symbol in symbols.split(',')}
+
+
+def get_company_profile(symbol):
+    if symbol != "AAPL":
+        return {"error": "Failed to fetch data. Status code: 503"}
+    return [{"symbol": "AAPL", "companyName": "Apple Inc.", "sector": "Technology",
+             "industry": "Consumer Electronics", "ceo": "Mr. Timothy D. Cook", "fullTimeEmployees": "161000"}]
+
+
+def _tools():
+    return [FunctionTool.from_defaults(fn=tool_events.observed(fn)) for fn in (get_stock_quotes, get_company_profile)]
+
+
+class _FakeAgent:
+
+    def __init__(self):
+        self.queries = []
+
+    def chat(self, query):
+        self.queries.append(query)
+        return f"agent answer to {query}"
+
+    async def achat(self, query):
+        return self.chat(query)
+
+    def stream_chat(self, query):
+        return self.chat(query)
+
+
+class TestFastPath(unittest.TestCase):
+
+    def setUp(self):
+        index = SymbolIndex()
+        index.update(STOCKS)
+        self.router = FastPathRouter(_tools(), index=index)
+
+    def _intent(self, query):
+        intent, symbol, reason = self.router.match(query)
+        return (intent["intent"], symbol) if intent else reason
+
+    def test_match(self):
+        self.assertEqual(self._intent("price of SNOW"), ("price", "SNOW"))
+        self.assertEqual(self._intent("What's the current stock price of Snowflake?"), ("price", "SNOW"))
+        self.assertEqual(self._intent("What is Apple's market cap?"), ("market_cap", "AAPL"))
+        self.assertEqual(self._intent("AAPL pe ratio today"), ("pe", "AAPL"))
+        self.assertEqual(self._intent("Who is the CEO of Apple"), ("ceo", "AAPL"))
+        self.assertEqual(self._intent("give me the 52-week range of AAPL"), ("year_range", "AAPL"))
+        # Everything else is left to the agent
+        self.assertEqual(self._intent("price of AAPL and SNOW"), "several_companies")
+        self.assertEqual(self._intent("and its market cap?"), "no_company")
+        self.assertEqual(self._intent("price of snow"), "no_company")
+        self.assertEqual(self._intent("price of AAPL in euros"), "no_match")
+        self.assertEqual(self._intent("Why did the price of AAPL drop?"), "no_match")
+        # get_income_statement is not registered: no revenue intent
+        self.assertEqual(self._intent("revenue of AAPL"), "no_match")
+
+    def test_answers_without_the_agent(self):
+        agent = _FakeAgent()
+        fast = FastPathAgent(agent, self.router)
+        with tool_events.recording() as events:
+            response = fast.chat("price of AAPL")
+        self.assertEqual(str(response), "Apple Inc. (AAPL) is trading at $222.50, -0.12% today.")
+        self.assertEqual(response.fast_path, "price")
+        self.assertFalse(response.cached)
+        self.assertEqual([event["type"] for event in events], ["tool_start", "tool_end", "fast_path"])
+        self.assertEqual(str(fast.chat("How many employees does Apple have?")),
+                         "agent answer to How many employees does Apple have?")
+        self.assertEqual("".join(fast.stream_chat("Apple employees").response_gen),
+                         "Apple Inc. (AAPL) has 161,000 full-time employees.")
+        self.assertEqual(str(asyncio.run(fast.achat("What's the market cap of Snowflake?"))),
+                         "Snowflake Inc. (SNOW) has a market capitalization of $38.00 billion.")
+        self.assertEqual(agent.queries, ["How many employees does Apple have?"])
+
+    def test_falls_through_on_failed_or_incomplete_results(self):
+        agent = _FakeAgent()
+        fast = FastPathAgent(agent, self.router)
+        self.assertEqual(str(fast.chat("price of SNOW")), "agent answer to price of SNOW")  # no price in the quote
+        self.assertEqual(str(fast.chat("sector of GS")), "agent answer to sector of GS")  # the profile call failed
+        self.assertEqual(len(agent.queries), 2)
+        stats = self.router.stats()
+        self.assertEqual((stats["queries"], stats["hits"]), (2, 0))
+        self.assertEqual(stats["misses"], {"incomplete": 1, "tool_error": 1})
+
+    def test_falls_through_while_the_symbol_lists_load_in_the_background(self):
+        loaded = threading.Event()
+
+        def fetch_records(url, fields=None):
+            loaded.wait(5)
+            return STOCKS if "/stock/list" in url else []
+
+        # A fresh process: no shared index yet, no snapshot on disk
+        with mock.patch.object(symbol_index, "_index", None), \
+                mock.patch.object(symbol_index, "fetch_records", fetch_records):
+            router = FastPathRouter(_tools())
+            self.assertEqual(router.answer("What is the price of AAPL?"), (None, None))
+            self.assertEqual(asyncio.run(router.aanswer("Snowflake market cap")), (None, None))
+            self.assertEqual(router.stats()["misses"], {"no_company": 2})
+            loaded.set()
+            symbol_index._warmer.join(5)
+            self.assertEqual(router.answer("What is the price of AAPL?"),
+                             ("Apple Inc. (AAPL) is trading at $222.50, -0.12% today.", "price"))
+
+    def test_metrics_and_render(self):
+        metrics = Metrics()
+        tool_events.add_listener(metrics.on_event)
+        try:
+            FastPathAgent(_FakeAgent(), self.router).chat("AAPL eps")
+            FastPathAgent(_FakeAgent(), self.router).chat("what happened to AAPL")
+        finally:
+            tool_events.remove_listener(metrics.on_event)
+        self.assertEqual(metrics.counter("agent_fast_path_total", intent="eps", result="hit"), 1)
+        self.assertEqual(metrics.counter("agent_fast_path_total", intent="none", result="no_match"), 1)
+        self.assertEqual(metrics.histogram("agent_fast_path_duration_seconds", result="hit").count, 1)
+        self.assertEqual(render("{company} reported net income of {net income:large}.", "X", {"net income": 1.5e6}),
+                         "X reported net income of $1.50 million.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,381 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .http_client import afetch_data, fetch_data
+from .response_cache import cache_key, get_cache, ttl_for
+
+# Columnar store of financial statements. Every annual and quarterly period of a
+# symbol's income, balance-sheet and cash-flow statements is kept as one float64
+# array per line item, so growth, margins, CAGR and ratios for many symbols are
+# computed in one vectorized pass instead of one tool call per company.
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+STATEMENT_URL = 'https://financialmodelingprep.com/api/v3/{endpoint}/{symbol}?period={period}&limit={limit}&apikey={api_key}'
+STATEMENT_LIMIT = int(os.environ.get('FMP_FUNDAMENTALS_LIMIT', 120))  # periods requested per statement
+FETCH_WORKERS = int(os.environ.get('FMP_POOL_SIZE', 10))
+MAX_TABLES = int(os.environ.get('FMP_FUNDAMENTALS_TABLES', 512))  # (symbol, statement, period) tables kept
+
+STATEMENTS = {
+    "income": "income-statement",
+    "balance": "balance-sheet-statement",
+    "cash_flow": "cash-flow-statement",
+}
+PERIODS = ("annual", "quarter")
+PERIODS_PER_YEAR = {"annual": 1, "quarter": 4}
+
+# Metric name -> (statement, line item)
+FIELDS = {
+    "revenue": ("income", "revenue"),
+    "gross_profit": ("income", "grossProfit"),
+    "operating_income": ("income", "operatingIncome"),
+    "net_income": ("income", "netIncome"),
+    "ebitda": ("income", "ebitda"),
+    "eps": ("income", "eps"),
+    "total_assets": ("balance", "totalAssets"),
+    "total_liabilities": ("balance", "totalLiabilities"),
+    "total_equity": ("balance", "totalStockholdersEquity"),
+    "total_debt": ("balance", "totalDebt"),
+    "cash": ("balance", "cashAndCashEquivalents"),
+    "operating_cash_flow": ("cash_flow", "operatingCashFlow"),
+    "capex": ("cash_flow", "capitalExpenditure"),
+    "free_cash_flow": ("cash_flow", "freeCashFlow"),
+    "dividends_paid": ("cash_flow", "dividendsPaid"),
+}
+# Metric name -> (numerator metric, denominator metric)
+RATIOS = {
+    "gross_margin": ("gross_profit", "revenue"),
+    "operating_margin": ("operating_income", "revenue"),
+    "net_margin": ("net_income", "revenue"),
+    "ebitda_margin": ("ebitda", "revenue"),
+    "fcf_margin": ("free_cash_flow", "revenue"),
+    "current_ratio": (("balance", "totalCurrentAssets"), ("balance", "totalCurrentLiabilities")),
+    "debt_to_equity": ("total_debt", "total_equity"),
+    "roe": ("net_income", "total_equity"),
+    "roa": ("net_income", "total_assets"),
+}
+SUFFIXES = ("_growth", "_cagr")
+
+
+def statement_url(symbol, statement, period="annual", limit=STATEMENT_LIMIT):
+    return STATEMENT_URL.format(endpoint=STATEMENTS[statement], symbol=symbol.upper(), period=period, limit=limit,
+                                api_key=API_KEY)
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+class StatementTable:
+    """
+    One statement of one symbol and period type: `dates` (ascending datetime64[D]), fiscal `labels`
+    such as "FY 2023" or "Q3 2023", and one float64 column per numeric line item (NaN when not reported).
+    """
+
+    def __init__(self, dates, labels, columns):
+        self.dates = dates
+        self.labels = labels
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = sorted((row for row in rows if isinstance(row, dict) and row.get('date')), key=lambda row: row['date'])
+        dates = np.array([row['date'][:10] for row in rows], dtype='datetime64[D]')
+        labels = [f"{row.get('period', '')} {row.get('calendarYear', row['date'][:4])}".strip() for row in rows]
+        numeric = {
+            name for row in rows for name, value in row.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        columns = {name: np.array([_number(row.get(name)) for row in rows], dtype=np.float64) for name in numeric}
+        return cls(dates, labels, columns)
+
+    def column(self, name):
+        values = self.columns.get(name)
+        return values if values is not None else np.full(len(self.dates), np.nan)
+
+
+def _leaf(metric):
+    """
+    Resolve a metric name, a (statement, field) pair or a raw "statement.field" name to (statement, field).
+    """
+    if isinstance(metric, tuple):
+        return metric
+    if metric in FIELDS:
+        return FIELDS[metric]
+    statement, _, field = metric.partition('.')
+    if statement in STATEMENTS and field:
+        return statement, field
+    raise KeyError(metric)
+
+
+def _base(metric):
+    for suffix in SUFFIXES:
+        if metric.endswith(suffix):
+            return metric[:-len(suffix)], suffix
+    return metric, None
+
+
+def required_columns(metric):
+    """
+    Return the (statement, field) columns `metric` is computed from. Raises KeyError for unknown metrics.
+    """
+    base, _ = _base(metric)
+    if base in RATIOS:
+        return [_leaf(part) for part in RATIOS[base]]
+    return [_leaf(base)]
+
+
+class Frame:
+    """
+    Statement columns of several symbols aligned on their common fiscal periods: every column is an
+    (n_symbols, n_periods) matrix, oldest period first and left-padded with NaN for shorter histories.
+    """
+
+    def __init__(self, symbols, labels, columns, period):
+        self.symbols = symbols
+        self.labels = labels  # per symbol, the fiscal labels of its (unpadded) periods
+        self.columns = columns
+        self.period = period
+
+    def matrix(self, metric):
+        base, suffix = _base(metric)
+        if base in RATIOS:
+            numerator, denominator = (self.columns[_leaf(part)] for part in RATIOS[base])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.where(denominator != 0, numerator / denominator, np.nan)
+        else:
+            values = self.columns[_leaf(base)]
+        if suffix == "_growth":
+            return growth(values)
+        if suffix == "_cagr":
+            return cagr(values, PERIODS_PER_YEAR[self.period])
+        return values
+
+
+def growth(values):
+    """
+    Period-over-period growth of each row, (x[t] - x[t-1]) / |x[t-1]|; the first period is NaN.
+    """
+    result = np.full(values.shape, np.nan)
+    previous, current = values[:, :-1], values[:, 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[:, 1:] = np.where(previous != 0, (current - previous) / np.abs(previous), np.nan)
+    return result
+
+
+def cagr(values, periods_per_year=1):
+    """
+    Compound annual growth rate of each row between its first reported and its last period.
+    NaN when either end is missing or not positive.
+    """
+    n_periods = values.shape[1]
+    reported = ~np.isnan(values)
+    first_index = np.argmax(reported, axis=1)
+    rows = np.arange(values.shape[0])
+    first, last = values[rows, first_index], values[rows, n_periods - 1]
+    years = (n_periods - 1 - first_index) / periods_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.power(last / first, 1 / years) - 1
+    return np.where((first > 0) & (last > 0) & (years > 0), rate, np.nan)
+
+
+class FundamentalsStore:
+    """
+    In-memory StatementTable per (symbol, statement, period), at most `max_tables` of them (least
+    recently used evicted first), refreshed when the response they were built from expires.
+    """
+
+    def __init__(self, fetch=fetch_data, afetch=afetch_data, max_tables=MAX_TABLES):
+        self._fetch = fetch
+        self._afetch = afetch
+        self.max_tables = max_tables
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()  # (symbol, statement, period) -> (expires_at, StatementTable)
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._tables.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._tables[key]
+        return None
+
+    @staticmethod
+    def _expires_at(url):
+        # A response served from the cache may already be hours old: expire with it, not a full TTL later
+        key = cache_key(url)
+        cache = get_cache()
+        expires_at = cache.expires_at(key) if cache is not None else None
+        return expires_at if expires_at is not None else time.time() + ttl_for(key)
+
+    def _store(self, key, url, data):
+        if isinstance(data, dict) and "error" in data:
+            return data
+        if not isinstance(data, list):
+            return {"error": f"Unexpected response for {key[0]} {key[1]} statements"}
+        table = StatementTable.from_rows(data)
+        expires_at = self._expires_at(url)
+        with self._lock:
+            self._tables[key] = (expires_at, table)
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+                self.evictions += 1
+            self.loads += 1
+        return table
+
+    def table(self, symbol, statement, period="annual"):
+        """
+        Return the StatementTable for `symbol`, or an error dict if it could not be fetched.
+        """
+        key = (symbol.upper(), statement, period)
+        table = self._cached(key)
+        if table is not None:
+            return table
+        url = statement_url(symbol, statement, period)
+        return self._store(key, url, self._fetch(url))
+
+    async def atable(self, symbol, statement, period="annual"):
+        """
+        Async variant of table.
+        """
+        key = (symbol.upper(), statement, period)
+        table = self._cached(key)
+        if table is not None:
+            return table
+        url = statement_url(symbol, statement, period)
+        return self._store(key, url, await self._afetch(url))
+
+    def frame(self, symbols, columns, period="annual", periods=5):
+        """
+        Fetch what is missing and return a Frame of `columns` ((statement, field) pairs) for `symbols`,
+        limited to the last `periods` periods, plus {symbol: error} for symbols that could not be loaded.
+        """
+        requests = _table_requests(symbols, columns, period)
+        # Each worker runs in a copy of the caller's context so tool event recording sees its fetches
+        contexts = [contextvars.copy_context() for _ in requests]
+        with ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(requests)))) as pool:
+            loaded = pool.map(lambda context, request: context.run(self.table, *request), contexts, requests)
+            tables = dict(zip(requests, loaded))
+        return _align(symbols, columns, period, periods, tables)
+
+    async def aframe(self, symbols, columns, period="annual", periods=5):
+        """
+        Async variant of frame.
+        """
+        requests = _table_requests(symbols, columns, period)
+        tables = dict(zip(requests, await asyncio.gather(*(self.atable(*request) for request in requests))))
+        return _align(symbols, columns, period, periods, tables)
+
+    def stats(self):
+        with self._lock:
+            return {"tables": len(self._tables), "loads": self.loads, "hits": self.hits, "evictions": self.evictions}
+
+
+def _table_requests(symbols, columns, period):
+    statements = sorted({statement for statement, _ in columns})
+    return [(symbol, statement, period) for symbol in symbols for statement in statements]
+
+
+def _align(symbols, columns, period, periods, tables):
+    statements = sorted({statement for statement, _ in columns})
+    loaded, labels, errors, selections = [], [], {}, []
+    for symbol in symbols:
+        symbol_tables = [tables[(symbol, statement, period)] for statement in statements]
+        error = next((table for table in symbol_tables if isinstance(table, dict)), None)
+        if error is not None:
+            errors[symbol] = error
+            continue
+        # Statements of one filing share its date; only periods present in all of them are comparable
+        common = symbol_tables[0].dates
+        for table in symbol_tables[1:]:
+            common = np.intersect1d(common, table.dates)
+        common = common[-periods:] if periods else common
+        loaded.append(symbol)
+        positions = {statement: np.searchsorted(table.dates, common) for statement, table in zip(statements, symbol_tables)}
+        selections.append((dict(zip(statements, symbol_tables)), positions))
+        labels.append([symbol_tables[0].labels[i] for i in positions[statements[0]]])
+    width = max((len(row) for row in labels), default=0)
+    matrices = {}
+    for statement, field in columns:
+        matrix = np.full((len(loaded), width), np.nan)
+        for row, (symbol_tables, positions) in enumerate(selections):
+            values = symbol_tables[statement].column(field)[positions[statement]]
+            if len(values):
+                matrix[row, width - len(values):] = values
+        matrices[(statement, field)] = matrix
+    return Frame(loaded, labels, matrices, period), errors
+
+
+def _series(values):
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def compute_metrics(store, symbols, metrics, period="annual", periods=5):
+    """
+    Return {symbol: {"periods": labels, metric: values per period}} for `metrics` over the last `periods`
+    periods. *_cagr metrics are a single value. Symbols that failed to load map to their error dict.
+    """
+    columns = sorted({column for metric in metrics for column in required_columns(metric)})
+    frame, errors = store.frame(symbols, columns, period, periods)
+    return _metric_results(frame, errors, symbols, metrics)
+
+
+async def acompute_metrics(store, symbols, metrics, period="annual", periods=5):
+    """
+    Async variant of compute_metrics.
+    """
+    columns = sorted({column for metric in metrics for column in required_columns(metric)})
+    frame, errors = await store.aframe(symbols, columns, period, periods)
+    return _metric_results(frame, errors, symbols, metrics)
+
+
+def _metric_results(frame, errors, symbols, metrics):
+    computed = {metric: frame.matrix(metric) for metric in metrics}
+    width = max((len(labels) for labels in frame.labels), default=0)
+    results = {}
+    for row, symbol in enumerate(frame.symbols):
+        offset = width - len(frame.labels[row])
+        entry = {"periods": frame.labels[row]}
+        for metric, values in computed.items():
+            entry[metric] = _series(values[row:row + 1])[0] if values.ndim == 1 else _series(values[row, offset:])
+        results[symbol] = entry
+    return {symbol: results.get(symbol, errors.get(symbol)) for symbol in symbols}
+
+
+def available_metrics():
+    names = list(FIELDS) + list(RATIOS)
+    return names + [name + suffix for name in names for suffix in SUFFIXES]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the process-wide fundamentals store.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FundamentalsStore()
+    return _store
@@ -0,0 +1,101 @@
+import asyncio
+import math
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.utils import fundamentals
+from src.utils.fundamentals import FundamentalsStore, cagr, compute_metrics, acompute_metrics, growth
+from src.utils.response_cache import ResponseCache, cache_key
+
+
+def _statements(symbol, statement, years, scale):
+    rows = []
+    for i, year in enumerate(years):
+        revenue = scale * 100 * (1.1 ** i)
+        row = {"date": f"{year}-12-31", "symbol": symbol, "period": "FY", "calendarYear": str(year)}
+        if statement == "income":
+            row.update(revenue=revenue, grossProfit=revenue * 0.4, netIncome=revenue * 0.1, reportedCurrency="USD")
+        elif statement == "balance":
+            row.update(totalStockholdersEquity=scale * 50, totalAssets=scale * 200)
+        else:
+            row.update(freeCashFlow=revenue * 0.2)
+        rows.append(row)
+    return list(reversed(rows))  # FMP returns the most recent period first
+
+
+class _FakeFMP:
+
+    def __init__(self):
+        self.urls = []
+
+    def fetch(self, url):
+        self.urls.append(url)
+        path = url.split("/api/v3/")[1].split("?")[0]
+        endpoint, symbol = path.split("/")
+        statement = {"income-statement": "income", "balance-sheet-statement": "balance"}.get(endpoint, "cash_flow")
+        if symbol == "BAD":
+            return {"error": "Failed to fetch data. Status code: 404"}
+        years = range(2016, 2024) if symbol == "OLD" else range(2021, 2024)
+        if statement == "balance" and symbol == "OLD":
+            years = range(2017, 2024)  # one period fewer than the income statement
+        return _statements(symbol, statement, years, 2 if symbol == "OLD" else 1)
+
+    async def afetch(self, url):
+        return self.fetch(url)
+
+
+class TestFundamentals(unittest.TestCase):
+
+    def test_growth_and_cagr_are_vectorized(self):
+        values = np.array([[100.0, 110.0, 121.0], [np.nan, 50.0, 25.0], [-10.0, 10.0, 20.0]])
+        np.testing.assert_allclose(growth(values)[0, 1:], [0.1, 0.1])
+        self.assertTrue(math.isnan(growth(values)[1, 1]))
+        self.assertEqual(growth(values)[2, 1], 2.0)
+        rates = cagr(values)
+        self.assertAlmostEqual(rates[0], 0.1)
+        self.assertAlmostEqual(rates[1], -0.5)
+        self.assertTrue(math.isnan(rates[2]))
+
+    def test_metrics_across_symbols_and_statements(self):
+        fake = _FakeFMP()
+        store = FundamentalsStore(fake.fetch, fake.afetch)
+        results = compute_metrics(store, ["OLD", "NEW", "BAD"], ["revenue_growth", "revenue_cagr", "net_margin", "roe"],
+                                  periods=5)
+        old, new = results["OLD"], results["NEW"]
+        self.assertEqual(old["periods"], ["FY 2019", "FY 2020", "FY 2021", "FY 2022", "FY 2023"])
+        self.assertIsNone(old["revenue_growth"][0])
+        self.assertAlmostEqual(old["revenue_growth"][-1], 0.1)
+        self.assertAlmostEqual(old["revenue_cagr"], 0.1)
+        self.assertAlmostEqual(new["net_margin"][0], 0.1)
+        self.assertEqual(len(new["periods"]), 3)
+        self.assertAlmostEqual(new["roe"][0], 10 / 50)
+        self.assertIn("error", results["BAD"])
+
+        fetched = len(fake.urls)
+        asyncio.run(acompute_metrics(store, ["OLD", "NEW"], ["gross_margin"]))
+        self.assertEqual(len(fake.urls), fetched)  # answered from the store
+        self.assertGreater(store.stats()["hits"], 0)
+
+    def test_tables_are_bounded_and_expire_with_the_cached_response(self):
+        fake = _FakeFMP()
+        store = FundamentalsStore(fake.fetch, fake.afetch, max_tables=2)
+        for symbol in ("A", "B", "C"):
+            store.table(symbol, "income")
+        self.assertEqual((store.stats()["tables"], store.stats()["evictions"]), (2, 1))
+        store.table("A", "income")
+        self.assertEqual(len(fake.urls), 4)  # the least recently used table was dropped
+
+        # A response that has sat in the cache for a while: the table expires with it
+        cache = ResponseCache()
+        url = fundamentals.statement_url("D", "income", "annual")
+        cache.set(cache_key(url), [], ttl=60)
+        with mock.patch.object(fundamentals, "get_cache", return_value=cache):
+            store.table("D", "income")
+        self.assertAlmostEqual(store._tables[("D", "income", "annual")][0], time.time() + 60, delta=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,578 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import CancelledError
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cassette import get_cassette
+from .json_stream import JsonArrayParser, iter_json_array, select_records
+from .rate_limiter import get_limiter, priority_for
+from .response_cache import cache_key, get_cache
+from .single_flight import SingleFlight, on_event_loop
+from .tool_events import emit
+
+# Shared transport for every Financial Modeling Prep call. All tools go through
+# fetch_data() so they reuse one keep-alive connection pool instead of paying a
+# TCP+TLS handshake per tool call.
+
+POOL_SIZE = int(os.environ.get('FMP_POOL_SIZE', 10))
+ASYNC_POOL_SIZE = int(os.environ.get('FMP_ASYNC_POOL_SIZE', 100))
+CONNECT_TIMEOUT = float(os.environ.get('FMP_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('FMP_READ_TIMEOUT', 30))
+MAX_RETRIES = int(os.environ.get('FMP_MAX_RETRIES', 3))
+BACKOFF_FACTOR = float(os.environ.get('FMP_BACKOFF_FACTOR', 0.5))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+FMP_URL = 'https://financialmodelingprep.com'
+# Send FMP requests to another host instead, e.g. the local stand-in of the benchmark harness
+BASE_URL = os.environ.get('FMP_BASE_URL')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_settings = {
+    "pool_size": POOL_SIZE,
+    "async_pool_size": ASYNC_POOL_SIZE,
+    "connect_timeout": CONNECT_TIMEOUT,
+    "read_timeout": READ_TIMEOUT,
+    "max_retries": MAX_RETRIES,
+    "backoff_factor": BACKOFF_FACTOR,
+    "base_url": BASE_URL,
+}
+_session = None
+_session_lock = threading.Lock()
+# aiohttp sessions are bound to the loop they were created on, so keep one per loop
+_async_sessions = weakref.WeakKeyDictionary()
+# Identical requests that are already in flight wait for the leader instead of hitting FMP again
+_flights = SingleFlight()
+
+
+class _BudgetExhausted(Exception):
+    pass
+
+
+class _LimitedRetry(Retry):
+    """
+    urllib3 retry policy that takes a rate-limiter token before every retry, so retries are
+    paced and counted against the daily budget like first attempts.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if not get_limiter().acquire(priority_for(cache_key(url or ''))):
+            if response is not None:
+                response.drain_conn()  # hand the connection back to the pool
+            raise _BudgetExhausted()
+        return retry
+
+
+def _build_session(pool_size, max_retries, backoff_factor):
+    retry = _LimitedRetry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_session():
+    """
+    Return the process-wide requests session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(
+                    _settings["pool_size"], _settings["max_retries"], _settings["backoff_factor"]
+                )
+    return _session
+
+
+def configure(pool_size=None, async_pool_size=None, connect_timeout=None, read_timeout=None, max_retries=None,
+              backoff_factor=None, base_url=None):
+    """
+    Override the transport settings. The pooled sessions are rebuilt on next use.
+    `base_url` replaces https://financialmodelingprep.com in every request ("" restores it).
+    """
+    global _session
+    overrides = {
+        "pool_size": pool_size,
+        "async_pool_size": async_pool_size,
+        "connect_timeout": connect_timeout,
+        "read_timeout": read_timeout,
+        "max_retries": max_retries,
+        "backoff_factor": backoff_factor,
+        "base_url": base_url,
+    }
+    with _session_lock:
+        _settings.update({k: v for k, v in overrides.items() if v is not None})
+        if _session is not None:
+            _session.close()
+        _session = None
+        # Open async sessions are closed by aclose() on their own loop; new calls get a fresh one
+        _async_sessions.clear()
+
+
+def upstream(url):
+    """
+    The URL actually requested for `url`: FMP URLs are redirected to the configured base URL.
+    """
+    base_url = _settings["base_url"]
+    if base_url and url.startswith(FMP_URL):
+        return base_url.rstrip('/') + url[len(FMP_URL):]
+    return url
+
+
+def get(url, timeout=None, stream=False):
+    """
+    Issue a GET on the shared session. `timeout` overrides the read timeout.
+    """
+    read_timeout = timeout if timeout is not None else _settings["read_timeout"]
+    return get_session().get(upstream(url), timeout=(_settings["connect_timeout"], read_timeout), stream=stream)
+
+
+class FetchError(Exception):
+    """
+    Raised by the streaming helpers; `error` is the dict fetch_data would have returned.
+    """
+
+    def __init__(self, error):
+        super().__init__(error["error"])
+        self.error = error
+
+
+def _error_for_status(status_code):
+    return {"error": f"Failed to fetch data. Status code: {status_code}"}
+
+
+BUDGET_EXHAUSTED_ERROR = {"error": "Failed to fetch data. Daily FMP request budget exhausted, do not retry today."}
+
+
+def _is_error(data):
+    return isinstance(data, dict) and "error" in data
+
+
+def _store(cache, key, data):
+    if cache is not None and not _is_error(data):
+        cache.set(key, data)
+    return data
+
+
+def fetch_data(url, timeout=None):
+    """
+    Fetch `url` and return the decoded JSON body, or an error dict the tools can hand back to the LLM.
+    Successful responses are served from the response cache while fresh, and concurrent
+    identical requests share one upstream fetch.
+    """
+    key = cache_key(url)
+    cache = get_cache()
+    data = cache.get(key) if cache is not None else None
+    emit("fetch", key=key, cached=data is not None)
+    if data is not None:
+        return data
+    return _flights.do(key, lambda: _store(cache, key, _fetch_uncached(url, key, timeout)))
+
+
+def flight_stats():
+    """
+    Return single-flight counters; `deduplicated` is the number of requests that shared another caller's fetch.
+    """
+    return _flights.stats()
+
+
+def _emit_http(key, status, started, size=0, retries=0, replayed=False):
+    # One event per upstream request (after retries); `status` is the HTTP status or the failure's class name
+    emit("http", key=key, status=status, bytes=size, retries=retries, duration=time.perf_counter() - started,
+         replayed=replayed)
+
+
+def _replayed(key):
+    """
+    The recorded (status, body) for `key` when replaying a cassette, else None (see utils.cassette).
+    """
+    cassette = get_cassette()
+    if cassette is None or not cassette.replaying:
+        return None
+    started = time.perf_counter()
+    entry = cassette.lookup(key)
+    if entry is not None:
+        _emit_http(key, entry[0], started, len(entry[1]), replayed=True)
+    return entry
+
+
+def _record(key, status, body):
+    cassette = get_cassette()
+    # Transient failures are not worth replaying
+    if cassette is not None and status not in RETRY_STATUSES:
+        cassette.record(key, status, body)
+
+
+def _decode(status, body):
+    if status == 200:
+        return json.loads(body) if body.strip() else None
+    return _error_for_status(status)
+
+
+def _retries(response):
+    retry = getattr(response.raw, "retries", None)
+    return len(retry.history) if retry is not None else 0
+
+
+def _fetch_uncached(url, key, timeout):
+    replayed = _replayed(key)
+    if replayed is not None:
+        return _decode(*replayed)
+    if not get_limiter().acquire(priority_for(key)):
+        return dict(BUDGET_EXHAUSTED_ERROR)
+    started = time.perf_counter()
+    try:
+        response = get(url, timeout=timeout)
+    except _BudgetExhausted:
+        _emit_http(key, "BudgetExhausted", started)
+        return dict(BUDGET_EXHAUSTED_ERROR)
+    except requests.RequestException as exc:
+        _emit_http(key, exc.__class__.__name__, started)
+        # Never echo the exception text: it contains the URL and therefore the API key.
+        return {"error": f"Failed to fetch data. {exc.__class__.__name__}"}
+    _emit_http(key, response.status_code, started, len(response.content), _retries(response))
+    _record(key, response.status_code, response.content)
+    return _decode(response.status_code, response.content)
+
+
+async def get_async_session():
+    """
+    Return the aiohttp session for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=_settings["async_pool_size"], keepalive_timeout=30)
+        session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+        _async_sessions[loop] = session
+    return session
+
+
+async def aclose():
+    """
+    Close the aiohttp session bound to the running event loop, if any.
+    """
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def _retry_delay(attempt, retry_after):
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return _settings["backoff_factor"] * (2 ** attempt)
+
+
+async def afetch_data(url, timeout=None):
+    """
+    Async variant of fetch_data, using the shared aiohttp session with the same retry policy.
+    """
+    key = cache_key(url)
+    cache = get_cache()
+    data = await cache.aget(key) if cache is not None else None
+    emit("fetch", key=key, cached=data is not None)
+    if data is not None:
+        return data
+
+    async def fetch():
+        return _store(cache, key, await _afetch_uncached(url, key, timeout))
+
+    return await _flights.ado(key, fetch)
+
+
+async def _afetch_uncached(url, key, timeout):
+    replayed = _replayed(key)
+    if replayed is not None:
+        return _decode(*replayed)
+    if not await get_limiter().aacquire(priority_for(key)):
+        return dict(BUDGET_EXHAUSTED_ERROR)
+    session = await get_async_session()
+    read_timeout = timeout if timeout is not None else _settings["read_timeout"]
+    client_timeout = aiohttp.ClientTimeout(sock_connect=_settings["connect_timeout"], sock_read=read_timeout)
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            async with session.get(upstream(url), timeout=client_timeout) as response:
+                if response.status in RETRY_STATUSES and attempt < _settings["max_retries"]:
+                    delay = _retry_delay(attempt, response.headers.get("Retry-After"))
+                else:
+                    body = await response.read()
+                    _emit_http(key, response.status, started, len(body), attempt)
+                    _record(key, response.status, body)
+                    return _decode(response.status, body)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            if attempt >= _settings["max_retries"]:
+                _emit_http(key, exc.__class__.__name__, started, retries=attempt)
+                return {"error": f"Failed to fetch data. {exc.__class__.__name__}"}
+            delay = _retry_delay(attempt, None)
+        attempt += 1
+        await asyncio.sleep(delay)
+        # A retry is another request: paced by the limiter and counted against the daily budget
+        if not await get_limiter().aacquire(priority_for(key)):
+            _emit_http(key, "BudgetExhausted", started, retries=attempt)
+            return dict(BUDGET_EXHAUSTED_ERROR)
+
+
+def _cached_records(url):
+    cache = get_cache()
+    return _records_of(url, cache.get(cache_key(url)) if cache is not None else None)
+
+
+async def _acached_records(url):
+    cache = get_cache()
+    return _records_of(url, await cache.aget(cache_key(url)) if cache is not None else None)
+
+
+def _records_of(url, data):
+    emit("fetch", key=cache_key(url), cached=data is not None)
+    if data is None:
+        return None
+    return data if isinstance(data, list) else []
+
+
+def _shared_records(data):
+    # The result of the identical fetch or stream this one waited for
+    if _is_error(data):
+        raise FetchError(data)
+    return data if isinstance(data, list) else []
+
+
+def _kept(records, kept):
+    for record in records:
+        kept.append(record)
+        yield record
+
+
+def stream_records(url, fields=None, where=None, cache=False):
+    """
+    Yield the records of a JSON-array endpoint as they download, without building the whole
+    response in memory. `fields` and `where` are applied per record (see json_stream.select_records).
+    A fresh cached copy, or the result of an identical fetch_data call in flight, is replayed instead
+    of downloading. Records are not kept unless `cache` is set: then the stream leads the single-flight
+    for the URL and, once it ran to the end, caches the whole list for later callers.
+    Raises FetchError on failure.
+    """
+    cached = _cached_records(url)
+    if cached is not None:
+        yield from select_records(cached, fields, where)
+        return
+    key = cache_key(url)
+    flight, leader = _flights.join(key) if cache else (_flights.current(key), False)
+    if flight is None or (not leader and on_event_loop()):
+        # Nothing to share, or the download to share may be a task of the loop we would block
+        yield from select_records(_stream_uncached(url, key), fields, where)
+        return
+    if not leader:
+        try:
+            data = flight.result()
+        except CancelledError:
+            # The leading stream stopped early: download it ourselves
+            yield from stream_records(url, fields, where, cache)
+            return
+        yield from select_records(_shared_records(data), fields, where)
+        return
+    records = []
+    try:
+        yield from select_records(_kept(_stream_uncached(url, key), records), fields, where)
+    except FetchError as exc:
+        flight.set_result(exc.error)
+        raise
+    except BaseException:
+        flight.cancel()  # stopped early (GeneratorExit): the records are incomplete
+        raise
+    else:
+        flight.set_result(_store(get_cache(), key, records))
+    finally:
+        _flights.finish(key, flight)
+
+
+def _stream_uncached(url, key):
+    replayed = _replayed(key)
+    if replayed is not None:
+        yield from _replayed_records(replayed)
+        return
+    if not get_limiter().acquire(priority_for(key)):
+        raise FetchError(dict(BUDGET_EXHAUSTED_ERROR))
+    started = time.perf_counter()
+    try:
+        response = get(url, stream=True)
+    except _BudgetExhausted:
+        _emit_http(key, "BudgetExhausted", started)
+        raise FetchError(dict(BUDGET_EXHAUSTED_ERROR)) from None
+    except requests.RequestException as exc:
+        _emit_http(key, exc.__class__.__name__, started)
+        raise FetchError({"error": f"Failed to fetch data. {exc.__class__.__name__}"}) from None
+    received = []
+    recording = get_cassette() is not None and get_cassette().recording
+
+    def chunks():
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            received.append(chunk if recording else len(chunk))
+            yield chunk
+
+    with response:
+        complete = False
+        try:
+            if response.status_code != 200:
+                _record(key, response.status_code, response.content)
+                raise FetchError(_error_for_status(response.status_code))
+            try:
+                yield from iter_json_array(chunks())
+                complete = True
+            except (requests.RequestException, ValueError) as exc:
+                raise FetchError({"error": f"Failed to fetch data. {exc.__class__.__name__}"}) from None
+        finally:
+            # Bytes actually downloaded: a limited read stops early (and is not recorded)
+            size = sum(len(chunk) for chunk in received) if recording else sum(received)
+            _emit_http(key, response.status_code, started, size, _retries(response))
+            if complete and recording:
+                _record(key, response.status_code, b''.join(received))
+
+
+def _replayed_records(replayed):
+    status, body = replayed
+    if status != 200:
+        raise FetchError(_error_for_status(status))
+    try:
+        yield from iter_json_array([body])
+    except ValueError as exc:
+        raise FetchError({"error": f"Failed to fetch data. {exc.__class__.__name__}"}) from None
+
+
+async def astream_records(url, fields=None, where=None, cache=False):
+    """
+    Async variant of stream_records.
+    """
+    cached = await _acached_records(url)
+    if cached is not None:
+        for record in select_records(cached, fields, where):
+            yield record
+        return
+    key = cache_key(url)
+    flight, leader = _flights.join(key) if cache else (_flights.current(key), False)
+    if flight is None:
+        async for record in _astream_uncached(url, key):
+            for selected in select_records((record,), fields, where):
+                yield selected
+        return
+    if not leader:
+        try:
+            data = await asyncio.wrap_future(flight)
+        except asyncio.CancelledError:
+            if not flight.cancelled() or asyncio.current_task().cancelling():
+                raise
+            async for record in astream_records(url, fields, where, cache):
+                yield record
+            return
+        for record in select_records(_shared_records(data), fields, where):
+            yield record
+        return
+    records = []
+    try:
+        async for record in _astream_uncached(url, key):
+            records.append(record)
+            for selected in select_records((record,), fields, where):
+                yield selected
+    except FetchError as exc:
+        flight.set_result(exc.error)
+        raise
+    except BaseException:
+        flight.cancel()
+        raise
+    else:
+        flight.set_result(_store(get_cache(), key, records))
+    finally:
+        _flights.finish(key, flight)
+
+
+async def _astream_uncached(url, key):
+    replayed = _replayed(key)
+    if replayed is not None:
+        for record in _replayed_records(replayed):
+            yield record
+        return
+    if not await get_limiter().aacquire(priority_for(key)):
+        raise FetchError(dict(BUDGET_EXHAUSTED_ERROR))
+    session = await get_async_session()
+    client_timeout = aiohttp.ClientTimeout(sock_connect=_settings["connect_timeout"], sock_read=_settings["read_timeout"])
+    started = time.perf_counter()
+    status, received = None, []
+    recording = get_cassette() is not None and get_cassette().recording
+    try:
+        async with session.get(upstream(url), timeout=client_timeout) as response:
+            status = response.status
+            if response.status != 200:
+                _record(key, response.status, await response.read())
+                raise FetchError(_error_for_status(response.status))
+            parser = JsonArrayParser()
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                received.append(chunk if recording else len(chunk))
+                for record in parser.feed(chunk):
+                    yield record
+                if parser.done:
+                    break
+            else:
+                for record in parser.finish():
+                    yield record
+            if recording:
+                _record(key, status, b''.join(received))
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+        status = status or exc.__class__.__name__
+        raise FetchError({"error": f"Failed to fetch data. {exc.__class__.__name__}"}) from None
+    finally:
+        size = sum(len(chunk) for chunk in received) if recording else sum(received)
+        _emit_http(key, status, started, size)
+
+
+def fetch_records(url, fields=None, where=None, limit=None):
+    """
+    Collect stream_records() into a list, stopping the download once `limit` records matched.
+    Returns an error dict instead of raising, like fetch_data.
+    """
+    try:
+        return list(itertools.islice(stream_records(url, fields, where), limit))
+    except FetchError as exc:
+        return exc.error
+
+
+async def afetch_records(url, fields=None, where=None, limit=None):
+    """
+    Async variant of fetch_records.
+    """
+    records = []
+    stream = astream_records(url, fields, where)
+    try:
+        async for record in stream:
+            if limit is not None and len(records) >= limit:
+                break
+            records.append(record)
+    except FetchError as exc:
+        return exc.error
+    finally:
+        await stream.aclose()
+    return records
@@ -0,0 +1,181 @@
+import asyncio
+import gzip
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from src.utils import http_client, response_cache, tool_events
+from src.utils.rate_limiter import RateLimiter
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures_left = 0
+    peers = set()
+    lists = 0
+    delay = 0
+
+    def do_GET(self):
+        _Handler.peers.add(self.client_address)
+        if self.path.startswith("/flaky") and _Handler.failures_left > 0:
+            _Handler.failures_left -= 1
+            self._send(503, b"{}")
+            return
+        if self.path.startswith("/api/v3/stock/list"):
+            _Handler.lists += 1
+            time.sleep(_Handler.delay)
+            stocks = [{"symbol": f"S{i}", "exchangeShortName": "NYSE" if i % 2 else "NASDAQ"} for i in range(5000)]
+            self._send(200, gzip.compress(json.dumps(stocks).encode()), {"Content-Encoding": "gzip"})
+            return
+        if self.path.startswith("/missing"):
+            self._send(404, b"{}")
+            return
+        body = json.dumps([{"symbol": "AAPL", "gzip": "gzip" in self.headers.get("Accept-Encoding", "")}])
+        self._send(200, gzip.compress(body.encode()), {"Content-Encoding": "gzip"})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        http_client.configure(backoff_factor=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        http_client.configure(backoff_factor=http_client.BACKOFF_FACTOR)
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+
+    def test_gzip_and_keep_alive(self):
+        _Handler.peers.clear()
+        for symbol in ("AAPL", "MSFT", "SNOW"):
+            data = http_client.fetch_data(f"{self.base}/api/v3/profile/{symbol}")
+            self.assertEqual(data, [{"symbol": "AAPL", "gzip": True}])
+        # All three requests went over a single pooled connection
+        self.assertEqual(len(_Handler.peers), 1)
+
+    def test_cached_responses_skip_the_network(self):
+        _Handler.peers.clear()
+        url = f"{self.base}/api/v3/profile/AAPL?apikey=secret"
+        first = http_client.fetch_data(url)
+        _Handler.peers.clear()
+        self.assertIs(http_client.fetch_data(url), first)
+        self.assertEqual(_Handler.peers, set())
+
+    def test_retries_on_5xx(self):
+        _Handler.failures_left = 2
+        data = http_client.fetch_data(f"{self.base}/flaky")
+        self.assertEqual(data[0]["symbol"], "AAPL")
+
+    def test_retries_take_limiter_tokens(self):
+        for fetch in (http_client.fetch_data, lambda url: asyncio.run(http_client.afetch_data(url))):
+            _Handler.failures_left = 5
+            limiter = RateLimiter(rate=1000, burst=1000, daily_budget=2)
+            with mock.patch.object(http_client, "get_limiter", return_value=limiter):
+                data = fetch(f"{self.base}/flaky")
+            self.assertEqual(data, http_client.BUDGET_EXHAUSTED_ERROR)
+            # One attempt and one retry; the second retry found the budget spent
+            self.assertEqual(_Handler.failures_left, 3)
+            self.assertEqual(limiter.remaining_budget()["used_today"], 2)
+        _Handler.failures_left = 0
+
+    def test_http_events(self):
+        _Handler.failures_left = 1
+        with tool_events.recording() as events:
+            http_client.fetch_data(f"{self.base}/flaky")
+            http_client.fetch_data(f"{self.base}/flaky")  # cached: no upstream request
+        requests = [event for event in events if event["type"] == "http"]
+        self.assertEqual(len(requests), 1)
+        self.assertEqual((requests[0]["status"], requests[0]["retries"]), (200, 1))
+        self.assertGreater(requests[0]["bytes"], 0)
+        self.assertEqual([event["cached"] for event in events if event["type"] == "fetch"], [False, True])
+
+    def test_error_status(self):
+        data = http_client.fetch_data(f"{self.base}/missing")
+        self.assertEqual(data, {"error": "Failed to fetch data. Status code: 404"})
+
+    def test_async_fetch(self):
+        async def run():
+            _Handler.failures_left = 1
+            results = await asyncio.gather(
+                http_client.afetch_data(f"{self.base}/flaky"),
+                http_client.afetch_data(f"{self.base}/missing"),
+            )
+            await http_client.aclose()
+            return results
+
+        ok, missing = asyncio.run(run())
+        self.assertEqual(ok, [{"symbol": "AAPL", "gzip": True}])
+        self.assertEqual(missing, {"error": "Failed to fetch data. Status code: 404"})
+
+    def test_streamed_records_with_filter_and_limit(self):
+        url = f"{self.base}/api/v3/stock/list?apikey=secret"
+        records = http_client.fetch_records(url, fields=("symbol",), where={"exchangeShortName": "NYSE"}, limit=3)
+        self.assertEqual(records, [{"symbol": "S1"}, {"symbol": "S3"}, {"symbol": "S5"}])
+        self.assertEqual(len(list(http_client.stream_records(url))), 5000)
+        self.assertEqual(http_client.fetch_records(f"{self.base}/missing"), {"error": "Failed to fetch data. Status code: 404"})
+
+        async def run():
+            records = await http_client.afetch_records(url, where={"exchangeShortName": "NASDAQ"}, limit=2)
+            await http_client.aclose()
+            return records
+
+        self.assertEqual([r["symbol"] for r in asyncio.run(run())], ["S0", "S2"])
+
+    def test_streams_cache_only_when_asked_and_share_downloads(self):
+        url = f"{self.base}/api/v3/stock/list?apikey=secret"
+        key = response_cache.cache_key(url)
+        _Handler.lists = 0
+        self.assertEqual(len(http_client.fetch_records(url, limit=10)), 10)
+        self.assertEqual(len(list(http_client.stream_records(url, fields=("symbol",)))), 5000)
+        self.assertIsNone(response_cache.get_cache().get(key))  # streams keep no records by default
+        self.assertEqual(_Handler.lists, 2)
+
+        # A caching stream leads the flight: a fetch_data call arriving mid-stream waits for it
+        stream = http_client.stream_records(url, fields=("symbol",), cache=True)
+        self.assertEqual(next(stream), {"symbol": "S0"})
+        shared = []
+        waiter = threading.Thread(target=lambda: shared.append(http_client.fetch_data(url)))
+        waiter.start()
+        self.assertEqual(len(list(stream)), 4999)
+        waiter.join(timeout=10)
+        self.assertEqual(len(shared[0]), 5000)
+        self.assertEqual(shared[0][1]["exchangeShortName"], "NYSE")  # the full records, not the projection
+        self.assertIs(http_client.fetch_data(url), shared[0])
+        self.assertEqual(_Handler.lists, 3)
+
+        # A plain stream replays a fetch_data call already in flight
+        response_cache.get_cache().clear()
+        _Handler.delay = 0.3
+        try:
+            fetching = threading.Thread(target=http_client.fetch_data, args=(url,))
+            fetching.start()
+            time.sleep(0.1)
+            self.assertEqual(len(list(http_client.stream_records(url, where={"exchangeShortName": "NYSE"}))), 2500)
+            fetching.join(timeout=10)
+        finally:
+            _Handler.delay = 0
+        self.assertEqual(_Handler.lists, 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import codecs
+import json
+
+# Incremental parsing of top-level JSON arrays, so the multi-megabyte list
+# endpoints can be consumed record by record while they download.
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of a top-level JSON array from an iterable of bytes or str chunks.
+    Raises ValueError if the payload is not an array or is truncated.
+    """
+    parser = JsonArrayParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.done:
+            return
+    yield from parser.finish()
+
+
+class JsonArrayParser:
+    """
+    Push parser for a top-level JSON array: feed() chunks as they arrive and iterate the
+    completed elements it yields; call finish() once the input ends.
+    """
+
+    def __init__(self):
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._started = False
+        self.done = False
+
+    def feed(self, chunk):
+        text = self._utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+        return self._parse(text, final=False)
+
+    def finish(self):
+        yield from self._parse(self._utf8.decode(b'', final=True), final=True)
+        if not self.done:
+            raise ValueError("Truncated JSON array")
+
+    def _parse(self, text, final):
+        buffer = self._buffer + text
+        position = 0
+        if not self._started:
+            position = _skip(buffer, position, _WHITESPACE)
+            if position == len(buffer):
+                self._buffer = ''
+                return
+            if buffer[position] != '[':
+                raise ValueError("Expected a JSON array")
+            self._started = True
+            position += 1
+        while not self.done:
+            position = _skip(buffer, position, _WHITESPACE + ',')
+            if position == len(buffer):
+                break
+            if buffer[position] == ']':
+                self.done = True
+                break
+            try:
+                value, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    raise ValueError("Truncated JSON array") from None
+                break  # the value continues in the next chunk
+            following = _skip(buffer, end, _WHITESPACE)
+            if following == len(buffer) or buffer[following] not in ',]':
+                # A number cut at the chunk edge ("-4.5e") parses short; only trust a value once its delimiter arrived
+                if final:
+                    raise ValueError("Truncated JSON array")
+                break
+            yield value
+            position = end
+        self._buffer = buffer[position:]
+
+
+def _skip(text, position, characters):
+    while position < len(text) and text[position] in characters:
+        position += 1
+    return position
+
+
+def select_records(records, fields=None, where=None):
+    """
+    Filter and project records lazily.
+
+    `where` is either a callable taking the record or a dict of field -> required value
+    (string comparisons are case-insensitive). `fields` limits each dict record to those keys.
+    """
+    if isinstance(where, dict):
+        expected = {name: value.lower() if isinstance(value, str) else value for name, value in where.items()}
+
+        def where(record):
+            for name, value in expected.items():
+                actual = record.get(name) if isinstance(record, dict) else None
+                if isinstance(actual, str):
+                    actual = actual.lower()
+                if actual != value:
+                    return False
+            return True
+
+    for record in records:
+        if where is not None and not where(record):
+            continue
+        if fields and isinstance(record, dict):
+            record = {name: record[name] for name in fields if name in record}
+        yield record
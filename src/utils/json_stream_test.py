@@ -0,0 +1,40 @@
+import json
+import unittest
+
+from src.utils.json_stream import JsonArrayParser, iter_json_array, select_records
+
+
+class TestJsonStream(unittest.TestCase):
+
+    def test_every_chunk_boundary(self):
+        data = [{"symbol": "AAPL", "name": "Apple, Inc. [x]"}, 123, -4.5e3, "SNOW", [1, 2], {"name": "Nestlé"}, None]
+        payload = json.dumps(data, ensure_ascii=False).encode()
+        for size in range(1, len(payload) + 1):
+            chunks = [payload[i:i + size] for i in range(0, len(payload), size)]
+            self.assertEqual(list(iter_json_array(chunks)), data, size)
+
+    def test_records_are_available_before_the_input_ends(self):
+        parser = JsonArrayParser()
+        self.assertEqual(list(parser.feed(b'[{"symbol": "AAPL"}, {"symb')), [{"symbol": "AAPL"}])
+        self.assertEqual(list(parser.feed(b'ol": "MSFT"}]')), [{"symbol": "MSFT"}])
+        self.assertTrue(parser.done)
+
+    def test_rejects_non_arrays_and_truncation(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'{"Error Message": "Invalid API KEY."}']))
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[{"symbol": "AAPL"}, {"sym']))
+
+    def test_select_records(self):
+        records = [
+            {"symbol": "AAPL", "exchangeShortName": "NASDAQ", "price": 1},
+            {"symbol": "IBM", "exchangeShortName": "NYSE", "price": 2},
+        ]
+        selected = select_records(records, fields=("symbol",), where={"exchangeShortName": "nyse"})
+        self.assertEqual(list(selected), [{"symbol": "IBM"}])
+        selected = select_records(records, where=lambda record: record["price"] > 1)
+        self.assertEqual([r["symbol"] for r in selected], ["IBM"])
+
+
+if __name__ == "__main__":
+    unittest.main()
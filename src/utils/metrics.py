@@ -0,0 +1,472 @@
+import bisect
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from .tool_events import add_listener, emit, recording
+
+# Hot-path metrics for the agent: tool calls, FMP requests and LLM calls, fed by
+# the tool event bus. Totals are exported in the Prometheus text format
+# (render_prometheus(), GET /metrics in server mode) and every chat turn is
+# summarized as a JSON trace, so a slow turn can be pinned on FMP, the LLM or
+# an oversized tool payload.
+
+TRACE_PATH = os.environ.get('AGENT_TRACE_PATH')  # JSON lines, one trace per turn; unset = in memory only
+TRACE_KEEP = int(os.environ.get('AGENT_TRACE_KEEP', 100))
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+TOKEN_BUCKETS = (256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+MAX_OPEN_LLM_CALLS = 1024  # LLM calls started but not yet ended that are kept for their duration
+
+# name -> (type, help)
+METRICS = {
+    "agent_turns_total": ("counter", "Chat turns, by source of the answer (agent, answer cache or fast path)"),
+    "agent_turn_duration_seconds": ("histogram", "Chat turn latency until the answer is complete"),
+    "agent_tool_calls_total": ("counter", "Tool calls by tool and outcome"),
+    "agent_tool_duration_seconds": ("histogram", "Tool call latency"),
+    "agent_tool_result_bytes": ("histogram", "Size of the tool result handed to the LLM"),
+    "fmp_cache_lookups_total": ("counter", "FMP response cache lookups by endpoint and result"),
+    "fmp_requests_total": ("counter", "Upstream FMP requests by endpoint and status"),
+    "fmp_request_duration_seconds": ("histogram", "Upstream FMP request latency, retries included"),
+    "fmp_response_bytes": ("histogram", "Upstream FMP response body size"),
+    "fmp_retries_total": ("counter", "Upstream FMP request retries by endpoint"),
+    "llm_calls_total": ("counter", "LLM calls by model"),
+    "llm_call_duration_seconds": ("histogram", "LLM call latency"),
+    "llm_tokens_total": ("counter", "LLM tokens by model and direction (input/output)"),
+    "agent_history_tokens": ("histogram", "Estimated tokens of the chat history sent with an LLM call"),
+    "agent_memory_compacted_total": ("counter", "Old tool results replaced by a compact reference in chat memory"),
+    "agent_memory_dropped_messages": ("histogram", "Oldest messages left out of an LLM call to fit the token budget"),
+    "agent_fast_path_total": ("counter", "Fast-path attempts by intent and result (hit, or why it fell through)"),
+    "agent_fast_path_duration_seconds": ("histogram", "Fast-path latency, answered or fallen through"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+# Routes whose second path segment is part of the route name rather than a symbol, CIK or search term
+TWO_SEGMENT_ROUTES = {
+    'stock/list', 'etf/list', 'available-traded/list', 'symbol/available-indexes', 'symbol/available-euronext',
+    'commitment_of_traders_report/list', 'governance/executive_compensation', 'historical/employee_count',
+    'search/isin',
+}
+
+
+def endpoint(key):
+    """
+    The route of a cache key, without symbols, identifiers or parameters: "/api/v3/quote/AAPL,MSFT" -> "quote".
+    Only the route name is kept, so the label has a fixed set of values.
+    """
+    segments = key.split('?', 1)[0].strip('/').split('/')
+    if len(segments) > 2 and segments[0] == 'api':
+        segments = segments[2:]
+    route = '/'.join(segments[:2])
+    return route if route in TWO_SEGMENT_ROUTES else segments[0] or 'unknown'
+
+
+def _result_bytes(result):
+    # FunctionTool hands the LLM str(result)
+    return len(str(result).encode()) if result is not None else 0
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound)) if bound != int(bound) else str(int(bound))
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Metrics:
+    """
+    Thread-safe counters and histograms keyed by metric name and label set.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float)
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        with self._lock:
+            return self._histograms.get(_key(name, labels))
+
+    def on_event(self, event):
+        kind = event["type"]
+        if kind == "tool_end":
+            status = "ok" if event.get("ok") else "error"
+            self.inc("agent_tool_calls_total", tool=event["tool"], status=status)
+            self.observe("agent_tool_duration_seconds", event["duration"], tool=event["tool"])
+            self.observe("agent_tool_result_bytes", _result_bytes(event.get("result")), BYTES_BUCKETS,
+                         tool=event["tool"])
+        elif kind == "fetch":
+            self.inc("fmp_cache_lookups_total", endpoint=endpoint(event["key"]),
+                     result="hit" if event["cached"] else "miss")
+        elif kind == "http":
+            name = endpoint(event["key"])
+            self.inc("fmp_requests_total", endpoint=name, status=event["status"])
+            self.observe("fmp_request_duration_seconds", event["duration"], endpoint=name)
+            self.observe("fmp_response_bytes", event["bytes"], BYTES_BUCKETS, endpoint=name)
+            if event["retries"]:
+                self.inc("fmp_retries_total", event["retries"], endpoint=name)
+        elif kind == "llm":
+            model = event.get("model") or "unknown"
+            self.inc("llm_calls_total", model=model)
+            self.observe("llm_call_duration_seconds", event["duration"], model=model)
+            self.inc("llm_tokens_total", event.get("input_tokens") or 0, model=model, direction="input")
+            self.inc("llm_tokens_total", event.get("output_tokens") or 0, model=model, direction="output")
+        elif kind == "memory":
+            self.observe("agent_history_tokens", event["tokens"], TOKEN_BUCKETS)
+            self.observe("agent_memory_dropped_messages", event["dropped"], (0, 1, 2, 5, 10, 20, 50, 100))
+            if event["compacted"]:
+                self.inc("agent_memory_compacted_total", event["compacted"])
+        elif kind == "fast_path":
+            result = "hit" if event["hit"] else event["reason"]
+            self.inc("agent_fast_path_total", intent=event["intent"] or "none", result=result)
+            self.observe("agent_fast_path_duration_seconds", event["duration"],
+                         result="hit" if event["hit"] else "miss")
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.cumulative()), h.sum, h.count) for key, h in histograms]
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            samples = []
+            if kind == "counter":
+                samples = [f"{name}{_labels(labels)} {value:g}" for (metric, labels), value in counters
+                           if metric == name]
+            else:
+                for (metric, labels), buckets, total, count in histograms:
+                    if metric != name:
+                        continue
+                    for bound, cumulative in buckets:
+                        samples.append(f"{name}_bucket{_labels(labels + (('le', _bound(bound)),))} {cumulative}")
+                    samples.append(f"{name}_sum{_labels(labels)} {total:g}")
+                    samples.append(f"{name}_count{_labels(labels)} {count}")
+            if samples:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + samples
+        return '\n'.join(lines) + '\n'
+
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def _usage(response):
+    """
+    (input tokens, output tokens) reported with an LLM chat response, as far as the provider reports them.
+    """
+    usage = _field(getattr(response, "raw", None), "usage")
+    extra = getattr(response, "additional_kwargs", None) or {}
+    input_tokens = _field(usage, "input_tokens") or _field(usage, "prompt_tokens") or extra.get("prompt_tokens")
+    output_tokens = (_field(usage, "output_tokens") or _field(usage, "completion_tokens")
+                     or extra.get("completion_tokens"))
+    return input_tokens, output_tokens
+
+
+_llm_handler = None
+_llm_lock = threading.Lock()
+
+
+def instrument_llm():
+    """
+    Emit an "llm" event (model, input/output tokens, duration) for every LLM chat call made through
+    llama-index, by subscribing to its instrumentation dispatcher. Safe to call more than once.
+    """
+    global _llm_handler
+    with _llm_lock:
+        if _llm_handler is not None:
+            return
+        try:
+            from llama_index.core.instrumentation import get_dispatcher
+            from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+            from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMChatStartEvent
+            from pydantic import PrivateAttr
+        except ImportError:
+            logger.warning("llama-index instrumentation is not available; LLM calls are not metered")
+            return
+
+        class LLMEventHandler(BaseEventHandler):
+            _started: collections.OrderedDict = PrivateAttr(default_factory=collections.OrderedDict)
+            _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+            @classmethod
+            def class_name(cls):
+                return "AgentMetricsLLMEventHandler"
+
+            def handle(self, event, **kwargs):
+                if isinstance(event, LLMChatStartEvent):
+                    with self._lock:
+                        self._started[event.span_id] = (time.perf_counter(), (event.model_dict or {}).get("model"))
+                        # Calls that never end (cancelled, failed before the end event) are forgotten oldest first
+                        while len(self._started) > MAX_OPEN_LLM_CALLS:
+                            self._started.popitem(last=False)
+                elif isinstance(event, LLMChatEndEvent):
+                    with self._lock:
+                        started, model = self._started.pop(event.span_id, (None, None))
+                    input_tokens, output_tokens = _usage(event.response)
+                    emit("llm", model=model, input_tokens=input_tokens, output_tokens=output_tokens,
+                         duration=time.perf_counter() - started if started is not None else 0.0)
+
+        _llm_handler = LLMEventHandler()
+        get_dispatcher().add_event_handler(_llm_handler)
+
+
+def build_trace(query, events, latency, cached=False, fast_path=None):
+    """
+    Summarize the events of one chat turn as a JSON-serializable trace.
+    """
+    tools = [
+        {"tool": event["tool"], "duration": event["duration"], "ok": event["ok"],
+         "result_bytes": _result_bytes(event.get("result"))}
+        for event in events if event["type"] == "tool_end"
+    ]
+    requests = [
+        {"endpoint": endpoint(event["key"]), "key": event["key"], "status": event["status"],
+         "bytes": event["bytes"], "retries": event["retries"], "duration": event["duration"]}
+        for event in events if event["type"] == "http"
+    ]
+    lookups = [event["cached"] for event in events if event["type"] == "fetch"]
+    llm = [
+        {"model": event.get("model"), "input_tokens": event.get("input_tokens"),
+         "output_tokens": event.get("output_tokens"), "duration": event["duration"]}
+        for event in events if event["type"] == "llm"
+    ]
+    # One memory read per LLM call; the largest is the history size of the turn
+    memory = [
+        {"messages": event["messages"], "tokens": event["tokens"], "compacted": event["compacted"],
+         "dropped": event["dropped"]}
+        for event in events if event["type"] == "memory"
+    ]
+    return {
+        "query": query,
+        "finished_at": time.time(),
+        "latency": latency,
+        "cached": cached,
+        "fast_path": fast_path,
+        "tools": tools,
+        "requests": requests,
+        "llm": llm,
+        "memory": memory,
+        "totals": {
+            "tool_seconds": sum(tool["duration"] for tool in tools),
+            "fmp_seconds": sum(request["duration"] for request in requests),
+            "llm_seconds": sum(call["duration"] for call in llm),
+            "fmp_bytes": sum(request["bytes"] for request in requests),
+            "tool_result_bytes": sum(tool["result_bytes"] for tool in tools),
+            "retries": sum(request["retries"] for request in requests),
+            "cache_hits": sum(lookups),
+            "cache_misses": len(lookups) - sum(lookups),
+            "input_tokens": sum(call["input_tokens"] or 0 for call in llm),
+            "output_tokens": sum(call["output_tokens"] or 0 for call in llm),
+            "history_tokens": max((read["tokens"] for read in memory), default=None),
+            "compacted": sum(read["compacted"] for read in memory),
+        },
+    }
+
+
+class Tracer:
+    """
+    Keeps the most recent turn traces and appends every trace to `path` as a JSON line.
+    """
+
+    def __init__(self, metrics, path=TRACE_PATH, keep=TRACE_KEEP):
+        self.metrics = metrics
+        self.path = path
+        self.traces = collections.deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        source = "cache" if trace["cached"] else "fast_path" if trace.get("fast_path") else "agent"
+        self.metrics.inc("agent_turns_total", source=source)
+        self.metrics.observe("agent_turn_duration_seconds", trace["latency"])
+        with self._lock:
+            self.traces.append(trace)
+            if self.path:
+                try:
+                    with open(self.path, 'a') as f:
+                        f.write(json.dumps(trace, default=str) + '\n')
+                except OSError:
+                    logger.exception("could not write the turn trace to %s", self.path)
+
+    def recent(self, n=None):
+        with self._lock:
+            traces = list(self.traces)
+        return traces[-n:] if n else traces
+
+
+class TracedAgent:
+    """
+    Wraps an agent so every chat/stream_chat turn (and their async variants) is traced; streamed
+    turns are traced once the answer has been fully streamed.
+    """
+
+    def __init__(self, agent, tracer=None):
+        self.agent = agent
+        self.tracer = tracer if tracer is not None else get_tracer()
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def _finish(self, query, response, events, started):
+        cached = getattr(response, "cached", False)
+        fast_path = getattr(response, "fast_path", None)
+        self.tracer.record(build_trace(query, events, time.perf_counter() - started, cached, fast_path))
+
+    def chat(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        with recording() as events:
+            response = self.agent.chat(query, *args, **kwargs)
+        self._finish(query, response, events, started)
+        return response
+
+    async def achat(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        with recording() as events:
+            response = await self.agent.achat(query, *args, **kwargs)
+        self._finish(query, response, events, started)
+        return response
+
+    def stream_chat(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        with recording() as events:
+            response = self.agent.stream_chat(query, *args, **kwargs)
+        return _TracedStream(response, events, lambda: self._finish(query, response, events, started))
+
+    async def astream_chat(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        with recording() as events:
+            response = await self.agent.astream_chat(query, *args, **kwargs)
+        return _TracedStream(response, events, lambda: self._finish(query, response, events, started))
+
+
+_DONE = object()
+
+
+class _TracedStream:
+    """
+    Proxy for a streaming response that keeps recording into `events` while tokens are pulled (the
+    final LLM call completes during streaming) and calls `on_complete` once fully streamed.
+    """
+
+    def __init__(self, response, events, on_complete):
+        self._response = response
+        self._events = events
+        self._on_complete = on_complete
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def __str__(self):
+        return str(self._response)
+
+    @property
+    def response_gen(self):
+        tokens = iter(self._response.response_gen)
+        while True:
+            with recording(self._events):
+                token = next(tokens, _DONE)
+            if token is _DONE:
+                break
+            yield token
+        self._on_complete()
+
+    async def async_response_gen(self):
+        tokens = aiter(self._response.async_response_gen())
+        while True:
+            with recording(self._events):
+                token = await anext(tokens, _DONE)
+            if token is _DONE:
+                break
+            yield token
+        self._on_complete()
+
+
+_metrics = None
+_tracer = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Return the process-wide metrics, subscribed to the tool event bus on first use.
+    """
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+                add_listener(_metrics.on_event)
+    return _metrics
+
+
+def get_tracer():
+    global _tracer
+    if _tracer is None:
+        metrics = get_metrics()
+        with _metrics_lock:
+            if _tracer is None:
+                _tracer = Tracer(metrics)
+    return _tracer
+
+
+def render_prometheus():
+    return get_metrics().render()
+
+
+def recent_traces(n=None):
+    return get_tracer().recent(n)
@@ -0,0 +1,157 @@
+import asyncio
+import unittest
+
+from src.utils import metrics, tool_events
+from src.utils.metrics import Metrics, Tracer, TracedAgent, _usage, build_trace, endpoint
+
+
+def get_stock_price(symbol):
+    tool_events.emit("fetch", key=f"/api/v3/quote/{symbol}", cached=False)
+    tool_events.emit("http", key=f"/api/v3/quote/{symbol}", status=200, bytes=512, retries=1, duration=0.2)
+    return [{"symbol": symbol, "price": 1.0}]
+
+
+def _llm_call(input_tokens, output_tokens):
+    tool_events.emit("llm", model="claude", input_tokens=input_tokens, output_tokens=output_tokens, duration=1.5)
+
+
+class _FakeStream:
+
+    def __init__(self, text):
+        self.text = text
+
+    @property
+    def response_gen(self):
+        yield self.text[:3]
+        yield self.text[3:]
+        _llm_call(300, 20)  # the streamed answer's LLM call ends with the stream
+
+    async def async_response_gen(self):
+        for token in self.response_gen:
+            yield token
+
+    def __str__(self):
+        return self.text
+
+
+class _FakeAgent:
+
+    def __init__(self):
+        self.tool = tool_events.observed(get_stock_price)
+
+    def _plan(self):
+        _llm_call(200, 10)
+        self.tool("AAPL")
+
+    def chat(self, query):
+        self._plan()
+        return "answer"
+
+    def stream_chat(self, query):
+        self._plan()
+        return _FakeStream("answer")
+
+    async def astream_chat(self, query):
+        return self.stream_chat(query)
+
+
+class _Raw:
+
+    def __init__(self, **usage):
+        self.usage = type("Usage", (), usage)()
+
+
+class _Response:
+
+    def __init__(self, raw=None, additional_kwargs=None):
+        self.raw = raw
+        self.additional_kwargs = additional_kwargs or {}
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_endpoint(self):
+        self.assertEqual(endpoint("/api/v3/quote/AAPL,MSFT"), "quote")
+        self.assertEqual(endpoint("/api/v3/income-statement/BRK.B?period=annual"), "income-statement")
+        self.assertEqual(endpoint("/api/v4/governance/executive_compensation?symbol=AAPL"),
+                         "governance/executive_compensation")
+        # Identifiers, lower-case symbols and search terms never become label values
+        self.assertEqual(endpoint("/api/v3/cik/0000320193"), "cik")
+        self.assertEqual(endpoint("/api/v3/cusip/037833100"), "cusip")
+        self.assertEqual(endpoint("/api/v3/cik-search/berkshire"), "cik-search")
+        self.assertEqual(endpoint("/api/v3/profile/aapl"), "profile")
+        self.assertEqual(endpoint("/api/v3/symbol/NASDAQ"), "symbol")
+        self.assertEqual(endpoint("/api/v3/stock/list"), "stock/list")
+
+    def test_llm_handler_forgets_calls_that_never_end(self):
+        from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMChatStartEvent
+        metrics.instrument_llm()
+        handler = type(metrics._llm_handler)()
+        for n in range(metrics.MAX_OPEN_LLM_CALLS + 10):
+            handler.handle(LLMChatStartEvent(messages=[], additional_kwargs={}, model_dict={"model": "m"},
+                                             span_id=f"span-{n}"))
+        self.assertEqual(len(handler._started), metrics.MAX_OPEN_LLM_CALLS)
+        self.assertNotIn("span-0", handler._started)
+        self.assertEqual(len(metrics._llm_handler._started), 0)  # per instance, not shared
+        with tool_events.recording() as events:
+            handler.handle(LLMChatEndEvent(messages=[], response=None, span_id=f"span-{metrics.MAX_OPEN_LLM_CALLS}"))
+        self.assertEqual(events[0]["model"], "m")
+        self.assertEqual(len(handler._started), metrics.MAX_OPEN_LLM_CALLS - 1)
+
+    def test_prometheus_text(self):
+        metrics = Metrics()
+        metrics.on_event({"type": "http", "key": "/api/v3/quote/AAPL", "status": 200, "bytes": 512,
+                          "retries": 2, "duration": 0.3})
+        metrics.on_event({"type": "http", "key": "/api/v3/quote/MSFT", "status": "ConnectTimeout", "bytes": 0,
+                          "retries": 0, "duration": 3.0})
+        metrics.on_event({"type": "llm", "model": "claude", "input_tokens": 120, "output_tokens": 30,
+                          "duration": 2.0})
+        text = metrics.render()
+        self.assertIn("# TYPE fmp_request_duration_seconds histogram", text)
+        self.assertIn('fmp_requests_total{endpoint="quote",status="200"} 1', text)
+        self.assertIn('fmp_requests_total{endpoint="quote",status="ConnectTimeout"} 1', text)
+        self.assertIn('fmp_request_duration_seconds_bucket{endpoint="quote",le="0.5"} 1', text)
+        self.assertIn('fmp_request_duration_seconds_bucket{endpoint="quote",le="+Inf"} 2', text)
+        self.assertIn('fmp_retries_total{endpoint="quote"} 2', text)
+        self.assertIn('llm_tokens_total{direction="input",model="claude"} 120', text)
+
+    def test_usage(self):
+        self.assertEqual(_usage(_Response(_Raw(input_tokens=10, output_tokens=2))), (10, 2))
+        self.assertEqual(_usage(_Response({"usage": {"prompt_tokens": 7, "completion_tokens": 3}})), (7, 3))
+        self.assertEqual(_usage(_Response(None, {"prompt_tokens": 5, "completion_tokens": 1})), (5, 1))
+        self.assertEqual(_usage(_Response()), (None, None))
+
+    def test_traced_turns(self):
+        metrics = Metrics()
+        tool_events.add_listener(metrics.on_event)
+        try:
+            agent = TracedAgent(_FakeAgent(), Tracer(metrics))
+            agent.chat("price of AAPL")
+            self.assertEqual("".join(agent.stream_chat("price of AAPL").response_gen), "answer")
+
+            async def stream():
+                response = await agent.astream_chat("price of AAPL")
+                return [token async for token in response.async_response_gen()]
+
+            self.assertEqual("".join(asyncio.run(stream())), "answer")
+        finally:
+            tool_events.remove_listener(metrics.on_event)
+        chat, streamed, astreamed = agent.tracer.recent()
+        self.assertEqual(chat["totals"]["input_tokens"], 200)
+        self.assertEqual(chat["tools"][0]["tool"], "get_stock_price")
+        self.assertEqual((chat["totals"]["fmp_bytes"], chat["totals"]["retries"]), (512, 1))
+        # The LLM call that ended while the answer streamed belongs to the turn
+        self.assertEqual(streamed["totals"]["input_tokens"], 500)
+        self.assertEqual(astreamed["totals"]["output_tokens"], 30)
+        self.assertEqual(metrics.counter("agent_turns_total", source="agent"), 3)
+        self.assertEqual(metrics.counter("agent_tool_calls_total", tool="get_stock_price", status="ok"), 3)
+        self.assertEqual(metrics.histogram("llm_call_duration_seconds", model="claude").count, 5)
+
+    def test_build_trace_of_cached_turn(self):
+        trace = build_trace("price of AAPL", [], 0.01, cached=True)
+        self.assertTrue(trace["cached"])
+        self.assertEqual(trace["totals"]["cache_hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
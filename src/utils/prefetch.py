@@ -0,0 +1,254 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .answer_cache import normalize_query
+from .http_client import fetch_data
+from .quote_batcher import QUOTE_URL, fetch_quotes
+from .rate_limiter import background, remaining_budget
+from .response_cache import cache_key, get_cache
+from .symbol_index import loaded_index
+from .tool_events import add_listener
+
+# Speculative prefetch. When a query names companies, the endpoints the agent
+# nearly always calls next (quote, profile, last income statement) are fetched
+# in the background while the LLM plans, so the tool calls find them in the
+# response cache, or join the fetch still in flight. Prefetches queue behind the
+# tools' own requests in the rate limiter and stop when the daily budget runs low.
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+PREFETCH_DISABLED = os.environ.get('AGENT_PREFETCH_DISABLED', '').lower() in ('1', 'true', 'yes')
+MAX_SYMBOLS = int(os.environ.get('AGENT_PREFETCH_MAX_SYMBOLS', 5))
+WORKERS = int(os.environ.get('AGENT_PREFETCH_WORKERS', 8))
+# No prefetching once less than this fraction of FMP_DAILY_BUDGET is left
+MIN_BUDGET = float(os.environ.get('AGENT_PREFETCH_MIN_BUDGET', 0.2))
+
+# Per-symbol endpoints besides the quote (quotes for all symbols go out as one batched request)
+BUNDLE = (
+    'https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={api_key}',
+    'https://financialmodelingprep.com/api/v3/income-statement/{symbol}?period=annual&apikey={api_key}',
+)
+
+logger = logging.getLogger(__name__)
+
+# Set in prefetch workers so their own fetch events are not mistaken for tool calls
+_prefetching = contextvars.ContextVar('prefetching', default=False)
+
+
+class PrefetchTurn:
+    """
+    The keys prefetched for one query; finish() counts the ones no tool asked for as wasted.
+    """
+
+    def __init__(self, prefetcher, symbols, keys):
+        self.prefetcher = prefetcher
+        self.symbols = symbols
+        self.keys = keys
+        self.futures = []
+
+    def wait(self, timeout=None):
+        for future in self.futures:
+            future.exception(timeout)
+
+    def finish(self):
+        self.prefetcher._finish(self.keys)
+
+
+class Prefetcher:
+    """
+    Warms the response cache for the companies named in a query and tracks how many of those
+    fetches a tool call later used (hits) or nobody used (wasted).
+    """
+
+    def __init__(self, bundle=BUNDLE, quote_url=QUOTE_URL, max_symbols=MAX_SYMBOLS, workers=WORKERS, index=None,
+                 fetch=fetch_data, fetch_quotes=fetch_quotes, min_budget=MIN_BUDGET, budget=remaining_budget):
+        self.bundle = bundle
+        self.quote_url = quote_url
+        self.fetch = fetch
+        self.fetch_quotes = fetch_quotes
+        self.max_symbols = max_symbols
+        self.index = index
+        self.min_budget = min_budget
+        self.budget = budget
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending = {}  # cache key -> number of turns waiting for a tool to use it
+        self.turns = 0
+        self.prefetched = 0
+        self.skipped = 0
+        self.skipped_budget = 0
+        self.skipped_index = 0
+        self.hits = 0
+        self.wasted = 0
+        add_listener(self._on_event)
+
+    def _on_event(self, event):
+        if event["type"] != "fetch" or _prefetching.get():
+            return
+        with self._lock:
+            if self._pending.pop(event["key"], None) is not None:
+                self.hits += 1
+
+    def _urls(self, symbols):
+        # (cache key, url) per bundle endpoint and (symbol, cache key) per quote; fresh responses are skipped
+        cache = get_cache()
+        plan, quotes = [], []
+        for symbol in symbols:
+            quote_key = cache_key(self.quote_url.format(symbols=symbol, api_key=API_KEY))
+            if cache is not None and cache.expires_at(quote_key):
+                self.skipped += 1
+            else:
+                quotes.append((symbol, quote_key))
+            for template in self.bundle:
+                url = template.format(symbol=symbol, api_key=API_KEY)
+                key = cache_key(url)
+                if cache is not None and cache.expires_at(key):
+                    self.skipped += 1
+                else:
+                    plan.append((key, url))
+        return plan, quotes
+
+    def _budget_low(self):
+        budget = self.budget()
+        return budget["daily_budget"] is not None and budget["daily_remaining"] < budget["daily_budget"] * self.min_budget
+
+    def prefetch(self, query):
+        """
+        Start fetching the bundle for every company named in `query`; returns a PrefetchTurn
+        (with no keys when the query names no company, the request budget is low or the symbol
+        index is still loading).
+        """
+        return self._start(query)
+
+    async def aprefetch(self, query):
+        """
+        Async variant of prefetch.
+        """
+        return self._start(query)
+
+    def _start(self, query):
+        # Prefetching only pays off ahead of the agent: never wait for the symbol lists, skip the
+        # turn while the process-wide index loads in the background
+        index = self.index if self.index is not None else loaded_index()
+        if index is None:
+            with self._lock:
+                self.turns += 1
+                self.skipped_index += 1
+            return PrefetchTurn(self, [], [])
+        _, symbols = normalize_query(query, index)
+        symbols = list(dict.fromkeys(symbols))[:self.max_symbols]
+        if symbols and self._budget_low():
+            with self._lock:
+                self.turns += 1
+                self.skipped_budget += 1
+            return PrefetchTurn(self, symbols, [])
+        with self._lock:
+            self.turns += 1
+            plan, quotes = self._urls(symbols)
+            keys = [key for key, _ in plan] + [key for _, key in quotes]
+            for key in keys:
+                self._pending[key] = self._pending.get(key, 0) + 1
+            self.prefetched += len(keys)
+        turn = PrefetchTurn(self, symbols, keys)
+        if quotes:
+            turn.futures.append(self._pool.submit(_run, self.fetch_quotes, [symbol for symbol, _ in quotes],
+                                                  self.quote_url))
+        for _, url in plan:
+            turn.futures.append(self._pool.submit(_run, self.fetch, url))
+        if keys:
+            logger.info("prefetching %d responses for %s", len(keys), ", ".join(symbols))
+        return turn
+
+    def _finish(self, keys):
+        with self._lock:
+            for key in keys:
+                if key in self._pending:
+                    self._pending[key] -= 1
+                    if not self._pending[key]:
+                        del self._pending[key]
+                    self.wasted += 1
+
+    def stats(self):
+        with self._lock:
+            used = self.hits + self.wasted
+            return {
+                "turns": self.turns,
+                "prefetched": self.prefetched,
+                "skipped_fresh": self.skipped,
+                "skipped_budget": self.skipped_budget,
+                "skipped_index": self.skipped_index,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "hit_rate": self.hits / used if used else 0.0,
+            }
+
+
+def _run(fn, *args):
+    _prefetching.set(True)  # marks the worker thread, which only ever runs prefetches
+    try:
+        with background():
+            return fn(*args)
+    except Exception:
+        logger.exception("prefetch failed")
+
+
+class PrefetchingAgent:
+    """
+    Wraps an agent so every turn starts prefetching the companies it names before the LLM is called.
+    """
+
+    def __init__(self, agent, prefetcher=None):
+        self.agent = agent
+        self.prefetcher = prefetcher if prefetcher is not None else get_prefetcher()
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+    def _call(self, method, query, *args, **kwargs):
+        turn = self.prefetcher.prefetch(query)
+        try:
+            return getattr(self.agent, method)(query, *args, **kwargs)
+        finally:
+            # Tools run before the (streamed) final answer is returned, so the turn's fetches are done here
+            turn.finish()
+
+    async def _acall(self, method, query, *args, **kwargs):
+        turn = await self.prefetcher.aprefetch(query)
+        try:
+            return await getattr(self.agent, method)(query, *args, **kwargs)
+        finally:
+            turn.finish()
+
+    def chat(self, query, *args, **kwargs):
+        return self._call("chat", query, *args, **kwargs)
+
+    def stream_chat(self, query, *args, **kwargs):
+        return self._call("stream_chat", query, *args, **kwargs)
+
+    async def achat(self, query, *args, **kwargs):
+        return await self._acall("achat", query, *args, **kwargs)
+
+    async def astream_chat(self, query, *args, **kwargs):
+        return await self._acall("astream_chat", query, *args, **kwargs)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """
+    Return the process-wide prefetcher.
+    """
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher()
+    return _prefetcher
+
+
+def prefetch_stats():
+    return get_prefetcher().stats()
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from src.utils import symbol_index, tool_events
+from src.utils.prefetch import Prefetcher, PrefetchingAgent
+from src.utils.rate_limiter import PRIORITY_BULK, priority_for
+from src.utils.response_cache import cache_key
+from src.utils.symbol_index import SymbolIndex
+
+STOCKS = [
+    {"symbol": "AAPL", "name": "Apple Inc.", "exchangeShortName": "NASDAQ"},
+    {"symbol": "MSFT", "name": "Microsoft Corporation", "exchangeShortName": "NASDAQ"},
+]
+PROFILE = 'https://example.test/profile/{symbol}?apikey={api_key}'
+INCOME = 'https://example.test/income-statement/{symbol}?apikey={api_key}'
+QUOTE = 'https://example.test/quote/{symbols}?apikey={api_key}'
+
+
+class _Upstream:
+
+    def __init__(self):
+        self.urls = []
+        self.quote_batches = []
+        self.priorities = set()
+        self.lock = threading.Lock()
+
+    def fetch(self, url):
+        with self.lock:
+            self.urls.append(url)
+            self.priorities.add(priority_for(cache_key(url)))
+        tool_events.emit("fetch", key=cache_key(url), cached=False)
+        return [{}]
+
+    def fetch_quotes(self, symbols, url_template):
+        with self.lock:
+            self.quote_batches.append(list(symbols))
+            self.priorities.add(priority_for(cache_key(url_template.format(symbols=symbols[0], api_key=None))))
+        return {symbol: {"symbol": symbol} for symbol in symbols}
+
+
+class _FakeAgent:
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+
+    def chat(self, query):
+        # The agent only looks at Apple's profile and quote
+        self.upstream.fetch(PROFILE.format(symbol="AAPL", api_key=None))
+        tool_events.emit("fetch", key=cache_key(QUOTE.format(symbols="AAPL", api_key=None)), cached=True)
+        return "answer"
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SymbolIndex()
+        self.index.update(STOCKS)
+        self.upstream = _Upstream()
+        self.prefetcher = Prefetcher(bundle=(PROFILE, INCOME), quote_url=QUOTE, index=self.index,
+                                     fetch=self.upstream.fetch, fetch_quotes=self.upstream.fetch_quotes)
+
+    def tearDown(self):
+        tool_events.remove_listener(self.prefetcher._on_event)
+
+    def test_prefetches_bundle_for_named_companies(self):
+        turn = self.prefetcher.prefetch("Compare Apple and MSFT revenue")
+        turn.wait(5)
+        self.assertEqual(turn.symbols, ["AAPL", "MSFT"])
+        self.assertEqual(self.upstream.quote_batches, [["AAPL", "MSFT"]])  # one batched quote request
+        self.assertEqual(len(self.upstream.urls), 4)
+        # Queued behind the tools' own requests, quotes included
+        self.assertEqual(self.upstream.priorities, {PRIORITY_BULK})
+        # The prefetch's own fetches are not counted as hits
+        self.assertEqual(self.prefetcher.stats()["hits"], 0)
+        self.assertEqual(self.prefetcher.prefetch("what is the market doing").keys, [])
+
+    def test_tracks_hits_and_waste(self):
+        agent = PrefetchingAgent(_FakeAgent(self.upstream), self.prefetcher)
+        self.assertEqual(agent.chat("How is Apple doing?"), "answer")
+        stats = self.prefetcher.stats()
+        self.assertEqual((stats["prefetched"], stats["hits"], stats["wasted"]), (3, 2, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+    def test_skips_when_the_budget_is_low(self):
+        self.prefetcher.budget = lambda: {"daily_budget": 1000, "daily_remaining": 150}
+        turn = self.prefetcher.prefetch("How is Apple doing?")
+        self.assertEqual((turn.symbols, turn.keys), (["AAPL"], []))
+        self.assertEqual(self.upstream.urls, [])
+        self.assertEqual(self.prefetcher.stats()["skipped_budget"], 1)
+        self.prefetcher.budget = lambda: {"daily_budget": 1000, "daily_remaining": 250}
+        self.assertEqual(len(self.prefetcher.prefetch("How is Apple doing?").keys), 3)
+
+    def test_skips_turns_while_the_symbol_lists_load(self):
+        loaded = threading.Event()
+
+        def fetch_records(url, fields=None):
+            loaded.wait(5)
+            return STOCKS if "/stock/list" in url else []
+
+        prefetcher = Prefetcher(bundle=(PROFILE, INCOME), quote_url=QUOTE, fetch=self.upstream.fetch,
+                                fetch_quotes=self.upstream.fetch_quotes)
+        try:
+            with mock.patch.object(symbol_index, "_index", None), \
+                    mock.patch.object(symbol_index, "fetch_records", fetch_records):
+                turn = asyncio.run(prefetcher.aprefetch("How is Microsoft doing?"))
+                self.assertEqual((turn.symbols, turn.keys), ([], []))
+                self.assertEqual(prefetcher.stats()["skipped_index"], 1)
+                loaded.set()
+                symbol_index._warmer.join(5)
+                turn = asyncio.run(prefetcher.aprefetch("How is Microsoft doing?"))
+                turn.wait()
+            self.assertEqual(turn.symbols, ["MSFT"])
+        finally:
+            tool_events.remove_listener(prefetcher._on_event)
+
+
+if __name__ == "__main__":
+    unittest.main()
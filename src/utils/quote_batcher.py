@@ -0,0 +1,238 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .http_client import afetch_data, fetch_data
+from .response_cache import cache_key, get_cache
+from .single_flight import on_event_loop
+from .tool_events import emit
+
+# Multi-symbol quotes. FMP's /quote endpoint accepts a comma-separated symbol
+# list, so several quotes cost one request. QuoteBatcher additionally collects
+# single-symbol lookups arriving within a few milliseconds of each other (e.g.
+# parallel tool calls) into one upstream call.
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+QUOTE_URL = 'https://financialmodelingprep.com/api/v3/quote/{symbols}?apikey={api_key}'
+MAX_URL_LENGTH = int(os.environ.get('FMP_QUOTE_MAX_URL_LENGTH', 2000))
+BATCH_WINDOW = float(os.environ.get('FMP_QUOTE_BATCH_WINDOW_MS', 5)) / 1000
+
+
+def normalize_symbols(symbols):
+    """
+    Accept a comma/space separated string or an iterable of tickers; return unique upper-case symbols in order.
+    """
+    if isinstance(symbols, str):
+        symbols = symbols.replace(',', ' ').split()
+    seen = {}
+    for symbol in symbols or ():
+        symbol = str(symbol).strip().upper()
+        if symbol:
+            seen.setdefault(symbol, None)
+    return list(seen)
+
+
+def chunk_symbols(symbols, url_template=QUOTE_URL, max_length=MAX_URL_LENGTH):
+    """
+    Split `symbols` into comma-joined groups whose request URL stays within `max_length` characters.
+    """
+    overhead = len(url_template.format(symbols='', api_key=API_KEY))
+    chunks, current, length = [], [], overhead
+    for symbol in symbols:
+        added = len(symbol) + (1 if current else 0)
+        if current and length + added > max_length:
+            chunks.append(current)
+            current, length = [], overhead
+            added = len(symbol)
+        current.append(symbol)
+        length += added
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _single_key(symbol, url_template):
+    return cache_key(url_template.format(symbols=symbol, api_key=API_KEY))
+
+
+def _cached_quotes(symbols, url_template):
+    cache = get_cache()
+    keys = {symbol: _single_key(symbol, url_template) for symbol in symbols}
+    return _found(keys, {symbol: cache.get(key) for symbol, key in keys.items()} if cache is not None else {})
+
+
+async def _acached_quotes(symbols, url_template):
+    cache = get_cache()
+    keys = {symbol: _single_key(symbol, url_template) for symbol in symbols}
+    return _found(keys, {symbol: await cache.aget(key) for symbol, key in keys.items()} if cache is not None else {})
+
+
+def _found(keys, cached):
+    found = {}
+    for symbol, data in cached.items():
+        if isinstance(data, list) and data:
+            found[symbol] = data[0]
+            emit("fetch", key=keys[symbol], cached=True)
+    return found
+
+
+def _merge(results, chunk, data, url_template):
+    if isinstance(data, dict) and "error" in data:
+        for symbol in chunk:
+            results[symbol] = data
+        return
+    cache = get_cache()
+    for quote in data if isinstance(data, list) else ():
+        symbol = str(quote.get('symbol', '')).upper()
+        if symbol in chunk:
+            results[symbol] = quote
+            if cache is not None and len(chunk) > 1:
+                # Later single-symbol lookups are served from the batch
+                cache.set(_single_key(symbol, url_template), [quote])
+    for symbol in chunk:
+        results.setdefault(symbol, {"error": f"No quote returned for symbol: {symbol}"})
+
+
+def fetch_quotes(symbols, url_template=QUOTE_URL):
+    """
+    Return {symbol: quote or error dict} for `symbols`, using as few upstream requests as the URL length allows.
+    """
+    symbols = normalize_symbols(symbols)
+    results = _cached_quotes(symbols, url_template)
+    for chunk in chunk_symbols([symbol for symbol in symbols if symbol not in results], url_template):
+        data = fetch_data(url_template.format(symbols=','.join(chunk), api_key=API_KEY))
+        _merge(results, chunk, data, url_template)
+    return {symbol: results[symbol] for symbol in symbols}
+
+
+async def afetch_quotes(symbols, url_template=QUOTE_URL):
+    """
+    Async variant of fetch_quotes; the chunks are fetched concurrently.
+    """
+    symbols = normalize_symbols(symbols)
+    results = await _acached_quotes(symbols, url_template)
+    chunks = chunk_symbols([symbol for symbol in symbols if symbol not in results], url_template)
+    responses = await asyncio.gather(*(
+        afetch_data(url_template.format(symbols=','.join(chunk), api_key=API_KEY)) for chunk in chunks
+    ))
+    for chunk, data in zip(chunks, responses):
+        _merge(results, chunk, data, url_template)
+    return {symbol: results[symbol] for symbol in symbols}
+
+
+class QuoteBatcher:
+    """
+    Micro-batcher for single-symbol quote lookups.
+
+    The first caller in a window (the leader) waits `window` seconds, then fetches every symbol
+    requested meanwhile in one call and hands each caller its own quote. Pending lookups are
+    tracked with thread-safe futures, so threaded and asyncio callers share batches.
+    """
+
+    def __init__(self, fetch=fetch_quotes, afetch=afetch_quotes, window=BATCH_WINDOW):
+        self._fetch = fetch
+        self._afetch = afetch
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}  # symbol -> concurrent.futures.Future
+        self._collecting = False
+        self.requests = 0
+        self.batches = 0
+        self.symbols_fetched = 0
+        self.coalesced = 0
+
+    def _join(self, symbol):
+        with self._lock:
+            self.requests += 1
+            future = self._pending.get(symbol)
+            if future is None:
+                future = self._pending[symbol] = Future()
+            leader = not self._collecting
+            self._collecting = True
+            self.coalesced += not leader
+            return future, leader
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._collecting = False
+            self.batches += 1
+            self.symbols_fetched += len(batch)
+            return batch
+
+    @staticmethod
+    def _resolve(batch, results):
+        for symbol, future in batch.items():
+            future.set_result(results.get(symbol) or {"error": f"No quote returned for symbol: {symbol}"})
+
+    @staticmethod
+    def _fail(batch, exc):
+        for future in batch.values():
+            if not future.done():
+                future.set_result({"error": f"Failed to fetch data. {exc.__class__.__name__}"})
+
+    def get(self, symbol):
+        """
+        Return the quote (or error dict) for `symbol`, batched with concurrent lookups.
+        """
+        symbol = str(symbol).strip().upper()
+        future, leader = self._join(symbol)
+        if leader:
+            batch = None
+            try:
+                time.sleep(self.window)
+                batch = self._take()
+                results = self._fetch(list(batch))
+            except BaseException as exc:
+                self._fail(batch if batch is not None else self._take(), exc)
+                raise
+            self._resolve(batch, results)
+        elif on_event_loop():
+            # The leader may be an aget() waiting on this very loop: fetch our own symbol rather than block it
+            return self._fetch([symbol]).get(symbol) or {"error": f"No quote returned for symbol: {symbol}"}
+        return future.result()
+
+    async def aget(self, symbol):
+        """
+        Async variant of get.
+        """
+        symbol = str(symbol).strip().upper()
+        future, leader = self._join(symbol)
+        if leader:
+            batch = None
+            try:
+                await asyncio.sleep(self.window)
+                batch = self._take()
+                results = await self._afetch(list(batch))
+            except BaseException as exc:
+                self._fail(batch if batch is not None else self._take(), exc)
+                raise
+            self._resolve(batch, results)
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "symbols_fetched": self.symbols_fetched,
+                "coalesced": self.coalesced,
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """
+    Return the process-wide quote batcher.
+    """
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = QuoteBatcher()
+    return _batcher
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import unittest
+
+from src.utils.quote_batcher import QuoteBatcher, chunk_symbols, normalize_symbols
+
+
+class _FakeQuotes:
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, symbols):
+        self.calls.append(sorted(symbols))
+        return {symbol: {"symbol": symbol, "price": len(symbol)} for symbol in symbols if symbol != "BAD"}
+
+    async def afetch(self, symbols):
+        return self.fetch(symbols)
+
+
+class TestQuoteBatcher(unittest.TestCase):
+
+    def test_normalize_and_chunk(self):
+        self.assertEqual(normalize_symbols("aapl, msft AAPL"), ["AAPL", "MSFT"])
+        symbols = [f"S{i:04d}" for i in range(1000)]
+        template = "https://example.com/api/v3/quote/{symbols}?apikey={api_key}"
+        chunks = chunk_symbols(symbols, template, max_length=200)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([symbol for chunk in chunks for symbol in chunk], symbols)
+        for chunk in chunks:
+            self.assertLessEqual(len(template.format(symbols=','.join(chunk), api_key=None)), 200)
+
+    def test_concurrent_threads_share_one_call(self):
+        fake = _FakeQuotes()
+        batcher = QuoteBatcher(fake.fetch, fake.afetch, window=0.05)
+        results = {}
+        barrier = threading.Barrier(5)
+
+        def lookup(symbol):
+            barrier.wait()
+            results[symbol] = batcher.get(symbol)
+
+        threads = [threading.Thread(target=lookup, args=(s,)) for s in ("aapl", "MSFT", "GOOGL", "AMZN", "BAD")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fake.calls, [["AAPL", "AMZN", "BAD", "GOOGL", "MSFT"]])
+        self.assertEqual(results["aapl"], {"symbol": "AAPL", "price": 4})
+        self.assertIn("error", results["BAD"])
+        self.assertEqual(batcher.stats()["coalesced"], 4)
+
+    def test_async_callers_share_one_call(self):
+        fake = _FakeQuotes()
+        batcher = QuoteBatcher(fake.fetch, fake.afetch, window=0.01)
+
+        async def main():
+            return await asyncio.gather(*(batcher.aget(symbol) for symbol in ("AAPL", "MSFT", "AAPL")))
+
+        first, second, third = asyncio.run(main())
+        self.assertEqual(fake.calls, [["AAPL", "MSFT"]])
+        self.assertEqual(first, third)
+        self.assertEqual(second["symbol"], "MSFT")
+
+    def test_sync_lookup_on_the_leaders_loop_does_not_deadlock(self):
+        fake = _FakeQuotes()
+        batcher = QuoteBatcher(fake.fetch, fake.afetch, window=0.05)
+
+        async def main():
+            leader = asyncio.create_task(batcher.aget("AAPL"))
+            await asyncio.sleep(0)
+            return batcher.get("MSFT"), await leader
+
+        msft, aapl = asyncio.run(asyncio.wait_for(main(), 5))
+        self.assertEqual((msft["symbol"], aapl["symbol"]), ("MSFT", "AAPL"))
+        self.assertEqual(fake.calls[0], ["MSFT"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+# Client-side token bucket shared by every FMP call, so we queue politely
+# instead of burning quota (and LLM retries) on 429 responses.
+
+RATE_PER_SECOND = float(os.environ.get('FMP_RATE_PER_SECOND', 5))
+RATE_BURST = float(os.environ.get('FMP_RATE_BURST', RATE_PER_SECOND))
+DAILY_BUDGET = int(os.environ.get('FMP_DAILY_BUDGET', 0))  # 0 means unlimited
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BULK = 2
+
+_interactive_pattern = re.compile(r'^/api/v3/(quote-order|quote)/')
+_bulk_pattern = re.compile(
+    r'^/api/v3/(stock/list|etf/list|available-traded/list|financial-statement-symbol-lists|cik_list|symbol/)'
+    r'|^/api/v4/(symbol_change|commitment_of_traders_report/list)'
+)
+
+
+# Lowest priority allowed in the current context, for background work such as speculative prefetches
+_priority_floor = contextvars.ContextVar('rate_limiter_priority_floor', default=PRIORITY_INTERACTIVE)
+
+
+def priority_for(key):
+    """
+    Map a cache key (see response_cache.cache_key) to a queue priority; lower runs first.
+    """
+    if _interactive_pattern.search(key):
+        priority = PRIORITY_INTERACTIVE
+    elif _bulk_pattern.search(key):
+        priority = PRIORITY_BULK
+    else:
+        priority = PRIORITY_DEFAULT
+    return max(priority, _priority_floor.get())
+
+
+@contextlib.contextmanager
+def background(priority=PRIORITY_BULK):
+    """
+    Queue the requests made in this context (thread or asyncio task) at `priority` or lower, behind
+    the tools' own requests.
+    """
+    token = _priority_floor.set(priority)
+    try:
+        yield
+    finally:
+        _priority_floor.reset(token)
+
+
+def _utc_day():
+    return datetime.now(timezone.utc).date()
+
+
+class RateLimiter:
+    """
+    Token bucket with a per-day budget. Callers wait in a priority queue until a
+    token is available; acquire() only fails once the daily budget is spent.
+    """
+
+    def __init__(self, rate=RATE_PER_SECOND, burst=RATE_BURST, daily_budget=DAILY_BUDGET):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.daily_budget = daily_budget or None
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._waiters = []  # heap of (priority, seq) tickets
+        self._seq = itertools.count()
+        self._day = _utc_day()
+        self._used_today = 0
+        self.waited = 0
+        self.rejected = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        today = _utc_day()
+        if today != self._day:
+            self._day = today
+            self._used_today = 0
+
+    def _budget_exhausted(self):
+        return self.daily_budget is not None and self._used_today >= self.daily_budget
+
+    def _try_take(self, ticket):
+        """
+        Return True if `ticket` got a token, False if the budget is spent, or the seconds to wait.
+        Must be called with the condition held.
+        """
+        self._refill()
+        if self._budget_exhausted():
+            return False
+        if self._waiters[0] != ticket:
+            return 1.0 / self.rate
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self._used_today += 1
+            return True
+        return (1 - self._tokens) / self.rate
+
+    def _leave(self, ticket):
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def acquire(self, priority=PRIORITY_DEFAULT):
+        """
+        Block until a request may be sent. Returns False if the daily budget is exhausted.
+        """
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                first = True
+                while True:
+                    outcome = self._try_take(ticket)
+                    if outcome is True or outcome is False:
+                        if outcome is False:
+                            self.rejected += 1
+                        return outcome
+                    if first:
+                        self.waited += 1
+                        first = False
+                    self._cond.wait(outcome)
+            finally:
+                self._leave(ticket)
+
+    async def aacquire(self, priority=PRIORITY_DEFAULT):
+        """
+        Async variant of acquire; waits without blocking the event loop.
+        """
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+        try:
+            first = True
+            while True:
+                with self._cond:
+                    outcome = self._try_take(ticket)
+                    if outcome is False:
+                        self.rejected += 1
+                if outcome is True or outcome is False:
+                    return outcome
+                if first:
+                    self.waited += 1
+                    first = False
+                await asyncio.sleep(outcome)
+        finally:
+            with self._cond:
+                self._leave(ticket)
+
+    def remaining_budget(self):
+        """
+        Report how much request budget is left right now and for the rest of the UTC day.
+        """
+        with self._cond:
+            self._refill()
+            return {
+                "tokens_available": round(self._tokens, 3),
+                "rate_per_second": self.rate,
+                "used_today": self._used_today,
+                "daily_budget": self.daily_budget,
+                "daily_remaining": None if self.daily_budget is None else self.daily_budget - self._used_today,
+                "queued": len(self._waiters),
+                "waited": self.waited,
+                "rejected": self.rejected,
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """
+    Return the process-wide limiter shared by every tool.
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
+
+
+def configure(rate=None, burst=None, daily_budget=None):
+    """
+    Replace the shared limiter with one using the given settings.
+    """
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(
+            rate if rate is not None else RATE_PER_SECOND,
+            burst if burst is not None else (rate if rate is not None else RATE_BURST),
+            daily_budget if daily_budget is not None else DAILY_BUDGET,
+        )
+
+
+def remaining_budget():
+    return get_limiter().remaining_budget()
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.utils.rate_limiter import (
+    PRIORITY_BULK, PRIORITY_DEFAULT, PRIORITY_INTERACTIVE, RateLimiter, background, priority_for,
+)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_priority_for(self):
+        self.assertEqual(priority_for("/api/v3/quote-order/AAPL"), PRIORITY_INTERACTIVE)
+        self.assertEqual(priority_for("/api/v3/stock/list"), PRIORITY_BULK)
+        self.assertEqual(priority_for("/api/v3/profile/AAPL"), PRIORITY_DEFAULT)
+        with background():
+            self.assertEqual(priority_for("/api/v3/quote/AAPL"), PRIORITY_BULK)
+        self.assertEqual(priority_for("/api/v3/quote/AAPL"), PRIORITY_INTERACTIVE)
+
+    def test_waits_instead_of_failing(self):
+        limiter = RateLimiter(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(3):
+            self.assertTrue(limiter.acquire())
+        self.assertGreaterEqual(time.monotonic() - start, 0.035)
+        self.assertEqual(limiter.remaining_budget()["used_today"], 3)
+
+    def test_interactive_requests_jump_the_queue(self):
+        limiter = RateLimiter(rate=20, burst=1)
+        limiter.acquire()  # drain the bucket so the next callers queue
+        order = []
+
+        def call(priority, label):
+            limiter.acquire(priority)
+            order.append(label)
+
+        bulk = threading.Thread(target=call, args=(PRIORITY_BULK, "bulk"))
+        bulk.start()
+        time.sleep(0.005)
+        quote = threading.Thread(target=call, args=(PRIORITY_INTERACTIVE, "quote"))
+        quote.start()
+        bulk.join()
+        quote.join()
+        self.assertEqual(order, ["quote", "bulk"])
+
+    def test_daily_budget(self):
+        limiter = RateLimiter(rate=1000, burst=10, daily_budget=2)
+        self.assertTrue(limiter.acquire())
+        self.assertTrue(asyncio.run(limiter.aacquire()))
+        self.assertFalse(limiter.acquire())
+        budget = limiter.remaining_budget()
+        self.assertEqual((budget["daily_remaining"], budget["rejected"]), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+import asyncio
+import atexit
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Response cache for Financial Modeling Prep calls. Entries are keyed by the
+# endpoint path plus the sorted query parameters (API key stripped) and expire
+# according to how fast the underlying data changes.
+
+CACHE_SIZE = int(os.environ.get('FMP_CACHE_SIZE', 512))
+CACHE_PATH = os.environ.get('FMP_CACHE_PATH')  # SQLite file; unset keeps the cache in memory only
+DISK_ENTRIES = int(os.environ.get('FMP_CACHE_DISK_ENTRIES', 20000))  # rows kept in the SQLite file
+DISK_BYTES = int(os.environ.get('FMP_CACHE_DISK_BYTES', 512 * 1024 * 1024))  # total size of the stored bodies
+PRUNE_EVERY = 200  # writes between two prunes of the SQLite file
+CACHE_DISABLED = os.environ.get('FMP_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# First matching pattern wins; patterns are matched against the cache key.
+TTL_RULES = [
+    (r'^/api/v3/(quote-order|quote)/', 15),
+    (r'^/api/v3/market-capitalization/', MINUTE),
+    (r'^/api/v3/stock-screener', 15 * MINUTE),
+    (r'^/api/v3/(historical-market-capitalization|historical-price-full)/', HOUR),
+    (r'^/api/v3/(profile|grade)/', 6 * HOUR),
+    (r'^/api/v3/key-executives/', 12 * HOUR),
+    (r'^/api/v4/(company-core-information|employee_count|governance/executive_compensation)', 12 * HOUR),
+    (r'^/api/v3/(income-statement|balance-sheet-statement|cash-flow-statement|key-metrics)/.*period=quarter', DAY),
+    (r'^/api/v3/(income-statement|balance-sheet-statement|cash-flow-statement|key-metrics)/', 7 * DAY),
+    (r'^/api/v4/(company-notes|historical/employee_count|executive-compensation-benchmark)', DAY),
+    (r'^/api/v3/(search|search-ticker|search-name|cik-search|cik|cusip)\b', DAY),
+    (r'^/api/v4/search/isin', DAY),
+    (r'^/api/v3/(stock/list|etf/list|available-traded/list|financial-statement-symbol-lists|cik_list)', DAY),
+    (r'^/api/v3/symbol/', DAY),
+    (r'^/api/v4/(symbol_change|commitment_of_traders_report/list)', DAY),
+]
+DEFAULT_TTL = 5 * MINUTE
+
+_compiled_rules = [(re.compile(pattern), ttl) for pattern, ttl in TTL_RULES]
+
+
+def cache_key(url):
+    """
+    Normalize `url` to `path?sorted-params`, dropping the API key and empty parameters.
+    """
+    parts = urlsplit(url)
+    params = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name != 'apikey' and value != ''
+    )
+    return f"{parts.path}?{urlencode(params)}" if params else parts.path
+
+
+def ttl_for(key):
+    """
+    Return the time-to-live in seconds for a cache key (see TTL_RULES).
+    """
+    for pattern, ttl in _compiled_rules:
+        if pattern.search(key):
+            return ttl
+    return DEFAULT_TTL
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of decoded JSON responses with per-entry expiry and
+    an optional SQLite backing store so a restarted process starts warm. The store is
+    written by a background thread (callers, the event loop included, never serialize
+    or commit) and pruned to `disk_entries` rows and `disk_bytes` of bodies as it grows.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE, path=None, disk_entries=DISK_ENTRIES, disk_bytes=DISK_BYTES):
+        self.max_entries = max_entries
+        self.disk_entries = disk_entries
+        self.disk_bytes = disk_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes = queue.Queue()  # (key, expires_at, value), or None to clear the store
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+            )
+            self._prune()
+            threading.Thread(target=self._writer, name="response-cache-writer", daemon=True).start()
+
+    def get(self, key):
+        """
+        Return the cached value for `key`, or None on a miss. Values are shared; treat them as read-only.
+        """
+        now = time.time()
+        found, value = self._get_memory(key, now)
+        if found or self._db is None:
+            return value
+        return self._get_disk(key, now)
+
+    async def aget(self, key):
+        """
+        Async variant of get: a lookup that reaches the SQLite store runs on a worker thread.
+        """
+        now = time.time()
+        found, value = self._get_memory(key, now)
+        if found or self._db is None:
+            return value
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def _get_memory(self, key, now):
+        # (True, value) for a live in-memory entry; a miss is only counted here when there is no store to try
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+            if self._db is None:
+                self.misses += 1
+            return False, None
+
+    def _get_disk(self, key, now):
+        # Reads and decodes outside _lock, so in-memory hits never wait on SQLite
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, value FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        value = json.loads(row[1]) if row is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                # set() while we were reading: the newer value wins
+                self.hits += 1
+                return entry[1]
+            if row is None:
+                self.misses += 1
+                return None
+            self._store(key, row[0], value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = ttl_for(key)
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._store(key, expires_at, value)
+        if self._db is not None:
+            self._writes.put((key, expires_at, value))
+
+    def expires_at(self, key):
+        """
+        Return the expiry timestamp of a live in-memory entry, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None and entry[0] > time.time() else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            self._writes.put(None)
+
+    def flush(self):
+        """
+        Wait until every write so far has reached the SQLite store.
+        """
+        if self._db is not None:
+            self._writes.join()
+
+    def _writer(self):
+        # Batches whatever is queued into one transaction; prunes every PRUNE_EVERY writes
+        written = 0
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                rows = []
+                for item in batch:
+                    if item is None:
+                        rows.append(None)
+                    else:
+                        key, expires_at, value = item
+                        rows.append((key, expires_at, json.dumps(value)))
+                with self._db_lock:
+                    for row in rows:
+                        if row is None:
+                            self._db.execute("DELETE FROM responses")
+                        else:
+                            self._db.execute(
+                                "INSERT OR REPLACE INTO responses (key, expires_at, value) VALUES (?, ?, ?)", row
+                            )
+                    self._db.commit()
+                written += len(rows)
+                if written >= PRUNE_EVERY:
+                    written = 0
+                    self._prune()
+            except Exception:
+                pass  # the store only warms restarts: a failed write is a later miss; keep the writer alive
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    def _prune(self):
+        """
+        Drop expired rows, then the rows closest to expiry beyond `disk_entries` or `disk_bytes`.
+        """
+        dropped = 0
+        with self._db_lock:
+            self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            rows, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM responses").fetchone()
+            if rows > self.disk_entries or size > self.disk_bytes:
+                keep, kept_bytes = 0, 0
+                for (length,) in self._db.execute("SELECT LENGTH(value) FROM responses ORDER BY expires_at DESC"):
+                    if keep >= self.disk_entries or kept_bytes + length > self.disk_bytes:
+                        break
+                    keep += 1
+                    kept_bytes += length
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY expires_at DESC LIMIT ?)", (keep,)
+                )
+                dropped = rows - keep
+            self._db.commit()
+        with self._lock:  # _lock and _db_lock are never held together
+            self.disk_evictions += dropped
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _store(self, key, expires_at, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide response cache, or None when FMP_CACHE_DISABLED is set.
+    """
+    global _cache
+    if CACHE_DISABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(CACHE_SIZE, CACHE_PATH)
+                atexit.register(_cache.flush)  # the writer thread is a daemon: finish queued writes
+    return _cache
+
+
+def cache_stats():
+    cache = get_cache()
+    return cache.stats() if cache is not None else {}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from src.utils.response_cache import DAY, ResponseCache, cache_key, ttl_for
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_cache_key_strips_api_key_and_sorts_params(self):
+        key = cache_key("https://financialmodelingprep.com/api/v3/search-ticker?query=snow&limit=10&exchange=&apikey=x")
+        self.assertEqual(key, "/api/v3/search-ticker?limit=10&query=snow")
+        self.assertEqual(cache_key("https://financialmodelingprep.com/api/v3/profile/AAPL?apikey=y"), "/api/v3/profile/AAPL")
+
+    def test_ttl_rules(self):
+        self.assertEqual(ttl_for("/api/v3/quote-order/AAPL"), 15)
+        self.assertEqual(ttl_for("/api/v3/stock/list"), DAY)
+        self.assertEqual(ttl_for("/api/v3/income-statement/AAPL?period=annual"), 7 * DAY)
+        self.assertEqual(ttl_for("/api/v3/income-statement/AAPL?period=quarter"), DAY)
+
+    def test_lru_eviction_and_stats(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)  # evicts "b", the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 1, 1))
+
+    def test_expiry(self):
+        cache = ResponseCache()
+        with mock.patch("src.utils.response_cache.time.time", return_value=1000.0):
+            cache.set("/api/v3/quote-order/AAPL", [{"price": 1}])
+        with mock.patch("src.utils.response_cache.time.time", return_value=1016.0):
+            self.assertIsNone(cache.get("/api/v3/quote-order/AAPL"))
+
+    def test_sqlite_store_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cold = ResponseCache(path=path)
+            cold.set("/api/v3/profile/AAPL", [{"symbol": "AAPL"}])
+            cold.flush()
+            warm = ResponseCache(path=path)
+            self.assertEqual(warm.get("/api/v3/profile/AAPL"), [{"symbol": "AAPL"}])
+            self.assertEqual(warm.stats()["disk_hits"], 1)
+            warm._db.close()
+
+    def test_memory_hits_do_not_wait_for_a_store_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cold = ResponseCache(path=path)
+            cold.set("/api/v3/profile/AAPL", [{"symbol": "AAPL"}])
+            cold.flush()
+            warm = ResponseCache(path=path)
+            warm.set("/api/v3/profile/MSFT", [{"symbol": "MSFT"}])
+            loop_thread = threading.get_ident()
+            read_on = []
+            execute = warm._db.execute
+
+            def slow_execute(sql, *args):
+                if sql.startswith("SELECT"):
+                    read_on.append(threading.get_ident())
+                    # Another caller's in-memory hit completes while this read holds the store
+                    reader = threading.Thread(target=lambda: read_on.append(warm.get("/api/v3/profile/MSFT")))
+                    reader.start()
+                    reader.join(1)
+                return execute(sql, *args)
+
+            warm._db = mock.Mock(wraps=warm._db, execute=slow_execute)
+            self.assertEqual(asyncio.run(warm.aget("/api/v3/profile/AAPL")), [{"symbol": "AAPL"}])
+            self.assertNotEqual(read_on[0], loop_thread)
+            self.assertEqual(read_on[1], [{"symbol": "MSFT"}])
+            self.assertEqual(warm.stats()["disk_hits"], 1)
+            execute.__self__.close()
+
+    def test_sqlite_store_is_written_off_the_caller_and_pruned(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cache = ResponseCache(path=path, disk_entries=50, disk_bytes=10 * 1000)
+            serialized_by = []
+            real_dumps = json.dumps
+
+            def dumps(value, *args, **kwargs):
+                serialized_by.append(threading.current_thread())
+                return real_dumps(value, *args, **kwargs)
+
+            with mock.patch("src.utils.response_cache.PRUNE_EVERY", 10), \
+                    mock.patch("src.utils.response_cache.json.dumps", dumps):
+                for i in range(100):
+                    cache.set(f"/api/v3/profile/S{i}", [{"symbol": f"S{i}", "description": "x" * 100}], ttl=1000 + i)
+                cache.flush()
+            self.assertNotIn(threading.current_thread(), serialized_by)  # the writer thread serialized
+            self.assertGreater(cache.stats()["disk_evictions"], 0)  # pruned while writing
+            cache._prune()
+            rows, size = cache._db.execute("SELECT COUNT(*), SUM(LENGTH(value)) FROM responses").fetchone()
+            self.assertLessEqual(rows, 50)
+            self.assertLessEqual(size, 10 * 1000)
+            # The entries closest to expiry go first
+            self.assertIsNotNone(cache._db.execute("SELECT 1 FROM responses WHERE key = '/api/v3/profile/S99'").fetchone())
+            cache.clear()
+            cache.flush()
+            self.assertEqual(cache._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0], 0)
+            cache._db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,241 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+from collections import OrderedDict, defaultdict
+
+# Shapes tool results before they are serialized into the prompt: per-tool field
+# projection, row limits with "next page" handles, float rounding, string
+# truncation and a hard token budget per result.
+
+TOKEN_BUDGET = int(os.environ.get('FMP_TOOL_TOKEN_BUDGET', 2000))
+MAX_ROWS = int(os.environ.get('FMP_TOOL_MAX_ROWS', 20))
+SHAPING_DISABLED = os.environ.get('FMP_RESULT_SHAPING_DISABLED', '').lower() in ('1', 'true', 'yes')
+CHARS_PER_TOKEN = 4  # rough estimate for JSON payloads
+MAX_PAGED_ROWS = int(os.environ.get('FMP_TOOL_MAX_PAGED_ROWS', 10000))  # rows kept for get_next_page, per session
+MAX_PAGE_SESSIONS = 64  # sessions with pages kept, least recently used dropped first
+PAGE_OVERHEAD_TOKENS = 40  # the pagination envelope around the rows
+SIZE_SAMPLE_ROWS = 32  # rows measured when estimating the size of a long raw result
+
+DEFAULT_POLICY = {"fields": None, "max_rows": MAX_ROWS, "round_digits": 4, "max_string": 500}
+
+_LIST_FIELDS = ("symbol", "name", "exchangeShortName", "price", "type")
+
+# Per-tool overrides of DEFAULT_POLICY; None disables shaping for that tool.
+TOOL_POLICIES = {
+    "get_company_profile": {
+        "fields": ("symbol", "companyName", "price", "beta", "mktCap", "currency", "exchangeShortName", "industry",
+                   "sector", "country", "ceo", "fullTimeEmployees", "website", "ipoDate", "cik", "isin", "cusip",
+                   "address", "city", "state", "zip", "phone", "lastDiv", "range", "dcf", "description"),
+        "max_string": 400,
+    },
+    "stock_screener": {
+        "fields": ("symbol", "companyName", "marketCap", "sector", "industry", "beta", "price", "volume", "pe",
+                   "exchangeShortName", "country"),
+    },
+    "get_all_stocks": {"fields": _LIST_FIELDS, "max_rows": 50},
+    "get_tradable_stocks": {"fields": _LIST_FIELDS, "max_rows": 50},
+    "get_etf_list": {"fields": _LIST_FIELDS, "max_rows": 50},
+    "get_exchange_symbols": {"fields": ("symbol", "name", "price", "marketCap", "exchange"), "max_rows": 50},
+    "get_cik_list": {"max_rows": 50},
+    "get_financial_statement_symbols": {"max_rows": 100},
+    "get_next_page": None,
+}
+
+# session id -> OrderedDict(token -> [tool name, shaped rows, page size, total rows, offset]); each
+# paginated result keeps one reference to its shaped rows, and a page is a slice at the offset
+_pages = OrderedDict()
+_session = contextvars.ContextVar('result_shaping_session', default=None)
+_stats = defaultdict(lambda: {"calls": 0, "shaped": 0, "bytes_in": 0, "bytes_out": 0})
+_lock = threading.Lock()
+
+
+def policy_for(tool_name):
+    if tool_name in TOOL_POLICIES and TOOL_POLICIES[tool_name] is None:
+        return None
+    return dict(DEFAULT_POLICY, **TOOL_POLICIES.get(tool_name, {}))
+
+
+def _size(value):
+    return len(json.dumps(value, default=str, separators=(',', ':')))
+
+
+def _approx_size(value):
+    """
+    Approximate serialized size of a raw tool result, without serializing it: long lists are
+    measured on their first SIZE_SAMPLE_ROWS rows and scaled.
+    """
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, dict):
+        return 2 + sum(len(str(name)) + 4 + _approx_size(item) for name, item in value.items())
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return 2
+        sample = value[:SIZE_SAMPLE_ROWS]
+        return 2 + (sum(_approx_size(item) + 1 for item in sample) * len(value)) // len(sample)
+    if value is None or isinstance(value, bool):
+        return 5
+    if isinstance(value, (int, float)):
+        return len(repr(value))
+    return len(str(value)) + 2
+
+
+def estimate_tokens(value):
+    return _size(value) // CHARS_PER_TOKEN + 1
+
+
+def _compact(value, fields, digits, max_string):
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, str):
+        return value if len(value) <= max_string else value[:max_string] + '...'
+    if isinstance(value, dict):
+        if fields:
+            value = {name: value[name] for name in fields if name in value}
+        return {name: _compact(item, None, digits, max_string) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_compact(item, fields, digits, max_string) for item in value]
+    return value
+
+
+@contextlib.contextmanager
+def session(session_id):
+    """
+    Scope the page tokens handed out in this context (thread or asyncio task) to `session_id`:
+    get_next_page only honours tokens of the calling session, and one session's results never
+    push out another's.
+    """
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def _keep(entries):
+    # Drop the session's oldest results until the rows it keeps fit MAX_PAGED_ROWS
+    kept = sum(len(entry[1]) for entry in entries.values())
+    while kept > MAX_PAGED_ROWS and len(entries) > 1:
+        _, entry = entries.popitem(last=False)
+        kept -= len(entry[1])
+
+
+def _page(tool_name, rows, page_size, total):
+    result = {"results": rows[:page_size], "total_rows": total, "offset": 0}
+    if len(rows) > page_size:
+        token = secrets.token_hex(6)
+        with _lock:
+            entries = _pages.setdefault(_session.get(), OrderedDict())
+            _pages.move_to_end(_session.get())
+            entries[token] = [tool_name, rows[:MAX_PAGED_ROWS], page_size, total, page_size]
+            _keep(entries)
+            while len(_pages) > MAX_PAGE_SESSIONS:
+                _pages.popitem(last=False)
+        result["next_page_token"] = token
+        result["note"] = "More rows available: call get_next_page with next_page_token."
+        if len(rows) > MAX_PAGED_ROWS:
+            result["note"] += f" Only the first {MAX_PAGED_ROWS} rows can be paged through; narrow the request for the rest."
+    return result
+
+
+def shape_result(tool_name, result, policy=None, token_budget=None):
+    """
+    Apply the tool's shaping policy to `result` and enforce the token budget.
+    Lists longer than the row limit are paginated; the shaped rows (up to FMP_TOOL_MAX_PAGED_ROWS)
+    are kept for get_next_page in the current session (see session).
+    """
+    policy = policy if policy is not None else policy_for(tool_name)
+    if policy is None:
+        return result
+    budget = token_budget if token_budget is not None else TOKEN_BUDGET
+    if isinstance(result, dict) and "error" in result:
+        return result
+    shaped = _compact(result, policy["fields"], policy["round_digits"], policy["max_string"])
+    if isinstance(shaped, list) and shaped:
+        page_size = min(len(shaped), max(1, policy["max_rows"]))
+        while page_size > 1 and estimate_tokens(shaped[:page_size]) > budget - PAGE_OVERHEAD_TOKENS:
+            page_size //= 2
+        if len(shaped) > page_size:
+            shaped = _page(tool_name, shaped, page_size, len(shaped))
+    if estimate_tokens(shaped) > budget:
+        # Still too big (e.g. one huge record): cut long strings harder, then hard-truncate
+        shaped = _compact(shaped, None, policy["round_digits"], max(40, policy["max_string"] // 8))
+    if estimate_tokens(shaped) > budget:
+        text = json.dumps(shaped, default=str, separators=(',', ':'))
+        shaped = {"truncated_result": text[:budget * CHARS_PER_TOKEN], "note": "Result truncated to the token budget."}
+    return shaped
+
+
+def next_page(page_token):
+    """
+    Return the next page of a paginated tool result.
+    """
+    with _lock:
+        entries = _pages.get(_session.get(), {})
+        entry = entries.pop(page_token, None)
+        if entry is None:
+            return {"error": f"Unknown or expired page token: {page_token}"}
+        _pages.move_to_end(_session.get())
+        tool_name, rows, page_size, total, offset = entry
+        result = {"results": rows[offset:offset + page_size], "total_rows": total, "offset": offset}
+        if offset + page_size < len(rows):
+            token = secrets.token_hex(6)
+            entries[token] = [tool_name, rows, page_size, total, offset + page_size]
+            result["next_page_token"] = token
+            result["note"] = "More rows available: call get_next_page with next_page_token."
+    return result
+
+
+def _record(tool_name, raw, shaped):
+    # The shaped result is small by construction; the raw one can be a 50,000-row list
+    bytes_in, bytes_out = _approx_size(raw), _size(shaped)
+    with _lock:
+        stats = _stats[tool_name]
+        stats["calls"] += 1
+        stats["shaped"] += bytes_out < bytes_in
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+
+
+def shaping_stats():
+    """
+    Per-tool bytes in/out and estimated tokens saved by shaping.
+    """
+    with _lock:
+        report = {}
+        for tool_name, stats in _stats.items():
+            saved = stats["bytes_in"] - stats["bytes_out"]
+            report[tool_name] = dict(stats, bytes_saved=saved, tokens_saved=saved // CHARS_PER_TOKEN)
+        return report
+
+
+def shaped(fn, tool_name=None):
+    """
+    Wrap a tool function (sync or async) so its result goes through shape_result().
+    The wrapper keeps the original name, docstring and signature for FunctionTool.
+    """
+    tool_name = tool_name or fn.__name__
+    if SHAPING_DISABLED or policy_for(tool_name) is None:
+        return fn
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            raw = await fn(*args, **kwargs)
+            result = shape_result(tool_name, raw)
+            _record(tool_name, raw, result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        raw = fn(*args, **kwargs)
+        result = shape_result(tool_name, raw)
+        _record(tool_name, raw, result)
+        return result
+    return wrapper
@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from src.utils import result_shaping
+from src.utils.result_shaping import estimate_tokens, next_page, shape_result, shaped
+
+
+class TestResultShaping(unittest.TestCase):
+
+    def test_projection_rounding_and_string_truncation(self):
+        profile = [{"symbol": "AAPL", "companyName": "Apple Inc.", "beta": 1.2412345678, "description": "x" * 5000,
+                    "image": "https://financialmodelingprep.com/image-stock/AAPL.png", "phone": "408 996 1010",
+                    "city": "Cupertino", "lastDiv": 0.99, "range": "164.08-237.49", "defaultImage": False}]
+        result = shape_result("get_company_profile", profile)
+        self.assertEqual(set(result[0]), {"symbol", "companyName", "beta", "description", "phone", "city", "lastDiv",
+                                          "range"})
+        self.assertEqual(result[0]["beta"], 1.2412)
+        self.assertEqual(len(result[0]["description"]), 403)
+        self.assertEqual(len(profile[0]["description"]), 5000)  # the cached original is untouched
+
+    def test_pagination(self):
+        stocks = [{"symbol": f"S{i}", "name": f"Stock {i}", "price": i + 0.123456, "exchange": "x"} for i in range(120)]
+        first = shape_result("get_all_stocks", stocks)
+        self.assertEqual((len(first["results"]), first["total_rows"], first["offset"]), (50, 120, 0))
+        second = next_page(first["next_page_token"])
+        third = next_page(second["next_page_token"])
+        self.assertEqual(second["results"][0]["symbol"], "S50")
+        self.assertEqual((len(third["results"]), third["offset"]), (20, 100))
+        self.assertNotIn("next_page_token", third)
+        self.assertIn("error", next_page(first["next_page_token"]))
+
+    def test_pages_are_kept_per_session_and_capped(self):
+        stocks = [{"symbol": f"S{i}", "name": f"Stock {i}"} for i in range(300)]
+        with mock.patch.object(result_shaping, "MAX_PAGED_ROWS", 250), \
+                mock.patch.object(result_shaping, "_pages", result_shaping.OrderedDict()):
+            with result_shaping.session("a"):
+                first = shape_result("get_all_stocks", stocks)
+                self.assertIn("first 250 rows", first["note"])
+            with result_shaping.session("b"):
+                self.assertIn("error", next_page(first["next_page_token"]))
+                for _ in range(3):
+                    shape_result("get_all_stocks", stocks)
+                self.assertEqual(len(result_shaping._pages["b"]), 1)
+            with result_shaping.session("a"):
+                page = next_page(first["next_page_token"])
+                for _ in range(3):
+                    page = next_page(page["next_page_token"])
+            self.assertEqual((page["offset"], page["total_rows"]), (200, 300))
+            self.assertNotIn("next_page_token", page)
+            self.assertEqual(len(page["results"]), 50)
+
+    def test_token_budget(self):
+        rows = [{"symbol": f"S{i}", "notes": "n" * 400} for i in range(20)]
+        result = shape_result("get_company_notes", rows, token_budget=500)
+        self.assertLessEqual(estimate_tokens(result), 500)
+        self.assertEqual(result["total_rows"], 20)
+        huge = {"text": "y" * 100000}
+        self.assertLessEqual(estimate_tokens(shape_result("get_company_notes", huge, token_budget=100)), 100)
+
+    def test_errors_pass_through_and_wrappers_record_savings(self):
+        error = {"error": "Failed to fetch data. Status code: 429"}
+        self.assertIs(shape_result("get_company_profile", error), error)
+
+        def get_company_notes(symbol):
+            """Notes."""
+            return [{"symbol": symbol, "value": 1.123456789}] * 30
+
+        async def aget_company_notes(symbol):
+            return get_company_notes(symbol)
+
+        sync_tool = shaped(get_company_notes)
+        async_tool = shaped(aget_company_notes, "get_company_notes")
+        self.assertEqual(sync_tool.__name__, "get_company_notes")
+        self.assertEqual(len(sync_tool("AAPL")["results"]), 20)
+        self.assertEqual(asyncio.run(async_tool("AAPL"))["total_rows"], 30)
+        stats = result_shaping.shaping_stats()["get_company_notes"]
+        self.assertGreater(stats["tokens_saved"], 0)
+        self.assertIs(shaped(next_page, "get_next_page"), next_page)
+
+    def test_raw_size_is_estimated_without_serializing(self):
+        rows = [{"symbol": f"S{i:05d}", "name": f"Stock {i}", "price": 10.25, "active": True} for i in range(5000)]
+        exact = result_shaping._size(rows)
+        self.assertAlmostEqual(result_shaping._approx_size(rows) / exact, 1, delta=0.1)
+        with mock.patch.object(result_shaping.json, "dumps", side_effect=AssertionError("serialized")):
+            self.assertGreater(result_shaping._approx_size(rows), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .http_client import FetchError, astream_records, stream_records
+from .single_flight import SingleFlight
+
+# Local stock screener. A snapshot of the whole tradable universe (the unfiltered
+# /stock-screener list, with the P/E of the exchange-wide quotes) is kept as
+# columnar NumPy arrays: float64 for the numeric fields, integer codes for sector,
+# industry, country and exchange. Every screen is then a few vectorized
+# comparisons and a partial sort, answered in milliseconds without an FMP call,
+# however often the LLM narrows its criteria. The snapshot is refreshed in the
+# background once it is older than FMP_UNIVERSE_MAX_AGE.
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+LOCAL_SCREENER_DISABLED = os.environ.get('FMP_LOCAL_SCREENER_DISABLED', '').lower() in ('1', 'true', 'yes')
+UNIVERSE_PATH = os.environ.get('FMP_UNIVERSE_PATH')  # .npz snapshot; unset keeps the universe in memory only
+UNIVERSE_MAX_AGE = float(os.environ.get('FMP_UNIVERSE_MAX_AGE', 60 * 60))
+REFRESH_RETRY_DELAY = 5 * 60  # don't re-download the universe on every screen while FMP is failing
+
+UNIVERSE_URL = 'https://financialmodelingprep.com/api/v3/stock-screener?isActivelyTrading=true&limit=100000&apikey={api_key}'
+QUOTES_URL = 'https://financialmodelingprep.com/api/v3/quotes/{exchange}?apikey={api_key}'
+QUOTE_EXCHANGES = ('nasdaq', 'nyse', 'amex')
+
+NUMERIC = ('marketCap', 'beta', 'price', 'volume', 'pe', 'lastAnnualDividend')
+CATEGORICAL = ('sector', 'industry', 'country', 'exchangeShortName')
+UNIVERSE_FIELDS = ('symbol', 'companyName', 'isEtf', 'marketCap', 'beta', 'price', 'volume',
+                   'lastAnnualDividend') + CATEGORICAL
+QUOTE_FIELDS = ('symbol', 'pe', 'price', 'volume', 'marketCap')
+INTEGER_COLUMNS = ('marketCap', 'volume')
+ROW_FIELDS = ('symbol', 'companyName') + NUMERIC + CATEGORICAL + ('isEtf',)
+MEMO_SIZE = 256  # recent screens kept per snapshot; repeated identical calls skip the scan
+UNAVAILABLE_ERROR = {"error": "The screener universe is not available yet; try again later"}
+
+logger = logging.getLogger(__name__)
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class Universe:
+    """
+    Columnar snapshot of the screener universe: `symbols` and `names` (str arrays), one float64 array
+    per NUMERIC field (NaN when unknown), and per CATEGORICAL field an int32 code array into `labels`.
+    """
+
+    def __init__(self, symbols, names, is_etf, numeric, codes, labels, refreshed_at=0.0):
+        self.symbols = symbols
+        self.names = names
+        self.is_etf = is_etf
+        self.numeric = numeric
+        self.codes = codes
+        self.labels = labels
+        self.refreshed_at = refreshed_at
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._lookup = {field: {str(label).lower(): code for code, label in enumerate(labels[field])}
+                        for field in CATEGORICAL}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @classmethod
+    def build(cls, rows, quotes=(), refreshed_at=None):
+        """
+        Build from /stock-screener rows; `quotes` (FMP quote rows) add the P/E and fresher price, volume
+        and market cap.
+        """
+        by_symbol = {}
+        for row in rows:
+            if row.get('symbol'):
+                by_symbol[row['symbol']] = dict(row)
+        for quote in quotes:
+            row = by_symbol.get(quote.get('symbol'))
+            if row is not None:
+                row.update({field: quote[field] for field in QUOTE_FIELDS[1:] if quote.get(field) is not None})
+        records = list(by_symbol.values())
+        symbols = np.array([row['symbol'] for row in records], dtype=str)
+        names = np.array([row.get('companyName') or '' for row in records], dtype=str)
+        is_etf = np.array([bool(row.get('isEtf')) for row in records], dtype=bool)
+        numeric = {field: np.array([_number(row.get(field)) for row in records], dtype=np.float64)
+                   for field in NUMERIC}
+        codes, labels = {}, {}
+        for field in CATEGORICAL:
+            values = np.array([row.get(field) or '' for row in records], dtype=str)
+            labels[field], inverse = np.unique(values, return_inverse=True)
+            codes[field] = inverse.astype(np.int32)
+        return cls(symbols, names, is_etf, numeric, codes, labels,
+                   time.time() if refreshed_at is None else refreshed_at)
+
+    def values(self, field):
+        """
+        Known values of a categorical field, e.g. values("sector").
+        """
+        return [str(label) for label in self.labels[field] if label]
+
+    def _codes_for(self, field, wanted):
+        names = [name.strip() for name in wanted.split(',') if name.strip()] if isinstance(wanted, str) else wanted
+        codes = []
+        for name in names:
+            code = self._lookup[field].get(str(name).lower())
+            if code is None:
+                raise KeyError(field, name)
+            codes.append(code)
+        return np.array(codes, dtype=np.int32)
+
+    def screen(self, ranges=None, categories=None, sort_by='marketCap', ascending=False, limit=100,
+               include_etfs=False):
+        """
+        Rows matching every filter, sorted by `sort_by` and cut to the top `limit`. `ranges` maps a
+        NUMERIC field to (more than, lower than) bounds (None for open); `categories` maps a CATEGORICAL
+        field to a value or comma-separated values (case-insensitive). Rows with an unknown value of a
+        filtered or sorted field are excluded or sorted last. Raises KeyError for an unknown category value.
+        Like cached FMP responses, the returned rows are shared between identical screens.
+        """
+        memo_key = (repr(sorted((ranges or {}).items())), repr(sorted((categories or {}).items())), sort_by,
+                    ascending, limit, include_etfs)
+        with self._memo_lock:
+            rows = self._memo.get(memo_key)
+            if rows is not None:
+                self._memo.move_to_end(memo_key)
+                return rows
+        rows = self._scan(ranges, categories, sort_by, ascending, limit, include_etfs)
+        with self._memo_lock:
+            self._memo[memo_key] = rows
+            if len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return rows
+
+    def _scan(self, ranges, categories, sort_by, ascending, limit, include_etfs):
+        mask = np.ones(len(self), dtype=bool) if include_etfs else ~self.is_etf
+        for field, (low, high) in (ranges or {}).items():
+            column = self.numeric[field]
+            if low is not None:
+                mask &= column > low
+            if high is not None:
+                mask &= column < high
+        for field, wanted in (categories or {}).items():
+            if wanted:
+                mask &= np.isin(self.codes[field], self._codes_for(field, wanted))
+        rows = np.flatnonzero(mask)
+        key = self.numeric[sort_by][rows]
+        key = np.where(np.isnan(key), np.inf, key if ascending else -key)
+        limit = max(0, int(limit))
+        if limit < len(rows):
+            top = np.argpartition(key, limit - 1)[:limit] if limit else rows[:0]
+            order = top[np.argsort(key[top], kind='stable')]
+        else:
+            order = np.argsort(key, kind='stable')
+        return self._rows(rows[order])
+
+    def _rows(self, indices):
+        # Column-wise .tolist() and one zip: far cheaper than indexing NumPy scalars row by row
+        columns = [self.symbols[indices].tolist(), self.names[indices].tolist()]
+        for field in NUMERIC:
+            integer = field in INTEGER_COLUMNS
+            columns.append([None if value != value else int(value) if integer else value
+                            for value in self.numeric[field][indices].tolist()])
+        for field in CATEGORICAL:
+            columns.append([label or None for label in self.labels[field][self.codes[field][indices]].tolist()])
+        columns.append(self.is_etf[indices].tolist())
+        return [dict(zip(ROW_FIELDS, values)) for values in zip(*columns)]
+
+    def stats(self):
+        return {"symbols": len(self), "refreshed_at": self.refreshed_at,
+                **{f"{field}_values": len(self.values(field)) for field in CATEGORICAL}}
+
+    def save(self, path):
+        arrays = {"symbols": self.symbols, "names": self.names, "is_etf": self.is_etf,
+                  "refreshed_at": np.array(self.refreshed_at)}
+        arrays.update({f"numeric_{field}": column for field, column in self.numeric.items()})
+        arrays.update({f"codes_{field}": codes for field, codes in self.codes.items()})
+        arrays.update({f"labels_{field}": labels for field, labels in self.labels.items()})
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["symbols"], data["names"], data["is_etf"],
+                       {field: data[f"numeric_{field}"] for field in NUMERIC},
+                       {field: data[f"codes_{field}"] for field in CATEGORICAL},
+                       {field: data[f"labels_{field}"] for field in CATEGORICAL},
+                       float(data["refreshed_at"]))
+
+
+def _quote_urls():
+    return [QUOTES_URL.format(exchange=exchange, api_key=API_KEY) for exchange in QUOTE_EXCHANGES]
+
+
+def download_universe():
+    """
+    Fetch the universe snapshot from FMP. Raises FetchError when the screener list is unavailable;
+    exchanges whose quotes fail just have no P/E.
+    """
+    rows = list(stream_records(UNIVERSE_URL.format(api_key=API_KEY), fields=UNIVERSE_FIELDS))
+    quotes = []
+    for url in _quote_urls():
+        try:
+            quotes += stream_records(url, fields=QUOTE_FIELDS)
+        except FetchError as e:
+            logger.warning("universe quotes unavailable: %s", e)
+    return Universe.build(rows, quotes)
+
+
+async def adownload_universe():
+    """
+    Async variant of download_universe.
+    """
+    rows = [row async for row in astream_records(UNIVERSE_URL.format(api_key=API_KEY), fields=UNIVERSE_FIELDS)]
+    quotes = []
+    for url in _quote_urls():
+        try:
+            quotes += [quote async for quote in astream_records(url, fields=QUOTE_FIELDS)]
+        except FetchError as e:
+            logger.warning("universe quotes unavailable: %s", e)
+    # Encoding tens of thousands of rows into columns takes a while: not on the event loop
+    return await asyncio.to_thread(Universe.build, rows, quotes)
+
+
+class UniverseCache:
+    """
+    Holds the current snapshot. A stale snapshot keeps answering while a background thread
+    downloads the next one; only the very first screen waits for the download.
+    """
+
+    def __init__(self, path=UNIVERSE_PATH, max_age=UNIVERSE_MAX_AGE, download=download_universe,
+                 adownload=adownload_universe):
+        self.path = path
+        self.max_age = max_age
+        self.download = download
+        self.adownload = adownload
+        self.universe = Universe.load(path) if path and os.path.exists(path) else None
+        self.attempted_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._first = SingleFlight()  # concurrent first screens, threaded or async, share one download
+
+    def _due(self):
+        now = time.time()
+        age = now - self.universe.refreshed_at if self.universe is not None else math.inf
+        return age > self.max_age and now - self.attempted_at > REFRESH_RETRY_DELAY
+
+    def _install(self, universe):
+        self.universe = universe
+        if self.path:
+            universe.save(self.path)
+        return universe
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self.attempted_at = time.time()
+
+        def refresh():
+            try:
+                self._install(self.download())
+            except FetchError as e:
+                logger.warning("universe refresh failed: %s", e)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name="universe-refresh", daemon=True).start()
+
+    def _claim_first(self):
+        # Called by the first download's leader; a caller that lost the race to it finds the snapshot installed
+        if self.universe is not None:
+            return False
+        if not self._due():
+            raise FetchError(dict(UNAVAILABLE_ERROR))
+        self.attempted_at = time.time()
+        return True
+
+    def _download_first(self):
+        if self._claim_first():
+            self._install(self.download())
+        return self.universe
+
+    async def _adownload_first(self):
+        if self._claim_first():
+            universe = await self.adownload()
+            await asyncio.to_thread(self._install, universe)
+        return self.universe
+
+    def get(self):
+        """
+        The current snapshot, downloading the first one if needed. Raises FetchError if there is none
+        (without retrying the download for REFRESH_RETRY_DELAY after a failure).
+        """
+        if self.universe is None:
+            return self._first.do("universe", self._download_first)
+        if self._due():
+            self._refresh_in_background()
+        return self.universe
+
+    async def aget(self):
+        """
+        Async variant of get.
+        """
+        if self.universe is None:
+            return await self._first.ado("universe", self._adownload_first)
+        if self._due():
+            self._refresh_in_background()
+        return self.universe
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_universe_cache():
+    """
+    Return the process-wide universe cache, loading the on-disk snapshot if one is configured.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UniverseCache()
+    return _cache
@@ -0,0 +1,144 @@
+import asyncio
+import math
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from src.utils.http_client import FetchError
+from src.utils.screener import Universe, UniverseCache
+
+SECTORS = ("Technology", "Healthcare", "Energy")
+
+
+def _rows(n):
+    return [{"symbol": f"S{i}", "companyName": f"Company {i}", "marketCap": (i + 1) * 1e9, "beta": 0.5 + i % 5 * 0.25,
+             "price": 10.0 + i, "volume": 1000 * (i + 1), "sector": SECTORS[i % 3], "industry": f"Industry {i % 7}",
+             "country": "US" if i % 4 else "DE", "exchangeShortName": "NASDAQ" if i % 2 else "NYSE",
+             "isEtf": i % 10 == 9} for i in range(n)]
+
+
+def _universe(n=100):
+    # Quotes add the P/E; S0 has none
+    return Universe.build(_rows(n), [{"symbol": f"S{i}", "pe": float(i)} for i in range(1, n)])
+
+
+class TestUniverse(unittest.TestCase):
+
+    def test_build_encodes_categories(self):
+        universe = _universe()
+        self.assertEqual(len(universe), 100)
+        self.assertEqual(universe.values("sector"), sorted(SECTORS))
+        self.assertEqual(universe.codes["sector"].dtype.kind, "i")
+        self.assertTrue(math.isnan(universe.numeric["pe"][0]))
+
+    def test_screen_filters_sorts_and_cuts(self):
+        universe = _universe()
+        rows = universe.screen({"marketCap": (20e9, None), "beta": (None, 1.5)}, {"sector": "technology"}, limit=3)
+        self.assertEqual([row["symbol"] for row in rows], ["S96", "S93", "S90"])
+        self.assertEqual(rows[0]["sector"], "Technology")
+        self.assertEqual(rows[0]["marketCap"], 97_000_000_000)
+        self.assertEqual(rows[0]["pe"], 96.0)
+        # ETFs are left out unless asked for
+        self.assertNotIn("S99", [row["symbol"] for row in universe.screen(limit=5)])
+        self.assertEqual(universe.screen(limit=1, include_etfs=True)[0]["symbol"], "S99")
+        self.assertIs(universe.screen(None, {"sector": ["Energy"]}), universe.screen(None, {"sector": ["Energy"]}))
+
+    def test_screen_multiple_values_ascending_and_missing_values(self):
+        universe = _universe()
+        rows = universe.screen(None, {"country": "DE", "exchangeShortName": "NYSE,NASDAQ"}, sort_by="pe",
+                               ascending=True, limit=100)
+        self.assertEqual(len(rows), 25)
+        # The unknown P/E of S0 sorts last; a P/E filter excludes it
+        self.assertEqual(rows[-1]["symbol"], "S0")
+        self.assertIsNone(rows[-1]["pe"])
+        self.assertNotIn("S0", [row["symbol"] for row in universe.screen({"pe": (None, 50)}, limit=100)])
+        self.assertEqual(universe.screen(limit=0), [])
+        with self.assertRaises(KeyError):
+            universe.screen(None, {"sector": "Utilities"})
+
+    def test_large_universe(self):
+        universe = Universe.build(_rows(50000))
+        started = time.perf_counter()
+        rows = universe.screen({"marketCap": (1e12, None), "price": (None, 40000)}, {"sector": "Energy"}, limit=10)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(rows[0]["symbol"], "S39986")
+        self.assertLess(elapsed, 1.0)
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "universe.npz")
+            universe = _universe()
+            universe.save(path)
+            loaded = Universe.load(path)
+            self.assertEqual(loaded.refreshed_at, universe.refreshed_at)
+            self.assertEqual(loaded.screen({"pe": (10, 20)}, {"sector": "Energy"}),
+                             universe.screen({"pe": (10, 20)}, {"sector": "Energy"}))
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestUniverseCache(unittest.TestCase):
+
+    def test_first_download_then_background_refresh(self):
+        downloads = []
+
+        def download():
+            downloads.append(time.time())
+            return Universe.build(_rows(10), refreshed_at=time.time())
+
+        cache = UniverseCache(path=None, max_age=3600, download=download)
+        first = cache.get()
+        self.assertIs(cache.get(), first)
+        self.assertEqual(len(downloads), 1)
+        # Stale: the old snapshot answers while the new one downloads
+        first.refreshed_at = cache.attempted_at = 0.0
+        self.assertIs(cache.get(), first)
+        for _ in range(100):
+            if cache.universe is not first:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(downloads), 2)
+        self.assertIsNot(cache.universe, first)
+
+    def test_failed_download_is_not_retried_at_once(self):
+        calls = []
+
+        def download():
+            calls.append(1)
+            raise FetchError({"error": "Failed to fetch data. Status code: 503"})
+
+        async def adownload():
+            return Universe.build(_rows(3))
+
+        cache = UniverseCache(path=None, download=download, adownload=adownload)
+        with self.assertRaises(FetchError):
+            cache.get()
+        with self.assertRaises(FetchError) as raised:
+            cache.get()
+        self.assertEqual(len(calls), 1)
+        self.assertIn("not available yet", raised.exception.error["error"])
+        cache.attempted_at = 0.0
+        self.assertEqual(len(asyncio.run(cache.aget())), 3)
+
+    def test_concurrent_first_screens_share_one_download(self):
+        downloads = []
+
+        async def adownload():
+            downloads.append(1)
+            await asyncio.sleep(0.01)
+            return Universe.build(_rows(3))
+
+        async def main():
+            return await asyncio.gather(*(cache.aget() for _ in range(5)))
+
+        cache = UniverseCache(path=None, adownload=adownload)
+        universes = asyncio.run(main())
+        self.assertEqual(len(downloads), 1)
+        self.assertTrue(all(universe is cache.universe for universe in universes))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+
+
+def on_event_loop():
+    """
+    True when called from a thread that is running an asyncio event loop: blocking there on a result
+    another task of the same loop produces would deadlock.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key (the leader) runs the work; callers arriving while
+    it is in flight wait for and share its result. Flights are tracked with
+    thread-safe futures, so threaded and asyncio callers coalesce with each other.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> concurrent.futures.Future
+        self.leaders = 0
+        self.deduplicated = 0
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.deduplicated += 1
+                return flight, False
+            flight = Future()
+            self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def _finish(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def join(self, key):
+        """
+        For work that cannot be wrapped in one call, such as a stream that yields while it
+        downloads: returns (future, True) when the caller leads the flight for `key` (it must
+        resolve the future, or cancel it, then call finish), else (the leader's future, False).
+        """
+        return self._join(key)
+
+    def finish(self, key, flight):
+        self._finish(key, flight)
+
+    def current(self, key):
+        """
+        The future of the flight in progress for `key`, or None: for callers that reuse a result
+        already on its way but never lead a flight themselves.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.deduplicated += 1
+            return flight
+
+    def do(self, key, fn):
+        """
+        Run `fn()` for `key` unless an identical call is already in flight, in which case wait for its result.
+        On an event loop thread the leader may be a task of that very loop, so `fn()` runs again instead.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            if on_event_loop():
+                return fn()
+            try:
+                return flight.result()
+            except CancelledError:
+                # The leader was cancelled; it says nothing about our own call, so try again
+                return self.do(key, fn)
+        try:
+            result = fn()
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            self._finish(key, flight)
+
+    async def ado(self, key, fn):
+        """
+        Async variant of do: `fn` is a coroutine function.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            try:
+                return await asyncio.wrap_future(flight)
+            except asyncio.CancelledError:
+                if flight.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.ado(key, fn)
+                raise
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            self._finish(key, flight)
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "deduplicated": self.deduplicated, "in_flight": len(self._flights)}
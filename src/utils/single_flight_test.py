@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_threaded_callers_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return {"symbol": "AAPL"}
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(flights.do, "/api/v3/stock/list", work) for _ in range(5)]
+            while flights.stats()["deduplicated"] < 4:
+                time.sleep(0.001)
+            release.set()
+            results = [f.result() for f in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flights.stats(), {"leaders": 1, "deduplicated": 4, "in_flight": 0})
+
+    def test_async_and_threaded_callers_coalesce(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return [1, 2, 3]
+
+        async def run():
+            leader = asyncio.create_task(flights.ado("k", work))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flights.ado("k", work))
+            threaded = asyncio.get_running_loop().run_in_executor(None, flights.do, "k", lambda: [9])
+            return await asyncio.gather(leader, follower, threaded)
+
+        self.assertEqual(asyncio.run(run()), [[1, 2, 3]] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats()["deduplicated"], 2)
+
+    def test_follower_retries_when_leader_is_cancelled(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async def run():
+            leader = asyncio.create_task(flights.ado("k", work))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flights.ado("k", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), "ok")
+
+    def test_sync_call_on_the_leaders_loop_does_not_deadlock(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "async"
+
+        async def run():
+            leader = asyncio.create_task(flights.ado("k", work))
+            await asyncio.sleep(0)
+            # A sync tool called from a coroutine: waiting for the leader would block its own loop
+            return flights.do("k", lambda: "sync"), await leader
+
+        self.assertEqual(asyncio.run(asyncio.wait_for(run(), 5)), ("sync", "async"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import sys
+import time
+
+from .tool_events import add_listener, remove_listener
+
+# Streaming chat turn for the interactive chatbot: answer tokens are printed as
+# they arrive from stream_chat, tool calls show up as progress lines while the
+# agent works, and every turn ends with its time-to-first-token, latency and the
+# size of the chat history sent to the LLM.
+
+MAX_ARGUMENT_CHARS = 80
+
+
+def _arguments(arguments):
+    text = json.dumps(arguments, default=str)
+    return text if len(text) <= MAX_ARGUMENT_CHARS else text[:MAX_ARGUMENT_CHARS] + '...'
+
+
+def format_event(event):
+    if event["type"] == "tool_start":
+        return f"  ... {event['tool']}({_arguments(event.get('arguments'))})"
+    status = "done" if event.get("ok") else "failed"
+    return f"  ... {event['tool']} {status} in {event['duration']:.2f}s"
+
+
+def stream_answer(agent, query, out=None):
+    """
+    Run one turn with agent.stream_chat(query), writing progress and tokens to `out` (stdout by default).
+    Returns {"ttft": seconds to the first answer token or None, "latency": turn seconds, "tools": tool calls,
+    "history_tokens": estimated tokens of the largest chat history sent to the LLM or None}.
+    """
+    out = out or sys.stdout
+    started = time.perf_counter()
+    timing = {"ttft": None, "latency": None, "tools": 0, "cached": False, "fast_path": None, "history_tokens": None}
+
+    def on_event(event):
+        if event["type"] == "memory":
+            timing["history_tokens"] = max(timing["history_tokens"] or 0, event["tokens"])
+            return
+        if event["type"] not in ("tool_start", "tool_end"):
+            return
+        if event["type"] == "tool_start":
+            timing["tools"] += 1
+        out.write(format_event(event) + "\n")
+        out.flush()
+
+    add_listener(on_event)
+    try:
+        response = agent.stream_chat(query)
+        timing["cached"] = getattr(response, "cached", False)
+        timing["fast_path"] = getattr(response, "fast_path", None)
+        for token in response.response_gen:
+            if timing["ttft"] is None:
+                timing["ttft"] = time.perf_counter() - started
+                out.write("Assistant: ")
+            out.write(token)
+            out.flush()
+        if timing["ttft"] is None:
+            # Nothing was streamed (e.g. the agent ended on a tool error): show the final response
+            out.write(f"Assistant: {response}")
+    finally:
+        remove_listener(on_event)
+    timing["latency"] = time.perf_counter() - started
+    ttft = f"{timing['ttft']:.2f}s" if timing["ttft"] is not None else "n/a"
+    if timing["cached"]:
+        source = "answered from cache"
+    elif timing["fast_path"]:
+        source = f"fast path ({timing['fast_path']}), no LLM call"
+    else:
+        source = f"{timing['tools']} tool calls"
+    history = f", history ~{timing['history_tokens']} tokens" if timing["history_tokens"] is not None else ""
+    out.write(f"\n[first token {ttft}, turn {timing['latency']:.2f}s, {source}{history}]\n")
+    out.flush()
+    return timing
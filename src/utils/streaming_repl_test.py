@@ -0,0 +1,86 @@
+import asyncio
+import io
+import unittest
+
+from src.utils import tool_events
+from src.utils.streaming_repl import stream_answer
+
+
+def get_price(symbol):
+    return {"symbol": symbol, "price": 1.0}
+
+
+async def aget_price(symbol):
+    return {"error": f"Could not fetch price for symbol: {symbol}"}
+
+
+class _FakeResponse:
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.response_gen = iter(tokens)
+
+    def __str__(self):
+        return "".join(self.tokens)
+
+
+class _FakeAgent:
+
+    def __init__(self, tool, tokens):
+        self.tool = tool
+        self.tokens = tokens
+
+    def stream_chat(self, query):
+        self.tool(symbol="AAPL")
+        return _FakeResponse(self.tokens)
+
+
+class TestStreamingRepl(unittest.TestCase):
+
+    def test_observed_emits_start_and_end(self):
+        events = []
+        tool_events.add_listener(events.append)
+        try:
+            tool_events.observed(get_price)("AAPL")
+            asyncio.run(tool_events.observed(aget_price, "get_price")("MSFT"))
+        finally:
+            tool_events.remove_listener(events.append)
+        self.assertEqual([(e["type"], e["tool"]) for e in events],
+                         [("tool_start", "get_price"), ("tool_end", "get_price")] * 2)
+        self.assertTrue(events[1]["ok"])
+        self.assertFalse(events[3]["ok"])
+        self.assertEqual(events[2]["arguments"], ["MSFT"])
+
+    def test_stream_answer_prints_progress_tokens_and_latency(self):
+        out = io.StringIO()
+        agent = _FakeAgent(tool_events.observed(get_price), ["AAPL ", "is ", "$1"])
+        timing = stream_answer(agent, "price of apple?", out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '  ... get_price({"symbol": "AAPL"})')
+        self.assertTrue(lines[1].startswith("  ... get_price done in "))
+        self.assertEqual(lines[2], "Assistant: AAPL is $1")
+        self.assertTrue(lines[3].startswith("[first token "))
+        self.assertEqual(timing["tools"], 1)
+        self.assertLessEqual(timing["ttft"], timing["latency"])
+
+    def test_stream_answer_without_tokens_prints_the_response(self):
+        out = io.StringIO()
+        agent = _FakeAgent(lambda symbol: None, [])
+        timing = stream_answer(agent, "hi", out)
+        self.assertIsNone(timing["ttft"])
+        self.assertIn("first token n/a", out.getvalue())
+
+    def test_stream_answer_reports_history_size(self):
+        out = io.StringIO()
+
+        def tool(symbol):
+            tool_events.emit("memory", messages=4, tokens=900, compacted=1, dropped=0, limit=12000)
+            tool_events.emit("memory", messages=6, tokens=1400, compacted=0, dropped=0, limit=12000)
+
+        timing = stream_answer(_FakeAgent(tool, ["ok"]), "hi", out)
+        self.assertEqual(timing["history_tokens"], 1400)
+        self.assertTrue(out.getvalue().rstrip().endswith("0 tool calls, history ~1400 tokens]"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,478 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from .http_client import afetch_records, fetch_records
+from .single_flight import SingleFlight
+
+# Local search index over the FMP symbol universe, built from the /stock/list
+# and /cik_list snapshots. The search tools answer from here first and only
+# call the API when the index misses. The lists are streamed, projected to the
+# fields the index keeps and not cached: the index is their only copy.
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+INDEX_PATH = os.environ.get('FMP_SYMBOL_INDEX_PATH')  # JSON snapshot; unset keeps the index in memory only
+INDEX_MAX_AGE = float(os.environ.get('FMP_SYMBOL_INDEX_MAX_AGE', 24 * 60 * 60))
+REFRESH_RETRY_DELAY = 5 * 60  # don't re-download the lists on every search while FMP is failing
+
+STOCK_LIST_URL = 'https://financialmodelingprep.com/api/v3/stock/list?apikey={api_key}'
+CIK_LIST_URL = 'https://financialmodelingprep.com/api/v3/cik_list?apikey={api_key}'
+
+PRIMARY_EXCHANGES = ('NASDAQ', 'NYSE', 'AMEX')
+STOCK_FIELDS = ('symbol', 'name', 'exchange', 'exchangeShortName', 'type', 'cik', 'cusip', 'isin')
+CIK_FIELDS = ('cik', 'name')
+IDENTIFIERS = ('cik', 'cusip', 'isin')  # learned from profiles; /stock/list does not carry them
+_NAME_SUFFIXES = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited', 'plc', 'llc', 'lp',
+    'sa', 'ag', 'nv', 'se', 'the', 'holdings', 'holding', 'group', 'class', 'common', 'stock',
+}
+_non_alnum = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(name):
+    """
+    Lower-case `name`, strip punctuation and legal suffixes ("Apple Inc." -> "apple").
+    """
+    words = _non_alnum.sub(' ', (name or '').lower()).split()
+    kept = [word for word in words if word not in _NAME_SUFFIXES]
+    return ' '.join(kept or words)
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _NameIndex:
+    """
+    Sorted-prefix and trigram index over names, keyed by an arbitrary reference.
+    """
+
+    def __init__(self):
+        self._keys = []  # (normalized name, ref), sorted lazily after bulk loads
+        self._sorted = True
+        self._norms = {}  # ref -> normalized name
+        self._gram_counts = {}  # ref -> number of trigrams in its name
+        self._grams = defaultdict(set)  # trigram -> refs
+
+    def _ensure_sorted(self):
+        if not self._sorted:
+            self._keys.sort()
+            self._sorted = True
+
+    def add(self, ref, name):
+        norm = normalize_name(name)
+        if self._norms.get(ref) == norm:
+            return
+        self.remove(ref)
+        self._norms[ref] = norm
+        self._keys.append((norm, ref))
+        self._sorted = False
+        grams = _trigrams(norm)
+        self._gram_counts[ref] = len(grams)
+        for gram in grams:
+            self._grams[gram].add(ref)
+
+    def remove(self, ref):
+        norm = self._norms.pop(ref, None)
+        if norm is None:
+            return
+        self._ensure_sorted()
+        position = bisect_left(self._keys, (norm, ref))
+        del self._keys[position]
+        del self._gram_counts[ref]
+        for gram in _trigrams(norm):
+            self._grams[gram].discard(ref)
+
+    def prefix(self, query):
+        norm = normalize_name(query)
+        if not norm:
+            return
+        self._ensure_sorted()
+        position = bisect_left(self._keys, (norm,))
+        while position < len(self._keys) and self._keys[position][0].startswith(norm):
+            yield self._keys[position][1]
+            position += 1
+
+    def exact(self, query):
+        norm = normalize_name(query)
+        if not norm:
+            return
+        self._ensure_sorted()
+        position = bisect_left(self._keys, (norm,))
+        while position < len(self._keys) and self._keys[position][0] == norm:
+            yield self._keys[position][1]
+            position += 1
+
+    def fuzzy(self, query, threshold=0.45):
+        """
+        Return refs ordered by trigram (Dice) similarity to `query`. This scores every name sharing a
+        trigram with the query, tens of milliseconds over the full symbol universe, so search tries the
+        prefix lookups first.
+        """
+        query_grams = _trigrams(normalize_name(query))
+        counts = Counter()
+        for gram in query_grams:
+            counts.update(self._grams.get(gram, ()))
+        scored = []
+        for ref, shared in counts.items():
+            score = 2 * shared / (len(query_grams) + self._gram_counts[ref])
+            if score >= threshold:
+                scored.append((-score, self._norms[ref], ref))
+        scored.sort()
+        return [ref for _, _, ref in scored]
+
+
+class SymbolIndex:
+    """
+    In-memory index of stocks (by ticker, name, CIK, CUSIP and ISIN) and of
+    SEC-registered CIK entities. Updates are incremental upserts; a refresh
+    rebuilds from the fresh lists.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._stocks = {}  # symbol -> record
+        self._symbols = []  # tickers for prefix lookups, sorted lazily after bulk loads
+        self._symbols_sorted = True
+        self._ciks = {}  # cik -> entity name from /cik_list
+        self._by_cik = defaultdict(set)
+        self._by_cusip = {}
+        self._by_isin = {}
+        self._names = _NameIndex()
+        self._cik_names = _NameIndex()
+        self.refreshed_at = 0.0
+        self.attempted_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._stocks)
+
+    def is_stale(self, max_age=INDEX_MAX_AGE):
+        now = time.time()
+        return now - self.refreshed_at > max_age and now - self.attempted_at > REFRESH_RETRY_DELAY
+
+    def update(self, records):
+        """
+        Upsert stock records (FMP /stock/list or profile shaped). Returns how many records changed.
+        """
+        changed = 0
+        with self._lock:
+            for record in records:
+                symbol = record.get('symbol')
+                if not symbol:
+                    continue
+                current = self._stocks.get(symbol, {})
+                merged = dict(current)
+                for field in STOCK_FIELDS:
+                    value = record.get(field)
+                    if field == 'name' and not value:
+                        value = record.get('companyName')
+                    if value:
+                        merged[field] = value
+                if merged == current:
+                    continue
+                changed += 1
+                if not current:
+                    self._symbols.append(symbol)
+                    self._symbols_sorted = False
+                self._stocks[symbol] = merged
+                self._names.add(symbol, merged.get('name') or symbol)
+                if merged.get('cik'):
+                    self._by_cik[merged['cik']].add(symbol)
+                if merged.get('cusip'):
+                    self._by_cusip[merged['cusip'].upper()] = symbol
+                if merged.get('isin'):
+                    self._by_isin[merged['isin'].upper()] = symbol
+        return changed
+
+    def update_ciks(self, records):
+        """
+        Upsert /cik_list entries ({"cik": ..., "name": ...}). Returns how many entries changed.
+        """
+        changed = 0
+        with self._lock:
+            for record in records:
+                cik, name = record.get('cik'), record.get('name')
+                if not cik or not name or self._ciks.get(cik) == name:
+                    continue
+                changed += 1
+                self._ciks[cik] = name
+                self._cik_names.add(cik, name)
+        return changed
+
+    def observe(self, data):
+        """
+        Learn identifiers (CIK, CUSIP, ISIN) from any FMP response that carries them, e.g. profiles.
+        """
+        if isinstance(data, list):
+            self.update(record for record in data if isinstance(record, dict))
+
+    def _hit(self, results):
+        if results:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return results
+
+    def lookup_ticker(self, symbol):
+        with self._lock:
+            record = self._stocks.get((symbol or '').upper())
+            return dict(record) if record else None
+
+    def lookup_name(self, name):
+        """
+        Return the ticker whose normalized company name is exactly `name` ("snowflake" -> "SNOW"), or None.
+        Several listings of one company resolve to its primary US listing.
+        """
+        with self._lock:
+            symbols = list(self._names.exact(name))
+            if not symbols:
+                return None
+            return min(symbols, key=lambda symbol: (
+                self._stocks[symbol].get('exchangeShortName') not in PRIMARY_EXCHANGES, len(symbol), symbol,
+            ))
+
+    def lookup_cik(self, cik):
+        cik = str(cik).zfill(10)
+        with self._lock:
+            results = [{"cik": cik, "name": self._ciks[cik]}] if cik in self._ciks else []
+            results += [
+                {"cik": cik, "name": self._stocks[symbol].get('name'), "symbol": symbol}
+                for symbol in sorted(self._by_cik.get(cik, ()))
+            ]
+            return self._hit(results)
+
+    def lookup_cusip(self, cusip):
+        with self._lock:
+            symbol = self._by_cusip.get((cusip or '').upper())
+            results = [{"ticker": symbol, "cusip": cusip.upper(), "company": self._stocks[symbol].get('name')}] \
+                if symbol else []
+            return self._hit(results)
+
+    def lookup_isin(self, isin):
+        with self._lock:
+            symbol = self._by_isin.get((isin or '').upper())
+            results = [dict(self._stocks[symbol], isin=isin.upper())] if symbol else []
+            return self._hit(results)
+
+    def search(self, query, limit=10, exchange='', by_name_only=False):
+        """
+        Rank stocks for `query`: exact ticker, ticker prefix, name prefix, then fuzzy name match.
+        """
+        exchange = (exchange or '').upper()
+        limit = int(limit)
+        seen, results = set(), []
+
+        def collect(symbols):
+            for symbol in symbols:
+                if len(results) >= limit:
+                    return
+                record = self._stocks[symbol]
+                if symbol in seen or (exchange and record.get('exchangeShortName', '').upper() != exchange):
+                    continue
+                seen.add(symbol)
+                results.append(dict(record))
+
+        with self._lock:
+            if not by_name_only:
+                ticker = (query or '').upper()
+                if ticker in self._stocks:
+                    collect([ticker])
+                if ticker:
+                    collect(self._symbol_prefix(ticker))
+            collect(self._names.prefix(query))
+            if not results:
+                collect(self._names.fuzzy(query))
+            return self._hit(results)
+
+    def _symbol_prefix(self, prefix):
+        if not self._symbols_sorted:
+            self._symbols.sort()
+            self._symbols_sorted = True
+        position = bisect_left(self._symbols, prefix)
+        while position < len(self._symbols) and self._symbols[position].startswith(prefix):
+            yield self._symbols[position]
+            position += 1
+
+    def search_cik_names(self, query, limit=10):
+        with self._lock:
+            refs = list(self._cik_names.prefix(query))[:limit] or self._cik_names.fuzzy(query)[:limit]
+            return self._hit([{"cik": cik, "name": self._ciks[cik]} for cik in refs])
+
+    def refresh(self, stocks=None, ciks=None):
+        """
+        Rebuild the index from fresh /stock/list and /cik_list snapshots, so delisted and renamed
+        symbols and entities are dropped. Identifiers learned from profiles (see observe) are kept
+        for the symbols still listed. A failed or empty list leaves its part of the index as it is.
+        Returns how many records were added, changed or removed.
+        """
+        changed = 0
+        self.attempted_at = time.time()
+        fresh = SymbolIndex()
+        if isinstance(stocks, list) and stocks:
+            fresh.update(stocks)
+            with self._lock:
+                current = dict(self._stocks)
+            fresh.update(
+                {"symbol": symbol, **{field: current[symbol][field] for field in IDENTIFIERS
+                                      if current[symbol].get(field) and not record.get(field)}}
+                for symbol, record in list(fresh._stocks.items()) if symbol in current
+            )
+            with self._lock:
+                changed += _difference(self._stocks, fresh._stocks)
+                self._stocks, self._symbols, self._symbols_sorted = fresh._stocks, fresh._symbols, False
+                self._by_cik, self._by_cusip, self._by_isin = fresh._by_cik, fresh._by_cusip, fresh._by_isin
+                self._names = fresh._names
+        if isinstance(ciks, list) and ciks:
+            fresh.update_ciks(ciks)
+            with self._lock:
+                changed += _difference(self._ciks, fresh._ciks)
+                self._ciks, self._cik_names = fresh._ciks, fresh._cik_names
+        if isinstance(stocks, list) or isinstance(ciks, list):
+            self.refreshed_at = time.time()
+        return changed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "stocks": len(self._stocks),
+                "ciks": len(self._ciks),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshed_at": self.refreshed_at,
+            }
+
+    def save(self, path):
+        with self._lock:
+            snapshot = {
+                "refreshed_at": self.refreshed_at,
+                "stocks": list(self._stocks.values()),
+                "ciks": [{"cik": cik, "name": name} for cik, name in self._ciks.items()],
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path) as f:
+            snapshot = json.load(f)
+        index.update(snapshot.get("stocks", []))
+        index.update_ciks(snapshot.get("ciks", []))
+        index.refreshed_at = snapshot.get("refreshed_at", 0.0)
+        return index
+
+
+def _difference(old, new):
+    # Entries added, removed or changed between two {key: value} maps
+    return len(old.keys() ^ new.keys()) + sum(old[key] != new[key] for key in old.keys() & new.keys())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Return the process-wide symbol index, loading the on-disk snapshot if one is configured.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SymbolIndex.load(INDEX_PATH) if INDEX_PATH and os.path.exists(INDEX_PATH) else SymbolIndex()
+    return _index
+
+
+_warmer = None  # background thread loading or refreshing the index for loaded_index
+_refreshes = SingleFlight()  # one download and rebuild at a time, whichever of ensure_fresh / aensure_fresh starts it
+
+
+def _after_refresh(index, changed):
+    if changed and INDEX_PATH:
+        index.save(INDEX_PATH)
+    return index
+
+
+def _rebuild(index, stocks, ciks):
+    return _after_refresh(index, index.refresh(stocks, ciks))
+
+
+def _claim(index):
+    # Re-checked by the flight's leader: a refresh may have finished since the caller looked.
+    # Marking the attempt up front keeps later callers from starting another download.
+    if not index.is_stale():
+        return False
+    index.attempted_at = time.time()
+    return True
+
+
+def _refresh(index):
+    if _claim(index):
+        _rebuild(
+            index,
+            fetch_records(STOCK_LIST_URL.format(api_key=API_KEY), fields=STOCK_FIELDS),
+            fetch_records(CIK_LIST_URL.format(api_key=API_KEY), fields=CIK_FIELDS),
+        )
+    return index
+
+
+async def _arefresh(index):
+    if _claim(index):
+        stocks, ciks = await asyncio.gather(
+            afetch_records(STOCK_LIST_URL.format(api_key=API_KEY), fields=STOCK_FIELDS),
+            afetch_records(CIK_LIST_URL.format(api_key=API_KEY), fields=CIK_FIELDS),
+        )
+        # Rebuilding and saving a full universe takes seconds; keep it off the event loop
+        await asyncio.to_thread(_rebuild, index, stocks, ciks)
+    return index
+
+
+def ensure_fresh():
+    """
+    Return the index, refreshing it from FMP first when it is older than FMP_SYMBOL_INDEX_MAX_AGE.
+    Concurrent callers share one refresh.
+    """
+    index = get_index()
+    if index.is_stale():
+        _refreshes.do("symbol_index", lambda: _refresh(index))
+    return index
+
+
+async def aensure_fresh():
+    """
+    Async variant of ensure_fresh.
+    """
+    index = get_index()
+    if index.is_stale():
+        await _refreshes.ado("symbol_index", lambda: _arefresh(index))
+    return index
+
+
+def _warm():
+    global _warmer
+    with _index_lock:
+        if _warmer is None or not _warmer.is_alive():
+            _warmer = threading.Thread(target=ensure_fresh, name="symbol-index-refresh", daemon=True)
+            _warmer.start()
+
+
+def loaded_index():
+    """
+    Return the process-wide index if it holds any symbols, else None, without waiting on disk or
+    FMP: a missing or stale index is loaded and refreshed on a background thread. For the request
+    path, where answering without the index beats waiting for the symbol lists.
+    """
+    index = _index
+    if index is None or index.is_stale():
+        _warm()
+    return index if index is not None and len(index) else None
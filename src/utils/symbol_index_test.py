@@ -0,0 +1,119 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from src.utils import symbol_index
+from src.utils.symbol_index import SymbolIndex, normalize_name
+
+STOCKS = [
+    {"symbol": "SNOW", "name": "Snowflake Inc.", "exchange": "New York Stock Exchange", "exchangeShortName": "NYSE", "type": "stock"},
+    {"symbol": "AAPL", "name": "Apple Inc.", "exchange": "NASDAQ Global Select", "exchangeShortName": "NASDAQ", "type": "stock"},
+    {"symbol": "APLE", "name": "Apple Hospitality REIT, Inc.", "exchange": "New York Stock Exchange", "exchangeShortName": "NYSE", "type": "stock"},
+    {"symbol": "MSFT", "name": "Microsoft Corporation", "exchange": "NASDAQ Global Select", "exchangeShortName": "NASDAQ", "type": "stock"},
+]
+CIKS = [{"cik": "0001067983", "name": "BERKSHIRE HATHAWAY INC"}]
+
+
+class TestSymbolIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SymbolIndex()
+        self.index.refresh(STOCKS, CIKS)
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("Apple Inc."), "apple")
+        self.assertEqual(normalize_name("The Coca-Cola Company"), "coca cola")
+
+    def test_ticker_then_name_prefix(self):
+        self.assertEqual([r["symbol"] for r in self.index.search("snow")], ["SNOW"])
+        self.assertEqual([r["symbol"] for r in self.index.search("apple")], ["AAPL", "APLE"])
+        self.assertEqual([r["symbol"] for r in self.index.search("apple", exchange="NYSE")], ["APLE"])
+
+    def test_fuzzy_name_match(self):
+        self.assertEqual(self.index.search("snowflak corp")[0]["symbol"], "SNOW")
+        self.assertEqual(self.index.search("Mircosoft")[0]["symbol"], "MSFT")
+        self.assertEqual(self.index.search("zzzz"), [])
+
+    def test_identifier_lookups_learned_from_profiles(self):
+        self.assertEqual(self.index.lookup_isin("US0378331005"), [])
+        self.index.observe([{"symbol": "AAPL", "companyName": "Apple Inc.", "cik": "0000320193",
+                             "cusip": "037833100", "isin": "US0378331005"}])
+        self.assertEqual(self.index.lookup_isin("us0378331005")[0]["symbol"], "AAPL")
+        self.assertEqual(self.index.lookup_cusip("037833100")[0]["ticker"], "AAPL")
+        self.assertEqual(self.index.lookup_cik("320193")[0]["symbol"], "AAPL")
+        self.assertEqual(self.index.search_cik_names("berkshire")[0]["cik"], "0001067983")
+
+    def test_incremental_refresh_and_snapshot(self):
+        renamed = dict(STOCKS[0], name="Snowflake Data Cloud Inc.")
+        self.assertEqual(self.index.refresh([renamed] + STOCKS[1:]), 1)
+        self.assertEqual(self.index.search("snowflake data")[0]["symbol"], "SNOW")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.json")
+            self.index.save(path)
+            loaded = SymbolIndex.load(path)
+        self.assertEqual(loaded.search("microsoft")[0]["symbol"], "MSFT")
+        self.assertFalse(loaded.is_stale())
+
+    def test_refresh_drops_delisted_symbols_and_keeps_learned_identifiers(self):
+        self.index.observe([{"symbol": "AAPL", "companyName": "Apple Inc.", "cik": "0000320193",
+                             "cusip": "037833100", "isin": "US0378331005"},
+                            {"symbol": "APLE", "cusip": "03784Y200"}])
+        renamed = dict(STOCKS[0], symbol="SNOWX")
+        changed = self.index.refresh([renamed, STOCKS[1], STOCKS[3]], [{"cik": "0000320193", "name": "APPLE INC"}])
+        self.assertEqual(changed, 5)  # SNOW and APLE gone, SNOWX added; one CIK entity replaced by another
+        self.assertEqual(self.index.lookup_ticker("SNOW"), None)
+        self.assertEqual([r["symbol"] for r in self.index.search("snowflake")], ["SNOWX"])
+        self.assertEqual([r["symbol"] for r in self.index.search("apple")], ["AAPL"])
+        self.assertEqual(self.index.lookup_cusip("03784Y200"), [])
+        self.assertEqual(self.index.lookup_isin("US0378331005")[0]["symbol"], "AAPL")
+        self.assertEqual(self.index.search_cik_names("berkshire"), [])
+        # A failed download or an empty list keeps what the index has
+        self.assertEqual(self.index.refresh({"error": "Failed to fetch data. Status code: 503"}, []), 0)
+        self.assertEqual(len(self.index), 3)
+
+    def test_async_refresh_downloads_both_lists_at_once(self):
+        in_flight, overlapped = set(), []
+
+        async def afetch_records(url, fields=None):
+            in_flight.add(url)
+            await asyncio.sleep(0.01)
+            overlapped.append(len(in_flight))
+            in_flight.discard(url)
+            return STOCKS if "/stock/list" in url else CIKS
+
+        with mock.patch.object(symbol_index, "_index", SymbolIndex()), \
+                mock.patch.object(symbol_index, "afetch_records", afetch_records):
+            index = asyncio.run(symbol_index.aensure_fresh())
+        self.assertEqual(len(index), 4)
+        self.assertEqual(overlapped[0], 2)
+
+    def test_concurrent_callers_share_one_refresh_off_the_loop(self):
+        downloads, rebuilt_on = [], []
+        refresh = SymbolIndex.refresh
+
+        async def afetch_records(url, fields=None):
+            downloads.append(url)
+            await asyncio.sleep(0.01)
+            return STOCKS if "/stock/list" in url else CIKS
+
+        def record_thread(index, stocks=None, ciks=None):
+            rebuilt_on.append(threading.get_ident())
+            return refresh(index, stocks, ciks)
+
+        async def main():
+            return await asyncio.gather(*(symbol_index.aensure_fresh() for _ in range(5)))
+
+        with mock.patch.object(symbol_index, "_index", SymbolIndex()), \
+                mock.patch.object(symbol_index, "afetch_records", afetch_records), \
+                mock.patch.object(SymbolIndex, "refresh", record_thread):
+            indexes = asyncio.run(main())
+        self.assertEqual(len(downloads), 2)
+        self.assertEqual([len(index) for index in indexes], [4] * 5)
+        self.assertNotIn(threading.get_ident(), rebuilt_on)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,370 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .http_client import FetchError, astream_records, stream_records
+from .single_flight import SingleFlight
+
+# Compact symbol lists. The /stock/list, /available-traded/list and /etf/list
+# responses are tens of thousands of records; instead of keeping them as Python
+# dicts (per process, per cached response), each list is stored as a table of
+# NumPy columns: symbols as fixed-width bytes sorted for binary search, names in
+# one UTF-8 heap, exchanges and types dictionary-encoded, prices as float64, plus
+# a prebuilt row index per exchange. With FMP_SYMBOL_TABLE_DIR set, tables are
+# written once to a file that every process memory-maps read-only, so they share
+# one copy in the page cache and open instantly; records are read through
+# __slots__ views and only turned into dicts for the rows a tool returns.
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+TABLE_DIR = os.environ.get('FMP_SYMBOL_TABLE_DIR')  # directory of .fmptab files; unset keeps the tables in memory only
+TABLE_MAX_AGE = float(os.environ.get('FMP_SYMBOL_TABLE_MAX_AGE', 24 * 60 * 60))
+REFRESH_RETRY_DELAY = 5 * 60
+
+LISTS = {
+    "stocks": 'https://financialmodelingprep.com/api/v3/stock/list?apikey={api_key}',
+    "tradable": 'https://financialmodelingprep.com/api/v3/available-traded/list?apikey={api_key}',
+    "etfs": 'https://financialmodelingprep.com/api/v3/etf/list?apikey={api_key}',
+}
+ENCODED = ('exchange', 'exchangeShortName', 'type')  # few distinct values: stored as uint16 codes
+FIELDS = ('symbol', 'name', 'price', 'exchange', 'exchangeShortName', 'type')
+
+MAGIC = b'FMPTAB1\n'
+ALIGNMENT = 64
+
+logger = logging.getLogger(__name__)
+
+
+class StockRecord:
+    """
+    Read-only view of one row of a SymbolTable.
+    """
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    @property
+    def symbol(self):
+        return self._table.columns['symbol'][self._row].decode()
+
+    @property
+    def name(self):
+        return self._table.name(self._row)
+
+    @property
+    def price(self):
+        price = float(self._table.columns['price'][self._row])
+        return None if math.isnan(price) else price
+
+    @property
+    def exchange(self):
+        return self._table.label('exchange', self._row)
+
+    @property
+    def exchangeShortName(self):
+        return self._table.label('exchangeShortName', self._row)
+
+    @property
+    def type(self):
+        return self._table.label('type', self._row)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __repr__(self):
+        return f"StockRecord({self.to_dict()!r})"
+
+
+class SymbolTable:
+    """
+    Columnar symbol list sorted by symbol. `columns` holds the arrays (owned, or views into a
+    memory-mapped file), `labels` the values behind each dictionary-encoded column.
+    """
+
+    def __init__(self, columns, labels, built_at, path=None):
+        self.columns = columns
+        self.labels = labels
+        self.built_at = built_at
+        self.path = path
+        self._codes = {field: {label.upper(): code for code, label in enumerate(values)}
+                       for field, values in labels.items()}
+
+    def __len__(self):
+        return len(self.columns['symbol'])
+
+    def __getitem__(self, row):
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return StockRecord(self, row)
+
+    def __iter__(self):
+        return (StockRecord(self, row) for row in range(len(self)))
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    @classmethod
+    def build(cls, records, built_at=None):
+        """
+        Build from FMP list records (symbol, name, price, exchange, exchangeShortName, type).
+        """
+        by_symbol = {}
+        for record in records:
+            symbol = record.get('symbol')
+            if symbol:
+                by_symbol[symbol] = record
+        symbols = sorted(by_symbol, key=lambda symbol: symbol.encode())
+        rows = [by_symbol[symbol] for symbol in symbols]
+        encoded_names = [(row.get('name') or '').encode() for row in rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.uint32)
+        np.cumsum([len(name) for name in encoded_names], out=offsets[1:])
+        columns = {
+            'symbol': np.array([symbol.encode() for symbol in symbols], dtype=f"S{max(map(len, symbols), default=1)}"),
+            'name_offsets': offsets,
+            'name_data': np.frombuffer(b''.join(encoded_names), dtype=np.uint8).copy(),
+            'price': np.array([row.get('price') if isinstance(row.get('price'), (int, float)) else math.nan
+                               for row in rows], dtype=np.float64),
+        }
+        labels = {}
+        for field in ENCODED:
+            values = [row.get(field) or '' for row in rows]
+            labels[field] = sorted(set(values))
+            index = {label: code for code, label in enumerate(labels[field])}
+            columns[field] = np.array([index[value] for value in values], dtype=np.uint16)
+        # Exchange index: row numbers grouped by exchangeShortName code, with the start of each group
+        order = np.argsort(columns['exchangeShortName'], kind='stable').astype(np.uint32)
+        counts = np.bincount(columns['exchangeShortName'], minlength=len(labels['exchangeShortName']))
+        starts = np.zeros(len(counts) + 1, dtype=np.uint32)
+        np.cumsum(counts, out=starts[1:])
+        columns['exchange_rows'] = order
+        columns['exchange_starts'] = starts
+        return cls(columns, labels, time.time() if built_at is None else built_at)
+
+    def name(self, row):
+        offsets = self.columns['name_offsets']
+        return self.columns['name_data'][offsets[row]:offsets[row + 1]].tobytes().decode()
+
+    def label(self, field, row):
+        return self.labels[field][self.columns[field][row]] or None
+
+    def find(self, symbol):
+        """
+        The record of `symbol` (exact, case-insensitive), or None.
+        """
+        key = (symbol or '').strip().upper().encode()
+        symbols = self.columns['symbol']
+        row = int(np.searchsorted(symbols, key))
+        if row < len(symbols) and symbols[row] == key:
+            return StockRecord(self, row)
+        # Lists can hold lower-case suffixes; fall back to the symbol as given
+        key = (symbol or '').strip().encode()
+        row = int(np.searchsorted(symbols, key))
+        return StockRecord(self, row) if row < len(symbols) and symbols[row] == key else None
+
+    def exchange_rows(self, exchange):
+        """
+        Row numbers of the records listed on `exchange` (exchangeShortName, case-insensitive), in symbol order.
+        """
+        code = self._codes['exchangeShortName'].get((exchange or '').strip().upper())
+        if code is None:
+            return np.zeros(0, dtype=np.uint32)
+        starts = self.columns['exchange_starts']
+        return self.columns['exchange_rows'][starts[code]:starts[code + 1]]
+
+    def records(self, exchange=None, limit=None):
+        """
+        Records as dicts (the FMP list shape), optionally only those on `exchange` and at most `limit`.
+        """
+        rows = self.exchange_rows(exchange) if exchange else np.arange(len(self))
+        if limit is not None:
+            rows = rows[:max(0, int(limit))]
+        # Column by column: one NumPy gather per field instead of a StockRecord per row
+        offsets = self.columns['name_offsets']
+        data = self.columns['name_data'][offsets[0]:offsets[-1]].tobytes()
+        starts, ends = offsets[rows].tolist(), offsets[rows + 1].tolist()
+        columns = {
+            'symbol': [symbol.decode() for symbol in self.columns['symbol'][rows].tolist()],
+            'name': [data[start:end].decode() for start, end in zip(starts, ends)],
+            'price': [None if price != price else price for price in self.columns['price'][rows].tolist()],
+        }
+        for field in ENCODED:
+            labels = [label or None for label in self.labels[field]]
+            columns[field] = [labels[code] for code in self.columns[field][rows].tolist()]
+        return [dict(zip(FIELDS, values)) for values in zip(*(columns[field] for field in FIELDS))]
+
+    def stats(self):
+        return {"rows": len(self), "bytes": self.nbytes, "built_at": self.built_at, "mapped": self.path is not None,
+                "exchanges": len(self.labels['exchangeShortName'])}
+
+    def save(self, path):
+        """
+        Write the table as one file: magic, header length, JSON header, then each column aligned to 64 bytes.
+        The file is replaced atomically; processes that mapped the old one keep reading it.
+        """
+        layout, offset = {}, 0
+        for name, column in self.columns.items():
+            layout[name] = [column.dtype.str, len(column), offset]
+            offset += -(-column.nbytes // ALIGNMENT) * ALIGNMENT
+        header = json.dumps({"built_at": self.built_at, "labels": self.labels, "columns": layout}).encode()
+        start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            for name, column in self.columns.items():
+                f.seek(start + layout[name][2])
+                f.write(np.ascontiguousarray(column).tobytes())
+            f.truncate(start + offset)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map a saved table; the columns are zero-copy views into the file.
+        """
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        if buffer[:len(MAGIC)].tobytes() != MAGIC:
+            raise ValueError(f"{path} is not a symbol table")
+        header_length = struct.unpack('<Q', buffer[len(MAGIC):len(MAGIC) + 8].tobytes())[0]
+        header_end = len(MAGIC) + 8 + header_length
+        header = json.loads(buffer[len(MAGIC) + 8:header_end].tobytes())
+        start = -(-header_end // ALIGNMENT) * ALIGNMENT
+        columns = {name: np.frombuffer(buffer, dtype=np.dtype(dtype), count=length, offset=start + offset)
+                   for name, (dtype, length, offset) in header["columns"].items()}
+        return cls(columns, header["labels"], header["built_at"], path)
+
+
+def table_path(name, directory=TABLE_DIR):
+    return os.path.join(directory, f"{name}.fmptab") if directory else None
+
+
+class TableCache:
+    """
+    The tables of this process. A table is opened from its file when another process already built a
+    fresh one, and otherwise downloaded, built and (with a directory) saved for the other processes.
+    """
+
+    def __init__(self, directory=TABLE_DIR, max_age=TABLE_MAX_AGE, stream=stream_records, astream=astream_records):
+        self.directory = directory
+        self.max_age = max_age
+        self.stream = stream
+        self.astream = astream
+        self.tables = {}
+        self.mapped = {}  # name -> mtime of the file the table was opened from
+        self.attempted_at = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _fresh(self, table):
+        return table is not None and time.time() - table.built_at <= self.max_age
+
+    def _current(self, name):
+        # The table in memory, replaced by the file on disk when another process saved a newer one
+        with self._lock:
+            table = self.tables.get(name)
+            path = table_path(name, self.directory)
+            if path is None:
+                return table
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime != self.mapped.get(name):
+                    table = self.tables[name] = SymbolTable.open(path)
+                    self.mapped[name] = mtime
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning("cannot open symbol table %s: %s", path, e)
+            return table
+
+    def _install(self, name, records):
+        table = SymbolTable.build(records)
+        path = table_path(name, self.directory)
+        if path:
+            os.makedirs(self.directory, exist_ok=True)
+            table.save(path)
+            table = SymbolTable.open(path)
+        with self._lock:
+            if path:
+                self.mapped[name] = os.path.getmtime(path)
+            self.tables[name] = table
+        return table
+
+    def _should_download(self, name, table):
+        return not self._fresh(table) and time.time() - self.attempted_at.get(name, 0.0) > REFRESH_RETRY_DELAY
+
+    def _served(self, name, table):
+        if table is None:
+            raise FetchError({"error": f"The {name} list is not available yet; try again later"})
+        return table
+
+    def get(self, name):
+        """
+        The table for `name` (one of LISTS). Raises FetchError if it cannot be downloaded and no copy exists.
+        """
+        table = self._current(name)
+        if self._fresh(table):
+            return table
+        # Callers arriving while the list downloads (threads or tasks) wait for that download
+        return self._flight.do(name, lambda: self._load(name))
+
+    def _load(self, name):
+        table = self._current(name)
+        if not self._should_download(name, table):
+            return self._served(name, table)
+        self.attempted_at[name] = time.time()
+        try:
+            return self._install(name, self.stream(LISTS[name].format(api_key=API_KEY), fields=FIELDS))
+        except FetchError:
+            if table is None:
+                raise
+            logger.warning("refreshing the %s list failed; serving the copy from %s", name, table.built_at)
+            return table
+
+    async def aget(self, name):
+        """
+        Async variant of get.
+        """
+        table = self._current(name)
+        if self._fresh(table):
+            return table
+        return await self._flight.ado(name, lambda: self._aload(name))
+
+    async def _aload(self, name):
+        table = self._current(name)
+        if not self._should_download(name, table):
+            return self._served(name, table)
+        self.attempted_at[name] = time.time()
+        try:
+            records = [record async for record in self.astream(LISTS[name].format(api_key=API_KEY), fields=FIELDS)]
+        except FetchError:
+            if table is None:
+                raise
+            logger.warning("refreshing the %s list failed; serving the copy from %s", name, table.built_at)
+            return table
+        # Building and writing the table takes a while for the full lists: keep it off the event loop
+        return await asyncio.to_thread(self._install, name, records)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tables():
+    """
+    Return the process-wide table cache (tables under FMP_SYMBOL_TABLE_DIR when set).
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TableCache()
+    return _cache
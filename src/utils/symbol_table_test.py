@@ -0,0 +1,178 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from unittest import mock
+
+from src.bench.fmp_stub import FmpStub
+from src.utils import http_client, response_cache, symbol_index
+from src.utils.http_client import FetchError
+from src.utils.symbol_table import StockRecord, SymbolTable, TableCache
+
+EXCHANGES = (("NASDAQ Global Select", "NASDAQ"), ("New York Stock Exchange", "NYSE"), ("Euronext Paris", "EURONEXT"))
+
+
+def _records(n):
+    return [{"symbol": f"S{i:05d}" + (".PA" if i % 3 == 2 else ""), "name": f"Company number {i} Holdings Inc.",
+             "price": round(10 + i * 0.37, 2), "exchange": EXCHANGES[i % 3][0],
+             "exchangeShortName": EXCHANGES[i % 3][1], "type": "etf" if i % 5 == 0 else "stock"} for i in range(n)]
+
+
+def _lookup_in_child(path, symbol, results):
+    results.put(SymbolTable.open(path).find(symbol).to_dict())
+
+
+class TestSymbolTable(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lookups(self):
+        records = _records(300) + [{"symbol": "AAPL", "name": "Apple Inc.", "price": None, "exchange": None,
+                                    "exchangeShortName": "NASDAQ", "type": "stock"}]
+        table = SymbolTable.build(records)
+        self.assertEqual(len(table), 301)
+        self.assertEqual(table.find("aapl").to_dict(),
+                         {"symbol": "AAPL", "name": "Apple Inc.", "price": None, "exchange": None,
+                          "exchangeShortName": "NASDAQ", "type": "stock"})
+        self.assertEqual(table.find("S00002.PA").exchangeShortName, "EURONEXT")
+        self.assertIsNone(table.find("MISSING"))
+        self.assertIsNone(table.find("S00002.PAX"))
+        nyse = table.records("nyse")
+        self.assertEqual(len(nyse), 100)
+        self.assertEqual(nyse[0], records[1])
+        self.assertEqual([record["symbol"] for record in table.records("NASDAQ", limit=2)], ["AAPL", "S00000"])
+        self.assertEqual(table.records("LSE"), [])
+        self.assertEqual(len(table.records(limit=7)), 7)
+        self.assertIsInstance(table[0], StockRecord)
+        with self.assertRaises(AttributeError):
+            table[0].extra = 1  # __slots__ views carry no per-record dict
+
+    def test_memory_mapped_file(self):
+        path = os.path.join(self.directory, "stocks.fmptab")
+        table = SymbolTable.build(_records(1000))
+        table.save(path)
+        mapped = SymbolTable.open(path)
+        self.assertEqual(mapped.records(), table.records())
+        self.assertEqual(mapped.records("EURONEXT", 5), table.records("EURONEXT", 5))
+        self.assertEqual(mapped.built_at, table.built_at)
+        self.assertFalse(mapped.columns["symbol"].flags.owndata)
+        # Another process opens the same file
+        results = multiprocessing.get_context("spawn").Queue()
+        child = multiprocessing.get_context("spawn").Process(target=_lookup_in_child, args=(path, "s00004", results))
+        child.start()
+        self.assertEqual(results.get(timeout=60), table.find("S00004").to_dict())
+        child.join()
+        with open(os.path.join(self.directory, "bad.fmptab"), "wb") as f:
+            f.write(b"not a table" * 10)
+        with self.assertRaises(ValueError):
+            SymbolTable.open(os.path.join(self.directory, "bad.fmptab"))
+
+    def test_an_order_of_magnitude_smaller_than_dicts(self):
+        text = json.dumps(_records(50000))
+        tracemalloc.start()
+        try:
+            records = json.loads(text)
+            as_dicts = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        table = SymbolTable.build(records)
+        self.assertGreater(as_dicts / table.nbytes, 8)
+
+
+class TestTableCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.downloads = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _stream(self, url, fields=None):
+        self.downloads += 1
+        return iter(_records(50))
+
+    async def _astream(self, url, fields=None):
+        self.downloads += 1
+        for record in _records(20):
+            yield record
+
+    def test_built_once_then_shared_through_the_file(self):
+        cache = TableCache(self.directory, stream=self._stream)
+        table = cache.get("stocks")
+        self.assertEqual(len(table), 50)
+        self.assertIs(cache.get("stocks"), table)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "stocks.fmptab")))
+        # A second process finds the fresh file and does not download
+        other = TableCache(self.directory, stream=self._stream)
+        self.assertEqual(other.get("stocks").records(), table.records())
+        self.assertEqual(self.downloads, 1)
+        # A rebuild by one process is picked up by the other
+        time.sleep(0.01)
+        other.tables["stocks"].built_at = 0.0
+        other.attempted_at.clear()
+        other._install("stocks", _records(60))
+        self.assertEqual(len(cache.get("stocks")), 60)
+
+    def test_async_and_failures(self):
+        def failing(url, fields=None):
+            raise FetchError({"error": "Failed to fetch data. Status code: 503"})
+
+        cache = TableCache(None, stream=failing, astream=self._astream)
+        with self.assertRaises(FetchError):
+            cache.get("etfs")
+        with self.assertRaises(FetchError) as raised:
+            cache.get("etfs")
+        self.assertIn("not available yet", str(raised.exception))
+        cache.attempted_at.clear()
+        self.assertEqual(len(asyncio.run(cache.aget("etfs"))), 20)
+        # A failed refresh keeps serving the old table
+        cache.tables["etfs"].built_at = 0.0
+        cache.attempted_at.clear()
+        self.assertEqual(len(cache.get("etfs")), 20)
+
+    def test_concurrent_cold_start_shares_one_download(self):
+        async def slow_astream(url, fields=None):
+            self.downloads += 1
+            await asyncio.sleep(0.05)
+            for record in _records(30):
+                yield record
+
+        async def main():
+            cache = TableCache(None, astream=slow_astream)
+            return await asyncio.gather(cache.aget("stocks"), cache.aget("stocks"), cache.aget("stocks"))
+
+        tables = asyncio.run(main())
+        self.assertEqual([len(table) for table in tables], [30, 30, 30])
+        self.assertIs(tables[0], tables[2])
+        self.assertEqual(self.downloads, 1)
+
+    def test_lists_are_not_kept_as_dicts_in_the_response_cache(self):
+        stub = FmpStub(rows=2000)
+        http_client.configure(base_url=stub.start())
+        try:
+            response_cache.get_cache().clear()
+            table = TableCache(None).get("stocks")
+            with mock.patch.object(symbol_index, "_index", symbol_index.SymbolIndex()):
+                index = symbol_index.ensure_fresh()
+            key = response_cache.cache_key(symbol_index.STOCK_LIST_URL.format(api_key="x"))
+            self.assertIsNone(response_cache.get_cache().get(key))
+        finally:
+            http_client.configure(base_url="")
+            stub.stop()
+        self.assertEqual(len(table), 2000)
+        self.assertEqual(len(index), 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,411 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from .http_client import afetch_data, fetch_data
+
+# Local store for daily history (market capitalization, prices). Each symbol's
+# series is kept as one .npy file per column, memory-mapped on load, together
+# with the date ranges already fetched. Queries only download the parts of the
+# requested range that are not covered yet; slicing and resampling are local.
+# Adjusted values change after splits and dividends, so coverage expires after
+# COVERAGE_TTL and is dropped as soon as a download disagrees with a stored day.
+
+API_KEY = os.environ.get('FINANCIAL_MODELING_PREP_API_KEY')
+STORE_PATH = os.environ.get('FMP_TIMESERIES_PATH')  # directory; unset keeps the series in memory only
+COVERAGE_TTL = float(os.environ.get('FMP_TIMESERIES_TTL', 7 * 24 * 3600))  # seconds
+
+SERIES = {
+    "market_cap": {
+        "url": 'https://financialmodelingprep.com/api/v3/historical-market-capitalization/{symbol}'
+               '?from={start}&to={end}&limit=100000&apikey={api_key}',
+        "fields": ("marketCap",),
+    },
+    "price": {
+        "url": 'https://financialmodelingprep.com/api/v3/historical-price-full/{symbol}'
+               '?from={start}&to={end}&apikey={api_key}',
+        "fields": ("open", "high", "low", "close", "adjClose", "volume"),
+        "adjusted": ("adjClose",),
+    },
+}
+# How a column is aggregated when resampling; anything not listed keeps the last value of the bucket
+AGGREGATIONS = {"open": "first", "high": "max", "low": "min", "volume": "sum"}
+FREQUENCIES = ("daily", "weekly", "monthly", "quarterly", "yearly")
+# Calendar days spanned by one row of each frequency, to turn a row limit into a date range
+_DAYS_PER_ROW = {"daily": 1.5, "weekly": 7, "monthly": 31, "quarterly": 92, "yearly": 366}
+DEFAULT_LOOKBACK_DAYS = 365
+
+_unsafe = re.compile(r'[^A-Z0-9.\-^_]')
+
+
+def _day(value):
+    try:
+        return int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value} (expected YYYY-MM-DD)") from None
+
+
+def _iso(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+def _today():
+    return int(np.datetime64('today', 'D').astype(np.int64))
+
+
+def missing_ranges(covered, start, end):
+    """
+    Return the (start, end) day ranges within [start, end] that the sorted, merged `covered` ranges do not include.
+    """
+    missing, cursor = [], start
+    for low, high in covered:
+        if high < cursor:
+            continue
+        if low > end:
+            break
+        if low > cursor:
+            missing.append((cursor, low - 1))
+        cursor = max(cursor, high + 1)
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+def add_range(covered, start, end):
+    """
+    Return `covered` with [start, end] added, keeping ranges sorted and merging adjacent ones.
+    """
+    ranges = sorted(list(covered) + [(start, end)])
+    merged = [list(ranges[0])]
+    for low, high in ranges[1:]:
+        if low <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return [tuple(item) for item in merged]
+
+
+class Series:
+    """
+    Daily history of one symbol: ascending `dates` (datetime64[D]), one float64 array per field,
+    the `covered` day ranges that have been fetched (trading days without rows included) and when
+    the oldest of them was fetched (`covered_at`, epoch seconds).
+    """
+
+    def __init__(self, fields, dates=None, columns=None, covered=None, covered_at=None, adjusted=()):
+        self.dates = dates if dates is not None else np.array([], dtype='datetime64[D]')
+        self.columns = columns or {field: np.array([], dtype=np.float64) for field in fields}
+        self.covered = covered or []
+        self.covered_at = covered_at
+        self.adjusted = adjusted
+        self.version = 0
+
+    def expire(self, ttl, now=None):
+        """
+        Forget the coverage once it is older than `ttl` seconds, so the stored rows are refreshed.
+        """
+        now = now if now is not None else time.time()
+        if self.covered and (self.covered_at is None or now - self.covered_at > ttl):
+            self.covered = []
+
+    def _restated(self, new_dates, rows):
+        # An adjusted value that differs from the stored one: history was restated (split, dividend)
+        _, new_index, old_index = np.intersect1d(new_dates, self.dates, return_indices=True)
+        for field in self.adjusted:
+            new_values = np.array([_number(rows[i].get(field)) for i in new_index], dtype=np.float64)
+            old_values = self.columns[field][old_index]
+            both = ~(np.isnan(new_values) | np.isnan(old_values))
+            if not np.allclose(new_values[both], old_values[both], rtol=1e-6, atol=0.0):
+                return True
+        return False
+
+    def merge(self, rows, start, end):
+        new_dates = np.array([row['date'][:10] for row in rows], dtype='datetime64[D]')
+        if rows and len(self.dates) and self._restated(new_dates, rows):
+            self.covered = []
+        dates = np.concatenate([new_dates, self.dates])
+        # First occurrence wins, so fresh rows replace stored ones for the same day
+        dates, first = np.unique(dates, return_index=True)
+        for field in self.columns:
+            new_values = np.array([_number(row.get(field)) for row in rows], dtype=np.float64)
+            self.columns[field] = np.concatenate([new_values, self.columns[field]])[first]
+        self.dates = dates
+        # An empty answer for a symbol with no rows yet (unknown symbol, outage) is not remembered
+        # as coverage; for a known symbol it is a range without trading days
+        if (rows or len(self.dates)) and end >= start:
+            if not self.covered:
+                self.covered_at = time.time()
+            self.covered = add_range(self.covered, start, end)
+        self.version += 1
+
+    def snapshot(self):
+        return self.version, self.dates, dict(self.columns), list(self.covered), self.covered_at
+
+    def slice(self, start, end):
+        low = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        high = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        return self.dates[low:high], {field: values[low:high] for field, values in self.columns.items()}
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def _rows(kind, data):
+    if kind == "price":
+        return data.get("historical", []) if isinstance(data, dict) else []
+    return data if isinstance(data, list) else []
+
+
+def _bucket_keys(dates, frequency):
+    days = dates.astype(np.int64)
+    if frequency == "weekly":
+        return (days + 3) // 7  # 1970-01-01 was a Thursday; weeks start on Monday
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    if frequency == "monthly":
+        return months
+    if frequency == "quarterly":
+        return months // 3
+    return dates.astype('datetime64[Y]').astype(np.int64)
+
+
+def resample(dates, columns, frequency):
+    """
+    Aggregate daily `columns` into weekly/monthly/quarterly/yearly buckets labelled with the bucket's
+    last date. Columns are aggregated per AGGREGATIONS (last value by default).
+    """
+    if frequency == "daily" or len(dates) == 0:
+        return dates, columns
+    keys = _bucket_keys(dates, frequency)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    resampled = {}
+    for field, values in columns.items():
+        how = AGGREGATIONS.get(field, "last")
+        if how == "first":
+            resampled[field] = values[starts]
+        elif how == "max":
+            resampled[field] = np.fmax.reduceat(values, starts)
+        elif how == "min":
+            resampled[field] = np.fmin.reduceat(values, starts)
+        elif how == "sum":
+            resampled[field] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            resampled[field] = values[ends]
+    return dates[ends], resampled
+
+
+class TimeSeriesStore:
+    """
+    Per-(kind, symbol) Series, persisted under `path` when one is given.
+    """
+
+    def __init__(self, path=STORE_PATH, fetch=fetch_data, afetch=afetch_data, ttl=COVERAGE_TTL):
+        self.path = path
+        self._fetch = fetch
+        self._afetch = afetch
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._series = {}
+        self._write_locks = {}  # (kind, symbol) -> (lock, last version written)
+        self.queries = 0
+        self.local_queries = 0  # answered without any download
+        self.range_fetches = 0
+
+    def _directory(self, kind, symbol):
+        return os.path.join(self.path, kind, _unsafe.sub('_', symbol))
+
+    def _load(self, kind, symbol):
+        key = (kind, symbol)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._read(kind, symbol) if self.path else None
+                series = series or Series(SERIES[kind]["fields"], adjusted=SERIES[kind].get("adjusted", ()))
+                self._series[key] = series
+            return series
+
+    def _read(self, kind, symbol):
+        directory = self._directory(kind, symbol)
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+            dates = np.load(os.path.join(directory, "dates.npy"), mmap_mode='r')
+            columns = {
+                field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode='r')
+                for field in SERIES[kind]["fields"]
+            }
+        except (OSError, ValueError):
+            return None
+        if any(len(values) != len(dates) for values in columns.values()):
+            return None  # interrupted write: refetch rather than serve misaligned columns
+        return Series(SERIES[kind]["fields"], dates, columns, [tuple(item) for item in meta["covered"]],
+                      meta.get("covered_at"), SERIES[kind].get("adjusted", ()))
+
+    def _write(self, kind, symbol, snapshot):
+        """
+        Persist a Series.snapshot(). Runs outside the store lock; writes of one series are
+        serialized and an older snapshot never replaces a newer one.
+        """
+        version, dates, columns, covered, covered_at = snapshot
+        with self._lock:
+            entry = self._write_locks.setdefault((kind, symbol), [threading.Lock(), 0])
+        with entry[0]:
+            if version <= entry[1]:
+                return
+            directory = self._directory(kind, symbol)
+            os.makedirs(directory, exist_ok=True)
+            for name, values in dict(columns, dates=dates).items():
+                tmp_path = os.path.join(directory, f"{name}.{os.getpid()}.tmp.npy")
+                np.save(tmp_path, np.ascontiguousarray(values))
+                os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+            # Coverage is written last: after a crash it can only under-report what is on disk
+            tmp_path = os.path.join(directory, f"meta.json.{os.getpid()}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump({"covered": covered, "covered_at": covered_at}, f)
+            os.replace(tmp_path, os.path.join(directory, "meta.json"))
+            entry[1] = version
+
+    def _plan(self, kind, symbol, start, end):
+        series = self._load(kind, symbol)
+        with self._lock:
+            self.queries += 1
+            series.expire(self.ttl)
+            missing = missing_ranges(series.covered, start, end)
+            if not missing:
+                self.local_queries += 1
+            return series, missing
+
+    def _url(self, kind, symbol, start, end):
+        return SERIES[kind]["url"].format(symbol=symbol, start=_iso(start), end=_iso(end), api_key=API_KEY)
+
+    def _merge(self, kind, series, start, end, data):
+        """
+        Merge a downloaded range into `series`; returns the error dict of a failed download, else
+        the snapshot to persist (None without a store path).
+        """
+        if isinstance(data, dict) and "error" in data:
+            return data, None
+        with self._lock:
+            self.range_fetches += 1
+            # Today's bar is still moving: keep the row but never record the day as covered
+            series.merge(_rows(kind, data), start, min(end, _today() - 1))
+            return None, series.snapshot() if self.path else None
+
+    def _slice(self, series, start, end):
+        with self._lock:
+            return series.slice(start, end)
+
+    def get_range(self, kind, symbol, start, end):
+        """
+        Return (dates, {field: values}) of `kind` history for `symbol` between the `start` and `end`
+        days (inclusive), downloading only the uncovered parts. Returns an error dict on failure.
+        """
+        symbol = symbol.upper()
+        series, missing = self._plan(kind, symbol, start, end)
+        for low, high in missing:
+            error, snapshot = self._merge(kind, series, low, high, self._fetch(self._url(kind, symbol, low, high)))
+            if error:
+                return error
+            if snapshot:
+                self._write(kind, symbol, snapshot)
+        return self._slice(series, start, end)
+
+    async def aget_range(self, kind, symbol, start, end):
+        """
+        Async variant of get_range.
+        """
+        symbol = symbol.upper()
+        series, missing = self._plan(kind, symbol, start, end)
+        for low, high in missing:
+            data = await self._afetch(self._url(kind, symbol, low, high))
+            error, snapshot = self._merge(kind, series, low, high, data)
+            if error:
+                return error
+            if snapshot:
+                await asyncio.to_thread(self._write, kind, symbol, snapshot)
+        return self._slice(series, start, end)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "queries": self.queries,
+                "local_queries": self.local_queries,
+                "range_fetches": self.range_fetches,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the process-wide time-series store.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TimeSeriesStore()
+    return _store
+
+
+def _query(from_date, to_date, limit, frequency):
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency: {frequency}. Use one of {', '.join(FREQUENCIES)}")
+    end = _day(to_date) if to_date else _today()
+    if from_date:
+        start = _day(from_date)
+    elif limit:
+        start = end - int(int(limit) * _DAYS_PER_ROW[frequency]) - 7
+    else:
+        start = end - DEFAULT_LOOKBACK_DAYS
+    if start > end:
+        raise ValueError("from_date is after to_date")
+    return start, end
+
+
+def _records(symbol, result, limit, frequency):
+    if isinstance(result, dict):
+        return result
+    dates, columns = resample(*result, frequency)
+    rows = []
+    for i in range(len(dates) - 1, -1, -1):  # newest first, like FMP
+        row = {"symbol": symbol.upper(), "date": str(dates[i])}
+        row.update({field: None if np.isnan(values[i]) else float(values[i]) for field, values in columns.items()})
+        rows.append(row)
+        if limit and len(rows) >= int(limit):
+            break
+    return rows
+
+
+def history(kind, symbol, from_date=None, to_date=None, limit=None, frequency="daily"):
+    """
+    Return `kind` ("market_cap" or "price") history rows for `symbol`, newest first, resampled to
+    `frequency`. Without `from_date` the range is sized to hold `limit` rows. Returns an error dict on failure.
+    """
+    try:
+        start, end = _query(from_date, to_date, limit, frequency)
+    except ValueError as exc:
+        return {"error": str(exc)}
+    return _records(symbol, get_store().get_range(kind, symbol, start, end), limit, frequency)
+
+
+async def ahistory(kind, symbol, from_date=None, to_date=None, limit=None, frequency="daily"):
+    """
+    Async variant of history.
+    """
+    try:
+        start, end = _query(from_date, to_date, limit, frequency)
+    except ValueError as exc:
+        return {"error": str(exc)}
+    return _records(symbol, await get_store().aget_range(kind, symbol, start, end), limit, frequency)
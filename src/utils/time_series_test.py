@@ -0,0 +1,133 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from src.utils.time_series import TimeSeriesStore, add_range, missing_ranges, resample
+
+
+class _FakeFMP:
+
+    def __init__(self):
+        self.ranges = []
+        self.adjustment = 1.0
+        self.known = True
+
+    def fetch(self, url):
+        params = parse_qs(urlsplit(url).query)
+        start, end = np.datetime64(params["from"][0]), np.datetime64(params["to"][0])
+        self.ranges.append((str(start), str(end)))
+        if not self.known:
+            return {}
+        days = np.arange(start, end + 1)
+        weekdays = days[(days.astype(np.int64) + 3) % 7 < 5]
+        if "historical-price-full" in url:
+            return {"symbol": "AAPL", "historical": [
+                {"date": str(day), "open": 1.0, "high": 2.0, "low": 0.5, "close": float(day.astype(np.int64)),
+                 "adjClose": self.adjustment, "volume": 10} for day in weekdays[::-1]
+            ]}
+        return [{"symbol": "AAPL", "date": str(day), "marketCap": float(day.astype(np.int64))} for day in weekdays[::-1]]
+
+    async def afetch(self, url):
+        return self.fetch(url)
+
+
+def _day(text):
+    return int(np.datetime64(text).astype(np.int64))
+
+
+class TestTimeSeries(unittest.TestCase):
+
+    def test_range_arithmetic(self):
+        covered = add_range(add_range([], 10, 20), 21, 25)
+        self.assertEqual(covered, [(10, 25)])
+        self.assertEqual(missing_ranges(add_range(covered, 40, 50), 0, 60), [(0, 9), (26, 39), (51, 60)])
+        self.assertEqual(missing_ranges(covered, 12, 18), [])
+
+    def test_only_missing_ranges_are_fetched_and_persisted(self):
+        fake = _FakeFMP()
+        with tempfile.TemporaryDirectory() as path:
+            store = TimeSeriesStore(path, fake.fetch, fake.afetch)
+            dates, columns = store.get_range("market_cap", "aapl", _day("2024-01-01"), _day("2024-01-31"))
+            self.assertEqual(len(dates), 23)
+            store.get_range("market_cap", "AAPL", _day("2024-01-10"), _day("2024-02-10"))
+            self.assertEqual(fake.ranges, [("2024-01-01", "2024-01-31"), ("2024-02-01", "2024-02-10")])
+            self.assertEqual(store.stats()["local_queries"], 0)
+
+            # A new process reopens the memory-mapped columns and answers locally
+            reopened = TimeSeriesStore(path, fake.fetch, fake.afetch)
+            dates, columns = reopened.get_range("market_cap", "AAPL", _day("2024-01-15"), _day("2024-02-05"))
+            self.assertEqual(len(fake.ranges), 2)
+            self.assertEqual(reopened.stats()["local_queries"], 1)
+            self.assertEqual(str(dates[0]), "2024-01-15")
+            self.assertEqual(columns["marketCap"][0], _day("2024-01-15"))
+
+    def test_empty_answers_are_not_cached(self):
+        fake = _FakeFMP()
+        fake.known = False
+        store = TimeSeriesStore(None, fake.fetch, fake.afetch)
+        dates, _ = store.get_range("price", "NEWCO", _day("2024-01-01"), _day("2024-01-31"))
+        self.assertEqual(len(dates), 0)
+        fake.known = True  # listed since
+        dates, _ = store.get_range("price", "NEWCO", _day("2024-01-01"), _day("2024-01-31"))
+        self.assertEqual(len(dates), 23)
+        # A range without trading days of a known symbol is covered
+        store.get_range("price", "NEWCO", _day("2024-02-03"), _day("2024-02-04"))
+        store.get_range("price", "NEWCO", _day("2024-02-03"), _day("2024-02-04"))
+        self.assertEqual(len(fake.ranges), 3)
+
+    def test_coverage_expires_and_restatements_invalidate_it(self):
+        fake = _FakeFMP()
+        with tempfile.TemporaryDirectory() as path:
+            store = TimeSeriesStore(path, fake.fetch, fake.afetch, ttl=3600)
+            store.get_range("price", "AAPL", _day("2024-01-01"), _day("2024-01-31"))
+            series = store._load("price", "AAPL")
+            series.covered_at -= 7200
+            dates, columns = store.get_range("price", "AAPL", _day("2024-01-10"), _day("2024-01-20"))
+            self.assertEqual(fake.ranges[-1], ("2024-01-10", "2024-01-20"))
+            # A split: the overlapping days come back with other adjusted prices
+            fake.adjustment = 0.25
+            store.get_range("price", "AAPL", _day("2024-01-15"), _day("2024-02-15"))
+            dates, columns = store.get_range("price", "AAPL", _day("2024-01-01"), _day("2024-02-15"))
+            self.assertEqual(fake.ranges[-2:], [("2024-01-21", "2024-02-15"), ("2024-01-01", "2024-01-20")])
+            self.assertTrue(np.all(columns["adjClose"] == 0.25))
+            self.assertEqual(len(fake.ranges), 4)
+
+    def test_async_writes_happen_off_the_event_loop(self):
+        fake = _FakeFMP()
+        with tempfile.TemporaryDirectory() as path:
+            store = TimeSeriesStore(path, fake.fetch, fake.afetch)
+            on_loop = []
+            write = store._write
+
+            def recording_write(*args):
+                try:
+                    on_loop.append(asyncio.get_running_loop() is not None)
+                except RuntimeError:
+                    on_loop.append(False)
+                write(*args)
+
+            store._write = recording_write
+            dates, _ = asyncio.run(store.aget_range("market_cap", "AAPL", _day("2024-01-01"), _day("2024-01-31")))
+            self.assertEqual(len(dates), 23)
+            self.assertEqual(on_loop, [False])
+            self.assertTrue(os.path.exists(os.path.join(path, "market_cap", "AAPL", "meta.json")))
+
+    def test_resample(self):
+        fake = _FakeFMP()
+        store = TimeSeriesStore(None, fake.fetch, fake.afetch)
+        dates, columns = store.get_range("price", "AAPL", _day("2024-01-01"), _day("2024-03-31"))
+        monthly_dates, monthly = resample(dates, columns, "monthly")
+        self.assertEqual([str(day) for day in monthly_dates], ["2024-01-31", "2024-02-29", "2024-03-29"])
+        self.assertEqual(monthly["close"][0], _day("2024-01-31"))
+        self.assertEqual(monthly["volume"][0], 230)
+        self.assertEqual(monthly["high"][1], 2.0)
+        weekly_dates, _ = resample(dates, columns, "weekly")
+        self.assertEqual(str(weekly_dates[0]), "2024-01-05")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+
+# Tool lifecycle events. Every registered tool is wrapped with observed(), which
+# emits a "tool_start" event before the call and a "tool_end" event (with its
+# duration, result and whether it returned an error) after it; the HTTP client
+# emits a "fetch" event with the cache key of every FMP response a tool used and
+# an "http" event per upstream request, and utils.metrics an "llm" event per LLM
+# call. Front ends subscribe with add_listener() to show progress while the
+# agent works; recording() collects the events of one turn in the current context.
+
+logger = logging.getLogger(__name__)
+
+_listeners = []
+_lock = threading.Lock()
+_recording = contextvars.ContextVar('tool_events_recording', default=())
+
+
+def add_listener(listener):
+    """
+    Call `listener(event)` for every tool event; `event` is a dict with at least "type" and "tool".
+    """
+    with _lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+@contextlib.contextmanager
+def recording(events=None):
+    """
+    Collect the events emitted in the current context (this thread or asyncio task) into the yielded list,
+    or into `events` to continue an earlier recording. Recordings nest: an event goes to every recording
+    active in its context.
+    """
+    events = events if events is not None else []
+    token = _recording.set(_recording.get() + (events,))
+    try:
+        yield events
+    finally:
+        _recording.reset(token)
+
+
+def emit(event_type, tool_name=None, **fields):
+    recordings = _recording.get()
+    with _lock:
+        listeners = list(_listeners)
+    if not listeners and not recordings:
+        return
+    event = dict(fields, type=event_type, tool=tool_name)
+    for recorded in recordings:
+        recorded.append(event)
+    for listener in listeners:
+        try:
+            listener(event)
+        except Exception:
+            # A broken progress display must never fail the tool call
+            logger.exception("tool event listener failed")
+
+
+def _is_error(result):
+    return isinstance(result, dict) and "error" in result
+
+
+def observed(fn, tool_name=None):
+    """
+    Wrap a tool function (sync or async) so its calls emit tool_start/tool_end events.
+    The wrapper keeps the original name, docstring and signature for FunctionTool.
+    """
+    tool_name = tool_name or fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            emit("tool_start", tool_name, arguments=kwargs or list(args))
+            started = time.perf_counter()
+            result, ok = None, False
+            try:
+                result = await fn(*args, **kwargs)
+                ok = not _is_error(result)
+                return result
+            finally:
+                emit("tool_end", tool_name, duration=time.perf_counter() - started, ok=ok, result=result)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        emit("tool_start", tool_name, arguments=kwargs or list(args))
+        started = time.perf_counter()
+        result, ok = None, False
+        try:
+            result = fn(*args, **kwargs)
+            ok = not _is_error(result)
+            return result
+        finally:
+            emit("tool_end", tool_name, duration=time.perf_counter() - started, ok=ok, result=result)
+    return wrapper
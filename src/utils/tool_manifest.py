@@ -0,0 +1,187 @@
+import copy
+import hashlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from llama_index.core.tools import FunctionTool, ToolMetadata
+from pydantic import BaseModel
+
+from .result_shaping import shaped
+from .tool_events import observed
+
+# Precomputed tool manifest: name, description and JSON schema of every tool in
+# the functions directory, cached on disk and invalidated per file by mtime,
+# size and content hash. Tools registered from it import their module and
+# build nothing until first invoked.
+
+MANIFEST_VERSION = 1
+MANIFEST_FILENAME = ".tool_manifest.json"
+MANIFEST_PATH = os.environ.get('FMP_TOOL_MANIFEST_PATH')  # defaults to <functions dir>/.tool_manifest.json
+
+
+class ManifestSchema(BaseModel):
+    """
+    Stand-in fn_schema that serves the cached JSON schema instead of introspecting the function.
+    """
+
+    @classmethod
+    def model_json_schema(cls, *args, **kwargs):
+        return copy.deepcopy(cls.__manifest_schema__)
+
+
+def _schema_model(name, schema):
+    return type(name, (ManifestSchema,), {"__manifest_schema__": schema})
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _describe_module(module_path):
+    # Imported here: data_utils imports this module
+    from .data_utils import module_tools
+
+    module = importlib.import_module(module_path)
+    entries = []
+    for tool in module_tools(module):
+        entries.append({
+            "name": tool.metadata.name,
+            "description": tool.metadata.description,
+            "schema": tool.metadata.fn_schema.model_json_schema(),
+            "has_async": tool.async_fn.__name__ == f"a{tool.metadata.name}",
+        })
+    return entries
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def _write_manifest(path, files):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "files": files}, f, indent=1)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # read-only checkout: keep working from the in-memory manifest
+
+
+def build_manifest(directory_path, module_base, manifest_path=None):
+    """
+    Return {filename: entry} for the tool modules in `directory_path`, reusing cached entries
+    whose file is unchanged and re-introspecting only the modules that changed.
+    """
+    manifest_path = manifest_path or MANIFEST_PATH or os.path.join(directory_path, MANIFEST_FILENAME)
+    cached = _read_manifest(manifest_path)
+    files, dirty = {}, False
+    for filename in sorted(os.listdir(directory_path)):
+        if not filename.endswith(".py") or filename == "__init__.py":
+            continue
+        path = os.path.join(directory_path, filename)
+        stat = os.stat(path)
+        entry = cached.get(filename)
+        if entry is not None and (entry["mtime_ns"], entry["size"]) != (stat.st_mtime_ns, stat.st_size):
+            digest = _file_digest(path)
+            if entry["sha256"] == digest:
+                entry = dict(entry, mtime_ns=stat.st_mtime_ns, size=stat.st_size)  # touched, not changed
+            else:
+                entry = None
+            dirty = True
+        if entry is None:
+            entry = {
+                "module": f"{module_base}.{filename[:-3]}",
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha256": _file_digest(path),
+                "tools": _describe_module(f"{module_base}.{filename[:-3]}"),
+            }
+            dirty = True
+        files[filename] = entry
+    if dirty or set(files) != set(cached):
+        _write_manifest(manifest_path, files)
+    return files
+
+
+def _lazy_functions(module_path, name, has_async):
+    resolved = {}
+    lock = threading.Lock()
+
+    def resolve(attr_name):
+        if attr_name not in resolved:
+            with lock:
+                if attr_name not in resolved:
+                    module = importlib.import_module(module_path)
+                    resolved[attr_name] = observed(shaped(getattr(module, attr_name), name), name)
+        return resolved[attr_name]
+
+    def fn(*args, **kwargs):
+        return resolve(name)(*args, **kwargs)
+
+    async def async_fn(*args, **kwargs):
+        return await resolve(f"a{name}")(*args, **kwargs)
+
+    fn.__name__ = fn.__qualname__ = name
+    async_fn.__name__ = async_fn.__qualname__ = f"a{name}"
+    return fn, (async_fn if has_async else None)
+
+
+def load_tools_from_manifest(directory_path, module_base, manifest_path=None):
+    """
+    Register every tool from the manifest without importing the tool modules.
+    """
+    tools = []
+    for entry in build_manifest(directory_path, module_base, manifest_path).values():
+        for tool in entry["tools"]:
+            fn, async_fn = _lazy_functions(entry["module"], tool["name"], tool["has_async"])
+            metadata = ToolMetadata(
+                name=tool["name"],
+                description=tool["description"],
+                fn_schema=_schema_model(tool["name"], tool["schema"]),
+            )
+            tools.append(FunctionTool(fn=fn, metadata=metadata, async_fn=async_fn))
+    return tools
+
+
+_COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+import llama_index.core.tools
+imported = time.perf_counter()
+from utils.data_utils import load_functions_from_directory
+tools = load_functions_from_directory({directory!r}, lazy={lazy!r})
+print(len(tools), imported - start, time.perf_counter() - imported)
+"""
+
+
+def measure_cold_start(directory="functions", lazy=True):
+    """
+    Time tool registration in a fresh interpreter. Returns (tool count, seconds spent importing
+    llama_index, seconds spent registering tools including any tool-module imports).
+    """
+    src_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", _COLD_START_SCRIPT.format(directory=directory, lazy=lazy)],
+        cwd=src_path, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return int(output[-3]), float(output[-2]), float(output[-1])
+
+
+if __name__ == "__main__":
+    # python -m utils.tool_manifest  (from src/): compare eager and manifest-based startup
+    for lazy in (False, True):
+        count, framework, registration = measure_cold_start(lazy=lazy)
+        print(f"{'lazy' if lazy else 'eager'}: {count} tools registered in {registration * 1000:.1f} ms "
+              f"(+{framework * 1000:.0f} ms llama_index import)")
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from src.utils import tool_manifest
+from src.utils.data_utils import load_functions_from_directory
+
+TOOL_SOURCE = '''
+def get_answer(symbol, limit=10):
+    """
+    Return a canned answer for `symbol`.
+    """
+    return [{"symbol": symbol, "limit": limit, "version": VERSION}]
+
+async def aget_answer(symbol, limit=10):
+    """
+    Async variant of get_answer.
+    """
+    return get_answer(symbol, limit)
+
+VERSION = __VERSION__
+'''
+
+
+class TestToolManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.package = f"manifest_pkg_{id(self)}"
+        self.directory = os.path.join(self.tmp.name, self.package)
+        os.mkdir(self.directory)
+        open(os.path.join(self.directory, "__init__.py"), "w").close()
+        self._write_tool(1)
+        sys.path.insert(0, self.tmp.name)
+        self.manifest_path = os.path.join(self.tmp.name, "manifest.json")
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        for name in [m for m in sys.modules if m.startswith(self.package)]:
+            del sys.modules[name]
+        self.tmp.cleanup()
+
+    def _write_tool(self, version):
+        with open(os.path.join(self.directory, "answers.py"), "w") as f:
+            f.write(textwrap.dedent(TOOL_SOURCE.replace("__VERSION__", str(version))))
+
+    def _load(self):
+        return tool_manifest.load_tools_from_manifest(self.directory, self.package, self.manifest_path)
+
+    def test_tools_match_eager_registration_and_import_lazily(self):
+        tools = self._load()
+        del sys.modules[f"{self.package}.answers"]  # imported once to build the manifest
+        with mock.patch.object(tool_manifest, "_describe_module", side_effect=AssertionError("rebuilt")):
+            tools = self._load()
+        self.assertNotIn(f"{self.package}.answers", sys.modules)
+        tool = tools[0]
+        self.assertEqual(tool.metadata.name, "get_answer")
+        self.assertEqual(tool.metadata.get_parameters_dict()["properties"]["limit"]["default"], 10)
+        self.assertEqual(tool.call(symbol="AAPL").raw_output[0]["symbol"], "AAPL")
+        self.assertIn(f"{self.package}.answers", sys.modules)
+        output = asyncio.run(tool.acall(symbol="MSFT", limit=2))
+        self.assertEqual(output.raw_output, [{"symbol": "MSFT", "limit": 2, "version": 1}])
+
+    def test_changed_file_invalidates_its_entry(self):
+        self._load()
+        self._write_tool(22)
+        with mock.patch.object(tool_manifest, "_describe_module", wraps=tool_manifest._describe_module) as describe:
+            self._load()
+        describe.assert_called_once_with(f"{self.package}.answers")
+
+    def test_repo_tools_match_eager_loader(self):
+        lazy = {t.metadata.name: t.metadata for t in load_functions_from_directory("functions")}
+        eager = {t.metadata.name: t.metadata for t in load_functions_from_directory("functions", lazy=False)}
+        self.assertEqual(set(lazy), set(eager))
+        for name, metadata in eager.items():
+            self.assertEqual(lazy[name].description, metadata.description)
+            self.assertEqual(lazy[name].get_parameters_dict(), metadata.get_parameters_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+# Per-query tool retrieval: rank tools against the user query with BM25 over
+# their names and docstrings and hand the LLM only the top-k (plus pinned
+# tools) instead of resending every schema on each call.
+
+TOP_K = int(os.environ.get('AGENT_TOOL_TOP_K', 8))
+PINS = tuple(name for name in os.environ.get('AGENT_TOOL_PINS', 'general_search,get_next_page').split(',') if name)
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger(__name__)
+
+_word = re.compile(r'[a-z0-9]+')
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'by', 'for', 'from', 'get', 'given', 'in', 'including', 'is', 'it', 'me', 'of',
+    'on', 'or', 'such', 'that', 'the', 'their', 'this', 'to', 'what', 'which', 'with', 'retrieve', 'fetch', 'none',
+    'give', 'show', 'tell', 'how', 'much', 'many', 'was', 'were', 'last', 'current',
+}
+# Common analyst phrasing mapped onto the vocabulary the tool docstrings use
+_SYNONYMS = {
+    'revenue': ('income', 'statement'), 'earnings': ('income', 'eps'), 'profit': ('income',),
+    'ticker': ('symbol',), 'quote': ('price',), 'worth': ('market', 'capitalization'),
+    'cap': ('capitalization',), 'ceo': ('executives',), 'staff': ('employees',), 'workforce': ('employees',),
+    'salary': ('compensation',), 'pay': ('compensation',), 'rating': ('grade',), 'screen': ('screener',),
+}
+
+
+def tokenize(text):
+    tokens = []
+    for word in _word.findall((text or '').lower()):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _expand(tokens):
+    expanded = list(tokens)
+    for token in tokens:
+        expanded.extend(tokenize(' '.join(_SYNONYMS.get(token, ()))))
+    return expanded
+
+
+def tool_tokens(tool):
+    """
+    Rough prompt-token cost of sending `tool`'s name, description and schema to the LLM.
+    """
+    metadata = tool.metadata
+    payload = json.dumps({"name": metadata.name, "description": metadata.description,
+                          "parameters": metadata.get_parameters_dict()})
+    return len(payload) // CHARS_PER_TOKEN + 1
+
+
+class ToolRetriever:
+    """
+    Offline BM25 ranking of tools for a query. Duck-types llama_index's ObjectRetriever,
+    so it can be passed as `tool_retriever` to the agent.
+    """
+
+    def __init__(self, tools, k=TOP_K, pins=PINS, k1=1.5, b=0.75):
+        self.tools = list(tools)
+        self.k = k
+        self.pins = [tool for tool in self.tools if tool.metadata.name in set(pins)]
+        self.k1, self.b = k1, b
+        self._docs = []
+        for tool in self.tools:
+            name_tokens = tokenize(tool.metadata.name.replace('_', ' '))
+            # Name terms count double: they are the most specific description of a tool
+            self._docs.append(Counter(name_tokens * 2 + tokenize(tool.metadata.description)))
+        self._avg_length = sum(sum(doc.values()) for doc in self._docs) / max(len(self._docs), 1)
+        document_frequency = Counter(term for doc in self._docs for term in doc)
+        count = len(self._docs)
+        self._idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+        self._tokens = {tool.metadata.name: tool_tokens(tool) for tool in self.tools}
+        self._all_tokens = sum(self._tokens.values())
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.tokens_saved = 0
+
+    def score(self, query):
+        terms = _expand(tokenize(query))
+        scores = []
+        for doc in self._docs:
+            length = sum(doc.values())
+            score = 0.0
+            for term in terms:
+                frequency = doc.get(term)
+                if frequency:
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / self._avg_length)
+                    score += self._idf[term] * frequency * (self.k1 + 1) / norm
+            scores.append(score)
+        return scores
+
+    def retrieve(self, query):
+        """
+        Return the pinned tools plus the k best-scoring tools for `query` (a str or QueryBundle).
+        """
+        query = getattr(query, 'query_str', query)
+        scores = self.score(str(query))
+        if not any(scores):
+            # Nothing matched: better to pay for every schema than to leave the LLM without the right tool
+            logger.info("tool retrieval: no match, sending all %d tools", len(self.tools))
+            with self._lock:
+                self.turns += 1
+            return list(self.tools)
+        ranked = sorted(range(len(self.tools)), key=lambda i: (-scores[i], i))
+        selected = list(self.pins)
+        for i in ranked:
+            if len(selected) >= self.k + len(self.pins):
+                break
+            if scores[i] > 0 and self.tools[i] not in selected:
+                selected.append(self.tools[i])
+        saved = self._all_tokens - sum(self._tokens[tool.metadata.name] for tool in selected)
+        with self._lock:
+            self.turns += 1
+            self.tokens_saved += saved
+        logger.info("tool retrieval: sending %d of %d tools, ~%d prompt tokens saved",
+                    len(selected), len(self.tools), saved)
+        return selected
+
+    def stats(self):
+        with self._lock:
+            return {"turns": self.turns, "tokens_saved": self.tokens_saved, "all_tools_tokens": self._all_tokens}
@@ -0,0 +1,41 @@
+import unittest
+
+from src.utils.data_utils import load_functions_from_directory
+from src.utils.tool_retrieval import ToolRetriever, tokenize
+
+
+class TestToolRetrieval(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tools = load_functions_from_directory("functions")
+
+    def _names(self, retriever, query):
+        return [tool.metadata.name for tool in retriever.retrieve(query)]
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Get the employees of AAPL's company"), ["employee", "aapl", "company"])
+
+    def test_ranks_relevant_tools_first(self):
+        retriever = ToolRetriever(self.tools, k=3, pins=())
+        self.assertEqual(self._names(retriever, "How many employees does Snowflake have?")[0], "get_employee_count")
+        self.assertIn("get_historical_market_cap", self._names(retriever, "Market cap history of AAPL"))
+        self.assertEqual(self._names(retriever, "find the CUSIP 037833100")[0], "cusip_search")
+
+    def test_pins_k_and_savings(self):
+        retriever = ToolRetriever(self.tools, k=2, pins=("get_next_page",))
+        names = self._names(retriever, "executive compensation at Apple")
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[0], "get_next_page")
+        self.assertIn("get_executive_compensation", names)
+        stats = retriever.stats()
+        self.assertEqual(stats["turns"], 1)
+        self.assertGreater(stats["tokens_saved"], stats["all_tools_tokens"] // 2)
+
+    def test_unmatched_query_sends_every_tool(self):
+        retriever = ToolRetriever(self.tools, k=2)
+        self.assertEqual(len(retriever.retrieve("hello there")), len(self.tools))
+
+
+if __name__ == "__main__":
+    unittest.main()